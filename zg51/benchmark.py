@@ -0,0 +1,837 @@
+"""Pomiary wydajności i testy obciążeniowe warstwy danych.
+
+Uruchamianie: python benchmark.py <polecenie> [opcje]
+Porównanie eksportu wymaga pandas (requirements-dev.txt).
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+METODY = [
+    "HF Duży (ZEMAT)",
+    "HF Mały (WOLDAN)",
+    "Gorące Powietrze (MILLER)",
+    "Gorące Powietrze (Ręcznie)",
+    "Gorące Powietrze (Zgrzewarka jezdna)",
+    "Gorące Powietrze (ASATECH)",
+    "Gorący Klin (SEAMTEC)"
+]
+GRUPY = ["Koła", "Box", "Płachty", "Nieregularne Drobne", "Nieregularne Duże"]
+PRZEDZIALY = ["do 2m2", "od 2 do 20m2", "od 20 do 60m2", "powyżej 60m2"]
+
+
+def przykladowe_wpisy(n, ziarno=1):
+    """Generuje n losowych obliczeń jako krotki argumentów dodaj_wpis."""
+    los = random.Random(ziarno)
+    for _ in range(n):
+        kod = f"{los.randint(100, 999)}-{los.randint(1000, 9999)}-{los.randint(100, 999)}"
+        metry = {m: round(los.uniform(0.5, 80.0), 2) for m in los.sample(METODY, los.randint(1, 3))}
+        yield (kod, los.choice(GRUPY), los.choice(PRZEDZIALY), metry,
+               round(sum(metry.values()) * 2.5, 2))
+
+
+def _pomiar(opis, liczba, funkcja):
+    t0 = time.perf_counter()
+    funkcja()
+    czas = time.perf_counter() - t0
+    print(f"  {opis:<40} {czas:8.3f} s  {liczba / czas:12.0f} op/s")
+    return czas
+
+
+def _pisarz_konfiguracji(katalog, nr, zapisy, start):
+    """Proces zapisujący: dodaje własne grupy i zmienia czasy we własnej grupie."""
+    os.chdir(katalog)
+    from models import ZarzadcaDanych
+    zarzadca = ZarzadcaDanych(os.path.join(katalog, "dane_zgrzewania.json"))
+    start.wait()
+    for k in range(zapisy):
+        zarzadca.dodaj_grupe(f"P{nr}-{k}")
+        indeks = next(i for i, g in enumerate(zarzadca.grupy) if g.nazwa == f"P{nr}-0")
+        if not zarzadca.grupy[indeks].metody:
+            zarzadca.dodaj_metode_do_grupy(indeks, "HF Duży (ZEMAT)")
+        zarzadca.edytuj_metode_w_grupie(indeks, 0, {"do 2m2": (1, float(k))})
+
+
+def stres_konfiguracji(procesy, zapisy):
+    """Równoległe zapisy dane_zgrzewania.json – sprawdza brak utraconych zmian."""
+    from models import ZarzadcaDanych
+    with tempfile.TemporaryDirectory() as katalog:
+        start = multiprocessing.Event()
+        lista = [multiprocessing.Process(target=_pisarz_konfiguracji,
+                                         args=(katalog, nr, zapisy, start))
+                 for nr in range(procesy)]
+        for p in lista:
+            p.start()
+        time.sleep(1.0)
+        t0 = time.perf_counter()
+        start.set()
+        for p in lista:
+            p.join()
+        czas = time.perf_counter() - t0
+
+        os.chdir(katalog)
+        wynik = ZarzadcaDanych(os.path.join(katalog, "dane_zgrzewania.json"))
+        nazwy = {g.nazwa: g for g in wynik.grupy}
+        brakujace = [f"P{nr}-{k}" for nr in range(procesy) for k in range(zapisy)
+                     if f"P{nr}-{k}" not in nazwy]
+        zle_czasy = [nr for nr in range(procesy)
+                     if nazwy.get(f"P{nr}-0") is None
+                     or nazwy[f"P{nr}-0"].metody[0].pobierz_czas("do 2m2") != (1, float(zapisy - 1))]
+        os.chdir(os.path.dirname(os.path.abspath(__file__)))
+
+    liczba = procesy * zapisy
+    print(f"Procesy: {procesy}, operacje: {liczba}, czas: {czas:.2f} s "
+          f"({liczba / czas:.0f} op/s), rewizja końcowa: {wynik.rewizja}")
+    if brakujace or zle_czasy or any(p.exitcode != 0 for p in lista):
+        print(f"BŁĄD: utracone grupy {brakujace[:10]}, utracone edycje w procesach {zle_czasy}")
+        return False
+    print("OK – brak utraconych zmian.")
+    return True
+
+
+def _klucze_slownikow(conn):
+    """Dopisuje przykładowe grupy, przedziały i metody do słowników; zwraca mapy nazwa -> klucz."""
+    klucze = {}
+    for slownik, nazwy in (("grupy", GRUPY), ("przedzialy", PRZEDZIALY), ("metody", METODY)):
+        conn.executemany(f"INSERT OR IGNORE INTO {slownik} (nazwa) VALUES (?)", [(n,) for n in nazwy])
+        klucze[slownik] = {nazwa: klucz for klucz, nazwa in conn.execute(f"SELECT id, nazwa FROM {slownik}")}
+    return klucze
+
+
+def _stary_dodaj_wpis(db_path, kod, grupa, przedzial, metry_dict, czas_total):
+    """Dotychczasowy wzorzec: nowe połączenie i domyślny dziennik na każdą operację."""
+    conn = sqlite3.connect(db_path)
+    with conn:
+        klucze = _klucze_slownikow(conn)
+        cursor = conn.execute("""
+            INSERT INTO obliczenia (kod, znacznik, grupa_id, przedzial_id, czas_total, czas_produkcji, odchylenie)
+            VALUES (?, CAST(strftime('%s', 'now') AS INTEGER), ?, ?, ?, NULL, NULL)
+        """, (int(kod.replace("-", "")), klucze["grupy"][grupa], klucze["przedzialy"][przedzial], czas_total))
+        for metoda, metry in metry_dict.items():
+            conn.execute("INSERT INTO metry_obliczenia (obliczenie_id, metoda_id, metry) VALUES (?, ?, ?)",
+                         (cursor.lastrowid, klucze["metody"][metoda], metry))
+    conn.close()
+
+
+def _stary_odczyt(db_path, wpis_id):
+    conn = sqlite3.connect(db_path)
+    with conn:
+        conn.execute("SELECT * FROM obliczenia WHERE id = ?", (wpis_id,)).fetchone()
+        conn.execute("SELECT metoda_id, metry FROM metry_obliczenia WHERE obliczenie_id = ?",
+                     (wpis_id,)).fetchall()
+    conn.close()
+
+
+def porownaj_polaczenia(n):
+    """Zapis i odczyt: połączenie na operację (DELETE) vs stałe połączenie (WAL)."""
+    from database import BazaDanych
+    wpisy = list(przykladowe_wpisy(n))
+    with tempfile.TemporaryDirectory() as katalog:
+        stara = os.path.join(katalog, "stara.db")
+        BazaDanych(stara, journal_mode="DELETE", synchronous="FULL").zamknij()
+        nowa = BazaDanych(os.path.join(katalog, "nowa.db"))
+
+        print(f"Zapis {n} obliczeń:")
+        _pomiar("połączenie na operację, DELETE/FULL", n,
+                lambda: [_stary_dodaj_wpis(stara, *w) for w in wpisy])
+        _pomiar("stałe połączenie, WAL/NORMAL", n,
+                lambda: [nowa.dodaj_wpis(*w) for w in wpisy])
+
+        print(f"Odczyt {n} pojedynczych wpisów:")
+        _pomiar("połączenie na operację, DELETE/FULL", n,
+                lambda: [_stary_odczyt(stara, i) for i in range(1, n + 1)])
+
+        def nowy_odczyt():
+            for i in range(1, n + 1):
+                with nowa.odczyt() as conn:
+                    conn.execute("SELECT * FROM obliczenia WHERE id = ?", (i,)).fetchone()
+                    conn.execute("SELECT metoda_id, metry FROM metry_obliczenia WHERE obliczenie_id = ?",
+                                 (i,)).fetchall()
+        _pomiar("stałe połączenie, WAL/NORMAL", n, nowy_odczyt)
+        nowa.zamknij()
+
+
+def _losowa_historia(n, start):
+    """
+    Wiersze (id, kod, znacznik, grupa, przedzial, czas_total) n losowych obliczeń
+    o ID od start + 1 i ich metraże (obliczenie_id, metoda, metry) – nazwy i kody jako tekst.
+    """
+    wiersze, metry = [], []
+    for i, (kod, grupa, przedzial, metry_dict, czas_total) in enumerate(przykladowe_wpisy(n), start + 1):
+        znacznik = int(datetime(2020 + i % 6, 1 + i % 12, 1 + i % 28, i % 24, 0, i % 60).timestamp())
+        wiersze.append((i, kod, znacznik, grupa, przedzial, czas_total))
+        metry.extend((i, m, v) for m, v in metry_dict.items())
+    return wiersze, metry
+
+
+def wypelnij_historie(db_path, n):
+    """Szybko zapełnia historię n losowymi obliczeniami (bez API BazaDanych)."""
+    conn = sqlite3.connect(db_path)
+    with conn:
+        start = conn.execute("SELECT COALESCE(MAX(id), 0) FROM obliczenia").fetchone()[0]
+        klucze = _klucze_slownikow(conn)
+        grupy, przedzialy, metody = klucze["grupy"], klucze["przedzialy"], klucze["metody"]
+        wiersze, metry = _losowa_historia(n, start)
+        conn.executemany(
+            "INSERT INTO obliczenia (id, kod, znacznik, grupa_id, przedzial_id, czas_total) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            ((i, int(kod.replace("-", "")), z, grupy[g], przedzialy[p], c) for i, kod, z, g, p, c in wiersze))
+        conn.executemany("INSERT INTO metry_obliczenia (obliczenie_id, metoda_id, metry) VALUES (?, ?, ?)",
+                         ((i, metody[m], v) for i, m, v in metry))
+    conn.close()
+
+
+def _stare_pobierz_wszystkie(db_path):
+    """Dotychczasowe pobierz_wszystkie: osobne zapytanie o metraże dla każdego wpisu."""
+    conn = sqlite3.connect(db_path)
+    conn.row_factory = sqlite3.Row
+    rows = [dict(r) for r in conn.execute("SELECT * FROM obliczenia ORDER BY znacznik DESC")]
+    for row in rows:
+        row['metraze'] = {m['metoda']: m['metry'] for m in conn.execute(
+            "SELECT nazwa AS metoda, metry FROM metry_obliczenia JOIN metody ON metody.id = metoda_id "
+            "WHERE obliczenie_id = ?", (row['id'],))}
+    conn.close()
+    return rows
+
+
+def porownaj_pobierz_wszystkie(rozmiary):
+    """pobierz_wszystkie: zapytanie na wpis (N+1) vs jeden przebieg po metrażach."""
+    from database import BazaDanych
+    with tempfile.TemporaryDirectory() as katalog:
+        sciezka = os.path.join(katalog, "historia.db")
+        baza = BazaDanych(sciezka)
+        obecnie = 0
+        for n in rozmiary:
+            wypelnij_historie(sciezka, n - obecnie)
+            obecnie = n
+            print(f"pobierz_wszystkie, {n} wpisów:")
+            _pomiar("N+1 zapytań", n, lambda: _stare_pobierz_wszystkie(sciezka))
+            _pomiar("stała liczba zapytań", n, baza.pobierz_wszystkie)
+        baza.zamknij()
+
+
+def sprawdz_plany(n):
+    """EXPLAIN QUERY PLAN zapytań API na bazie z n wpisami; błąd przy pełnym skanie."""
+    from database import BazaDanych
+    with tempfile.TemporaryDirectory() as katalog:
+        sciezka = os.path.join(katalog, "historia.db")
+        BazaDanych(sciezka).zamknij()
+        wypelnij_historie(sciezka, n)
+        baza = BazaDanych(sciezka)
+        baza.conn.execute("ANALYZE")
+        problemy = baza.sprawdz_plany_zapytan()
+        baza.zamknij()
+    for sql, krok in problemy:
+        print(f"PEŁNY SKAN: {krok}\n    {' '.join(sql.split())}")
+    print("OK – wszystkie zapytania korzystają z indeksów." if not problemy
+          else f"{len(problemy)} zapytań bez indeksu.")
+    return not problemy
+
+
+def porownaj_wstawianie(n):
+    """dodaj_wpis w pętli vs dodaj_wpisy (executemany w dużych transakcjach)."""
+    from database import BazaDanych
+    wpisy = [{'kod': k, 'grupa': g, 'przedzial': p, 'metry_dict': m, 'czas_total': c}
+             for k, g, p, m, c in przykladowe_wpisy(n)]
+    pojedynczo = min(n, 20_000)
+    with tempfile.TemporaryDirectory() as katalog:
+        baza = BazaDanych(os.path.join(katalog, "a.db"))
+        print(f"Wstawianie obliczeń:")
+        _pomiar(f"dodaj_wpis w pętli ({pojedynczo})", pojedynczo,
+                lambda: [baza.dodaj_wpis(**w) for w in wpisy[:pojedynczo]])
+        baza.zamknij()
+        baza = BazaDanych(os.path.join(katalog, "b.db"))
+        ids = []
+        _pomiar(f"dodaj_wpisy ({n})", n, lambda: ids.extend(baza.dodaj_wpisy(iter(wpisy))))
+        assert ids == list(range(1, n + 1))
+        assert baza.conn.execute("SELECT COUNT(*) FROM obliczenia").fetchone()[0] == n
+        baza.zamknij()
+
+
+def porownaj_powtorzenia(n, powtorzen=10):
+    """
+    Zapis n obliczeń różnych vs n obliczeń, z których każde operator wykonuje
+    `powtorzen` razy z rzędu: czas, liczba wierszy i rozmiar bazy.
+    """
+    from database import BazaDanych
+    wpisy = [{'kod': k, 'grupa': g, 'przedzial': p, 'metry_dict': m, 'czas_total': c}
+             for k, g, p, m, c in przykladowe_wpisy(n)]
+    powtarzane = [w for w in wpisy[:n // powtorzen] for _ in range(powtorzen)]
+    pojedynczo = min(n, 5000)
+    with tempfile.TemporaryDirectory() as katalog:
+        print(f"Zapis obliczeń (powtórzenia: każde obliczenie {powtorzen} razy z rzędu):")
+        for opis, lista in (("różne", wpisy), ("powtórzenia", powtarzane)):
+            baza = BazaDanych(os.path.join(katalog, f"{opis}-petla.db"))
+            _pomiar(f"dodaj_wpis w pętli, {opis} ({pojedynczo})", pojedynczo,
+                    lambda: [baza.dodaj_wpis(**w) for w in lista[:pojedynczo]])
+            baza.zamknij()
+            sciezka = os.path.join(katalog, f"{opis}.db")
+            baza = BazaDanych(sciezka)
+            _pomiar(f"dodaj_wpisy, {opis} ({len(lista)})", len(lista), lambda: baza.dodaj_wpisy(lista))
+            wiersze = baza.conn.execute("SELECT COUNT(*), TOTAL(wystapienia) FROM obliczenia").fetchone()
+            metraze = baza.conn.execute("SELECT COUNT(*) FROM metry_obliczenia").fetchone()[0]
+            baza.conn.execute("VACUUM")
+            baza.zamknij()
+            print(f"    wierszy obliczeń: {wiersze[0]} ({wiersze[1]:.0f} wystąpień), metraży: {metraze}, "
+                  f"baza: {os.path.getsize(sciezka) / 2**20:.1f} MB")
+
+
+def _stary_export(baza, sciezka):
+    """Dotychczasowy export_do_excel: cała historia w pamięci, dwa DataFrame'y pandas."""
+    import pandas as pd
+    dane = baza.pobierz_wszystkie()
+    df_glowne = pd.DataFrame([{
+        'ID': r['id'], 'Kod': r['kod'], 'Data': r['data'], 'Grupa': r['grupa'],
+        'Przedział': r['przedzial'], 'Czas total [min]': r['czas_total'],
+        'Czas produkcji [min]': r['czas_produkcji'] if r['czas_produkcji'] is not None else '',
+        'Odchylenie [%]': r['odchylenie'] if r['odchylenie'] is not None else ''
+    } for r in dane])
+    metody = sorted({m for r in dane for m in r['metraze']})
+    df_metry = pd.DataFrame([{'ID': r['id'], **{m: r['metraze'].get(m, 0.0) for m in metody}}
+                             for r in dane])
+    with pd.ExcelWriter(sciezka, engine='openpyxl') as writer:
+        df_glowne.to_excel(writer, sheet_name='Podsumowanie', index=False)
+        df_metry.to_excel(writer, sheet_name='Metry', index=False)
+
+
+def _eksport_w_procesie(db_path, sciezka, stary, wyniki):
+    """Eksport w osobnym procesie – szczyt pamięci (ru_maxrss) dotyczy tylko eksportu."""
+    import resource
+    from database import BazaDanych
+    baza = BazaDanych(db_path)
+    pamiec_przed = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    t0 = time.perf_counter()
+    if stary:
+        _stary_export(baza, sciezka)
+    else:
+        baza.export_do_excel(sciezka)
+    czas = time.perf_counter() - t0
+    baza.zamknij()
+    wyniki.put((czas, pamiec_przed, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss))
+
+
+def porownaj_eksport(n, n_stary):
+    """export_do_excel: DataFrame'y pandas vs zapis strumieniowy (openpyxl write-only)."""
+    from database import BazaDanych
+    with tempfile.TemporaryDirectory() as katalog:
+        sciezka = os.path.join(katalog, "historia.db")
+        BazaDanych(sciezka).zamknij()
+        print(f"Eksport do Excela (czas, szczyt pamięci procesu / przyrost w eksporcie):")
+        obecnie = 0
+        for liczba, stary in sorted([(n_stary, True), (n, False)]):
+            if not liczba:
+                continue
+            wypelnij_historie(sciezka, liczba - obecnie)
+            obecnie = liczba
+            wyniki = multiprocessing.Queue()
+            proces = multiprocessing.Process(target=_eksport_w_procesie,
+                                             args=(sciezka, os.path.join(katalog, "eksport.xlsx"), stary, wyniki))
+            proces.start()
+            czas, przed, po = wyniki.get()
+            proces.join()
+            rozmiar = os.path.getsize(os.path.join(katalog, "eksport.xlsx")) / 2**20
+            opis = "pandas, cała historia w pamięci" if stary else "strumieniowo (write-only)"
+            print(f"  {opis:<32} {liczba:>9} wpisów {czas:8.1f} s  {liczba / czas:8.0f} wpisów/s  "
+                  f"{po / 1024:7.0f} MB / +{(po - przed) / 1024:.0f} MB  plik {rozmiar:.0f} MB")
+
+
+def porownaj_cache(n, powtorzen=200):
+    """Powtórne odczyty niezmienionej historii: bez cache, z cache i po zapisie innego połączenia."""
+    from database import BazaDanych
+    odczyty = [("pobierz_strone", {"limit": 200}), ("pobierz_statystyki", {}),
+               ("podsumuj_zakres", {"od": "2000-01-01", "do": "2100-01-01"}),
+               ("szukaj_kodow", {"prefiks": "12"})]
+    with tempfile.TemporaryDirectory() as katalog:
+        sciezka = os.path.join(katalog, "historia.db")
+        BazaDanych(sciezka).zamknij()
+        wypelnij_historie(sciezka, n)
+        bez_cache, z_cache = BazaDanych(sciezka, cache_wynikow=0), BazaDanych(sciezka)
+        inna = BazaDanych(sciezka)
+        print(f"Odczyty historii ({n} wpisów, {powtorzen} powtórzeń):")
+        for metoda, argumenty in odczyty:
+            for opis, baza in (("bez cache", bez_cache), ("z cache", z_cache)):
+                getattr(baza, metoda)(**argumenty)
+                _pomiar(f"{metoda}, {opis}", powtorzen,
+                        lambda: [getattr(baza, metoda)(**argumenty) for _ in range(powtorzen)])
+        # Każdy odczyt po zapisie innego połączenia – cache unieważniony, wynik liczony od nowa
+        metoda, argumenty = odczyty[0]
+        _pomiar(f"{metoda}, z cache po każdym zapisie", powtorzen // 10, lambda: [
+            (inna.dodaj_wpis("123-4567-890", "Box", "do 2m2", {METODY[0]: i + 1.0}, 1.0),
+             getattr(z_cache, metoda)(**argumenty)) for i in range(powtorzen // 10)])
+        metryki = z_cache.metryki_cache()
+        print(f"  trafienia: {metryki['trafienia']}, chybienia: {metryki['chybienia']}, "
+              f"unieważnienia: {metryki['uniewaznienia']}, skuteczność: {metryki['skutecznosc']:.1%}")
+        for baza in (bez_cache, z_cache, inna):
+            baza.zamknij()
+
+
+def _import_w_procesie(db_path, sciezka, wyniki):
+    """Import w osobnym procesie – szczyt pamięci (ru_maxrss) dotyczy tylko importu."""
+    import resource
+    from database import BazaDanych
+    from import_excel import importuj_z_excel
+    baza = BazaDanych(db_path)
+    pamiec_przed = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    t0 = time.perf_counter()
+    raport = importuj_z_excel(baza, sciezka)
+    czas = time.perf_counter() - t0
+    baza.zamknij()
+    wyniki.put((czas, raport['zaimportowane'], pamiec_przed, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss))
+
+
+def pomiar_importu(n):
+    """importuj_z_excel: skoroszyt z export_do_excel (n wpisów) do pustej bazy."""
+    from database import BazaDanych
+    with tempfile.TemporaryDirectory() as katalog:
+        zrodlo = os.path.join(katalog, "historia.db")
+        BazaDanych(zrodlo).zamknij()
+        wypelnij_historie(zrodlo, n)
+        baza = BazaDanych(zrodlo)
+        baza.export_do_excel(os.path.join(katalog, "eksport.xlsx"))
+        baza.zamknij()
+        rozmiar = os.path.getsize(os.path.join(katalog, "eksport.xlsx")) / 2**20
+        wyniki = multiprocessing.Queue()
+        proces = multiprocessing.Process(target=_import_w_procesie, args=(
+            os.path.join(katalog, "import.db"), os.path.join(katalog, "eksport.xlsx"), wyniki))
+        proces.start()
+        czas, zaimportowane, przed, po = wyniki.get()
+        proces.join()
+        print(f"Import z Excela (plik {rozmiar:.0f} MB, czas, szczyt pamięci procesu / przyrost w imporcie):")
+        print(f"  strumieniowo (read-only)  {zaimportowane:>9} wpisów {czas:8.1f} s  "
+              f"{zaimportowane / czas:8.0f} wpisów/s  {po / 1024:7.0f} MB / +{(po - przed) / 1024:.0f} MB")
+
+
+# Tabele historii w schemacie 2: nazwy grup, przedziałów i metod oraz kody jako tekst
+SCHEMAT_2 = """
+    CREATE TABLE obliczenia (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        kod TEXT NOT NULL,
+        znacznik INTEGER NOT NULL,
+        grupa TEXT NOT NULL,
+        przedzial TEXT NOT NULL,
+        czas_total REAL NOT NULL,
+        czas_produkcji REAL,
+        odchylenie REAL
+    );
+    CREATE TABLE metry_obliczenia (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        obliczenie_id INTEGER NOT NULL,
+        metoda TEXT NOT NULL,
+        metry REAL NOT NULL,
+        FOREIGN KEY (obliczenie_id) REFERENCES obliczenia(id) ON DELETE CASCADE
+    );
+    CREATE INDEX idx_metry_pokrywajacy ON metry_obliczenia(obliczenie_id, metoda, metry);
+    CREATE INDEX idx_obliczenia_historia ON obliczenia(
+        znacznik, id, kod, grupa, przedzial, czas_total, czas_produkcji, odchylenie);
+    CREATE INDEX idx_obliczenia_kod ON obliczenia(kod, znacznik);
+    CREATE INDEX idx_obliczenia_kod_srodek ON obliczenia(substr(kod, 5, 4), kod, znacznik);
+    CREATE INDEX idx_obliczenia_kod_wariant ON obliczenia(substr(kod, 10, 3), kod, znacznik);
+    CREATE INDEX idx_obliczenia_grupa ON obliczenia(grupa, znacznik);
+    CREATE INDEX idx_obliczenia_przedzial ON obliczenia(przedzial, znacznik);
+    PRAGMA user_version = 2;
+"""
+
+
+def _skany(slowniki):
+    """
+    Odczyty porównywane w obu schematach, jako funkcje conn -> wiersze. Wyniki
+    mają tę samą postać (nazwy, kod tekstowy); w schemacie ze słownikami
+    nazwy na liście historii i metraży podstawiane są w Pythonie, jak w BazaDanych.
+    """
+    from database import KOD_TEKST, KOLUMNY_WPISU, data_lokalna, nazwa_ze_slownika, warunki_kodu
+
+    def zapytanie(sql, parametry=()):
+        return lambda conn: conn.execute(sql, parametry).fetchall()
+
+    if not slowniki:
+        return {
+            "lista historii (znacznik, id malejąco)": zapytanie(
+                f"SELECT id, kod, {data_lokalna('znacznik')}, znacznik, grupa, przedzial, czas_total, "
+                "czas_produkcji, odchylenie FROM obliczenia ORDER BY znacznik DESC, id DESC"),
+            "wszystkie metraże": zapytanie("SELECT obliczenie_id, metoda, metry FROM metry_obliczenia"),
+            "liczba obliczeń wg grupy": zapytanie("SELECT grupa, COUNT(*) FROM obliczenia GROUP BY grupa"),
+            "metry wg metody": zapytanie("SELECT metoda, TOTAL(metry) FROM metry_obliczenia GROUP BY metoda"),
+            "kody z segmentem środkowym 45..": zapytanie(
+                "SELECT kod, COUNT(*) FROM obliczenia "
+                "WHERE substr(kod, 5, 4) >= '45' AND substr(kod, 5, 4) < '46' GROUP BY kod"),
+        }
+
+    def lista(conn):
+        grupy = dict(conn.execute("SELECT id, nazwa FROM grupy"))
+        przedzialy = dict(conn.execute("SELECT id, nazwa FROM przedzialy"))
+        return [w[:4] + (grupy[w[4]], przedzialy[w[5]]) + w[6:] for w in conn.execute(
+            f"SELECT {KOLUMNY_WPISU} FROM obliczenia ORDER BY znacznik DESC, id DESC")]
+
+    def metraze(conn):
+        metody = dict(conn.execute("SELECT id, nazwa FROM metody"))
+        return [(i, metody[m], v) for i, m, v in conn.execute(
+            "SELECT obliczenie_id, metoda_id, metry FROM metry_obliczenia")]
+
+    warunki, parametry = warunki_kodu(srodek="45")
+    return {
+        "lista historii (znacznik, id malejąco)": lista,
+        "wszystkie metraże": metraze,
+        "liczba obliczeń wg grupy": zapytanie(
+            f"SELECT {nazwa_ze_slownika('grupy', 'grupa_id')}, COUNT(*) FROM obliczenia GROUP BY grupa_id"),
+        "metry wg metody": zapytanie(
+            f"SELECT {nazwa_ze_slownika('metody', 'metoda_id')}, TOTAL(metry) FROM metry_obliczenia "
+            "GROUP BY metoda_id"),
+        "kody z segmentem środkowym 45..": zapytanie(
+            f"SELECT {KOD_TEKST}, COUNT(*) FROM obliczenia WHERE {' AND '.join(warunki)} GROUP BY obliczenia.kod",
+            parametry),
+    }
+
+
+def _pomiar_schematu(sciezka, slowniki, powtorzenia=3):
+    """
+    Rozmiar pliku po VACUUM, bajty stron tabel historii i ich indeksów (dbstat;
+    słowniki łącznie) oraz najlepsze z `powtorzenia` czasy odczytów.
+    """
+    conn = sqlite3.connect(sciezka)
+    conn.execute("VACUUM")
+    wynik = {'plik bazy': os.path.getsize(sciezka)}
+    for tabela, bajty in conn.execute("""
+            SELECT CASE WHEN m.tbl_name IN ('grupy', 'przedzialy', 'metody') THEN 'słowniki'
+                        WHEN s.name = m.tbl_name THEN m.tbl_name ELSE 'indeksy ' || m.tbl_name END,
+                   SUM(s.pgsize)
+            FROM dbstat s JOIN sqlite_master m ON m.name = s.name
+            WHERE m.tbl_name IN ('obliczenia', 'metry_obliczenia', 'grupy', 'przedzialy', 'metody')
+            GROUP BY 1"""):
+        wynik[tabela] = bajty
+    czasy = {}
+    for opis, odczyt in _skany(slowniki).items():
+        pomiary = []
+        for _ in range(powtorzenia):
+            t0 = time.perf_counter()
+            odczyt(conn)
+            pomiary.append(time.perf_counter() - t0)
+        czasy[opis] = min(pomiary)
+    conn.close()
+    return wynik, czasy
+
+
+def porownaj_slowniki(n):
+    """Rozmiar bazy i czas skanów: nazwy i kody jako tekst (schemat 2) vs słowniki i kody liczbowe."""
+    from database import BazaDanych
+    with tempfile.TemporaryDirectory() as katalog:
+        sciezka = os.path.join(katalog, "historia.db")
+        conn = sqlite3.connect(sciezka)
+        conn.executescript(SCHEMAT_2)
+        wiersze, metry = _losowa_historia(n, 0)
+        with conn:
+            conn.executemany("INSERT INTO obliczenia (id, kod, znacznik, grupa, przedzial, czas_total) "
+                             "VALUES (?, ?, ?, ?, ?, ?)", wiersze)
+            conn.executemany("INSERT INTO metry_obliczenia (obliczenie_id, metoda, metry) VALUES (?, ?, ?)", metry)
+        conn.close()
+        del wiersze, metry
+        rozmiary_przed, czasy_przed = _pomiar_schematu(sciezka, slowniki=False)
+
+        t0 = time.perf_counter()
+        BazaDanych(sciezka).zamknij()
+        print(f"Otwarcie BazaDanych z migracją 2 -> 3 i budową statystyk ({n} obliczeń): "
+              f"{time.perf_counter() - t0:.1f} s")
+        rozmiary_po, czasy_po = _pomiar_schematu(sciezka, slowniki=True)
+
+    print(f"\nRozmiar (po VACUUM)                       {'tekst':>10} {'słowniki':>10}")
+    for nazwa in sorted(rozmiary_przed.keys() | rozmiary_po.keys()):
+        przed, po = rozmiary_przed.get(nazwa, 0), rozmiary_po.get(nazwa, 0)
+        zmiana = f"  {(po - przed) / przed:+.0%}" if przed else ""
+        print(f"  {nazwa:<40} {przed / 2**20:7.1f} MB {po / 2**20:7.1f} MB{zmiana}")
+    print(f"\nOdczyty (najlepszy z 3)                   {'tekst':>10} {'słowniki':>10}")
+    for opis in czasy_przed:
+        przed, po = czasy_przed[opis], czasy_po[opis]
+        print(f"  {opis:<40} {przed:8.3f} s {po:8.3f} s  {po / przed:.2f}x")
+
+
+def porownaj_zapis_w_tle(n):
+    """Czas wywołania z wątku okna: dodaj_wpis synchronicznie vs zlecenie do ZapisWTle."""
+    from database import BazaDanych
+    from zapis_w_tle import ZapisWTle
+    wpisy = list(przykladowe_wpisy(n))
+    with tempfile.TemporaryDirectory() as katalog:
+        baza = BazaDanych(os.path.join(katalog, "a.db"))
+        print(f"Zapis {n} obliczeń:")
+        _pomiar("dodaj_wpis w wątku okna", n, lambda: [baza.dodaj_wpis(*w) for w in wpisy])
+        baza.zamknij()
+        zapis = ZapisWTle(os.path.join(katalog, "b.db"), rozmiar_kolejki=n)
+        _pomiar("ZapisWTle.dodaj_wpis (samo zlecenie)", n, lambda: [zapis.dodaj_wpis(*w) for w in wpisy])
+        _pomiar("zlecenie + oczekiwanie na zapis", n, zapis.oproznij)
+        metryki = zapis.metryki()
+        print(f"  partie: {metryki['partie']}, średnio {metryki['sredni_rozmiar_partii']:.0f} operacji, "
+              f"największa kolejka: {metryki['maks_glebokosc']}")
+        assert zapis.zamknij()
+
+
+def _stara_historia(baza):
+    """Dotychczasowe HistoriaWidget.odswiez: QTableWidgetItem dla każdej komórki całej historii."""
+    from PySide6.QtWidgets import QTableWidget, QTableWidgetItem
+    tabela = QTableWidget()
+    tabela.setColumnCount(9)
+    dane = baza.pobierz_wszystkie()
+    tabela.setRowCount(len(dane))
+    for row, r in enumerate(dane):
+        tabela.setItem(row, 0, QTableWidgetItem(str(r['id'])))
+        tabela.setItem(row, 1, QTableWidgetItem(r['kod']))
+        tabela.setItem(row, 2, QTableWidgetItem(r['data']))
+        tabela.setItem(row, 3, QTableWidgetItem(r['grupa']))
+        tabela.setItem(row, 4, QTableWidgetItem(r['przedzial']))
+        for kolumna, pole in enumerate(('czas_total', 'czas_produkcji', 'odchylenie'), 5):
+            tabela.setItem(row, kolumna, QTableWidgetItem(f"{r[pole]:.2f}" if r[pole] is not None else ""))
+        tabela.setItem(row, 8, QTableWidgetItem(str(r['wystapienia']) if r['wystapienia'] > 1 else ""))
+    return tabela
+
+
+def _historia_w_procesie(db_path, stary, wyniki):
+    """Otwarcie zakładki historii w osobnym procesie; potem przewinięcie na koniec (nowy model)."""
+    import resource
+    from types import SimpleNamespace
+    from PySide6.QtWidgets import QApplication
+    from database import BazaDanych
+    from views.history import HistoriaWidget
+    app = QApplication.instance() or QApplication([])
+    baza = BazaDanych(db_path)
+    pamiec_przed = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    t0 = time.perf_counter()
+    widok = _stara_historia(baza) if stary else HistoriaWidget(SimpleNamespace(baza=baza))
+    widok.show()
+    app.processEvents()
+    czas = time.perf_counter() - t0
+    przewiniecie = None
+    if not stary:
+        t0 = time.perf_counter()
+        model = widok.model
+        while model.canFetchMore():
+            model.fetchMore()
+            widok.table.scrollToBottom()
+            app.processEvents()
+        widok.table.scrollToTop()
+        app.processEvents()
+        przewiniecie = time.perf_counter() - t0
+    widok.close()
+    baza.zamknij()
+    wyniki.put((czas, przewiniecie, pamiec_przed, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss))
+
+
+def porownaj_historie(n):
+    """Zakładka historii: QTableWidget z całą historią vs model stron (fetchMore, LRU stron)."""
+    from database import BazaDanych
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    with tempfile.TemporaryDirectory() as katalog:
+        sciezka = os.path.join(katalog, "historia.db")
+        BazaDanych(sciezka).zamknij()
+        wypelnij_historie(sciezka, n)
+        print(f"Otwarcie zakładki historii, {n} wpisów (czas, szczyt pamięci procesu / przyrost):")
+        for stary in (True, False):
+            wyniki = multiprocessing.Queue()
+            proces = multiprocessing.Process(target=_historia_w_procesie, args=(sciezka, stary, wyniki))
+            proces.start()
+            czas, przewiniecie, przed, po = wyniki.get()
+            proces.join()
+            opis = "QTableWidget, cała historia" if stary else "ModelHistorii, strony na żądanie"
+            print(f"  {opis:<34} {czas:8.3f} s  {po / 1024:7.0f} MB / +{(po - przed) / 1024:.0f} MB")
+            if przewiniecie is not None:
+                print(f"  {'  przewinięcie do końca i z powrotem':<34} {przewiniecie:8.3f} s")
+
+
+def porownaj_odswiezanie(n, strony=5):
+    """
+    Odświeżenie zakładki historii po zapisie innego stanowiska (nowy wpis,
+    walidacja, usunięcie): lista od nowa vs odswiez_zmiany.
+    """
+    from database import BazaDanych
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    from PySide6.QtWidgets import QApplication
+    from views.history import ModelHistorii
+    app = QApplication.instance() or QApplication([])
+    with tempfile.TemporaryDirectory() as katalog:
+        sciezka = os.path.join(katalog, "historia.db")
+        BazaDanych(sciezka).zamknij()
+        wypelnij_historie(sciezka, n)
+        baza, inna = BazaDanych(sciezka), BazaDanych(sciezka)
+        model = ModelHistorii(baza)
+        model.odswiez()
+        for _ in range(strony - 1):
+            model.fetchMore()
+        wiersze = model.rowCount()
+        print(f"Odświeżenie historii po 3 zmianach innego połączenia ({n} wpisów, {wiersze} wierszy w widoku):")
+        ids = [model.wpis(i)['id'] for i in (1, wiersze - 1)]
+
+        def zmiany():
+            inna.dodaj_wpis("123-4567-890", "Box", "do 2m2", {METODY[0]: random.random() + 1}, 1.0)
+            inna.aktualizuj_czas_produkcji(ids[0], 1.1, 10.0)
+            inna.usun_wpis(ids.pop())
+            ids.append(model.wpis(model.rowCount() - 2)['id'])
+
+        def od_nowa():
+            model.odswiez()
+            while model.rowCount() < wiersze and model.canFetchMore():
+                model.fetchMore()
+        for opis, odswiez in (("lista od nowa", od_nowa), ("odswiez_zmiany", model.odswiez_zmiany)):
+            czasy = []
+            for _ in range(20):
+                zmiany()
+                t0 = time.perf_counter()
+                odswiez()
+                app.processEvents()
+                czasy.append(time.perf_counter() - t0)
+            print(f"  {opis:<16} {sorted(czasy)[len(czasy) // 2] * 1000:8.2f} ms (mediana)")
+        t0 = time.perf_counter()
+        for _ in range(1000):
+            model.odswiez_zmiany()
+        print(f"  {'bez zmian':<16} {(time.perf_counter() - t0) * 1000:8.3f} µs / wywołanie")
+        baza.zamknij()
+        inna.zamknij()
+
+
+def _walidacje_i_powtorzenia(db_path, ziarno=1):
+    """Losowo co trzecie obliczenie zwalidowane (odchylenie od -40 do 40%), co pięćdziesiąte powtórzone."""
+    los = random.Random(ziarno)
+    conn = sqlite3.connect(db_path)
+    with conn:
+        ids = [r[0] for r in conn.execute("SELECT id FROM obliczenia")]
+        odchylenia = ((los.uniform(-40, 40), i) for i in ids if los.random() < 1 / 3)
+        conn.executemany("UPDATE obliczenia SET czas_produkcji = czas_total * (1 + ?1 / 100), odchylenie = ?1 "
+                         "WHERE id = ?2", odchylenia)
+        powtorzone = ((los.randint(2, 6), i) for i in ids if los.random() < 1 / 50)
+        conn.executemany("UPDATE obliczenia SET wystapienia = ?, pierwszy_znacznik = znacznik - 600 "
+                         "WHERE id = ?", powtorzone)
+    conn.close()
+
+
+def pomiar_filtrow(n):
+    """Pierwsza strona historii przy każdym sortowaniu i filtrze z paska filtrów (bez cache)."""
+    from database import BazaDanych, SORTOWANIA
+    from konserwacja import analizuj
+    filtry = {
+        "bez filtrów": {},
+        "prefiks kodu 123-4": {"kod_prefix": "123-4"},
+        "prefiks kodu 5": {"kod_prefix": "5"},
+        "grupa": {"grupa": "Box"},
+        "grupa + przedział": {"grupa": "Box", "przedzial": "do 2m2"},
+        "miesiąc": {"od": "2022-03-01", "do": "2022-04-01"},
+        "rok": {"od": "2022-01-01", "do": "2023-01-01"},
+        "niezwalidowane": {"status": "niezwalidowane"},
+        "w normie": {"status": "w_normie"},
+        "poza normą + grupa": {"status": "poza_norma", "grupa": "Koła"},
+        "poza normą + miesiąc": {"status": "poza_norma", "od": "2022-03-01", "do": "2022-04-01"},
+    }
+    with tempfile.TemporaryDirectory() as katalog:
+        sciezka = os.path.join(katalog, "historia.db")
+        BazaDanych(sciezka).zamknij()
+        wypelnij_historie(sciezka, n)
+        _walidacje_i_powtorzenia(sciezka)
+        baza = BazaDanych(sciezka, cache_wynikow=0)
+        # Statystyki planisty jak po konserwacji w tle
+        analizuj(baza)
+        print(f"Pierwsza strona (200 wpisów) z historii {n} wpisów, najgorszy z kierunków sortowania [ms]:")
+        print(f"  {'':<22}" + "".join(f"{s[:9]:>10}" for s in SORTOWANIA))
+        najgorszy = 0.0
+        for opis, f in filtry.items():
+            czasy = []
+            for sortuj in SORTOWANIA:
+                czas = 0.0
+                for rosnaco in (False, True):
+                    t0 = time.perf_counter()
+                    strona = baza.pobierz_strone(limit=200, sortuj=sortuj, rosnaco=rosnaco, **f)
+                    # Kolejna strona za kursorem – koszt jak pierwszej
+                    if strona:
+                        baza.pobierz_strone(po=baza.kursor(strona[-1], sortuj), limit=200, sortuj=sortuj,
+                                            rosnaco=rosnaco, **f)
+                    czas = max(czas, (time.perf_counter() - t0) / 2)
+                czasy.append(czas)
+            najgorszy = max(najgorszy, *czasy)
+            print(f"  {opis:<22}" + "".join(f"{c * 1000:10.1f}" for c in czasy))
+        baza.zamknij()
+        print(f"Najgorszy przypadek: {najgorszy * 1000:.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    sub = parser.add_subparsers(dest="polecenie", required=True)
+
+    p = sub.add_parser("konfiguracja", help="współbieżne zapisy pliku konfiguracji")
+    p.add_argument("--procesy", type=int, default=12)
+    p.add_argument("--zapisy", type=int, default=25)
+
+    p = sub.add_parser("polaczenie", help="zapis/odczyt historii: stałe połączenie vs nowe")
+    p.add_argument("-n", type=int, default=2000)
+
+    p = sub.add_parser("pobierz", help="pobierz_wszystkie: N+1 vs stała liczba zapytań")
+    p.add_argument("rozmiary", type=int, nargs="*", default=[10_000, 100_000, 1_000_000])
+
+    p = sub.add_parser("plany", help="sprawdzenie planów zapytań (EXPLAIN QUERY PLAN)")
+    p.add_argument("-n", type=int, default=10_000)
+
+    p = sub.add_parser("wstawianie", help="dodaj_wpis vs dodaj_wpisy")
+    p.add_argument("-n", type=int, default=500_000)
+
+    p = sub.add_parser("powtorzenia", help="zapis różnych obliczeń vs powtórzeń tego samego")
+    p.add_argument("-n", type=int, default=200_000)
+    p.add_argument("--powtorzen", type=int, default=10)
+
+    p = sub.add_parser("kolejka", help="zapis w wątku okna vs zapis w tle")
+    p.add_argument("-n", type=int, default=5000)
+
+    p = sub.add_parser("cache", help="powtórne odczyty: bez cache vs cache z PRAGMA data_version")
+    p.add_argument("-n", type=int, default=200_000)
+
+    p = sub.add_parser("import", help="importuj_z_excel: skoroszyt z eksportu do pustej bazy")
+    p.add_argument("-n", type=int, default=500_000)
+
+    p = sub.add_parser("historia", help="zakładka historii: QTableWidget vs model stron")
+    p.add_argument("-n", type=int, default=100_000)
+
+    p = sub.add_parser("odswiezanie", help="zakładka historii po zmianach: lista od nowa vs przyrostowo")
+    p.add_argument("-n", type=int, default=1_000_000)
+
+    p = sub.add_parser("filtry", help="strony historii przy każdym sortowaniu i filtrze")
+    p.add_argument("-n", type=int, default=1_000_000)
+
+    p = sub.add_parser("slowniki", help="rozmiar bazy i czas skanów: nazwy jako tekst vs słowniki")
+    p.add_argument("-n", type=int, default=1_000_000)
+
+    p = sub.add_parser("eksport", help="export_do_excel: pandas vs zapis strumieniowy")
+    p.add_argument("-n", type=int, default=1_000_000, help="wpisów w eksporcie strumieniowym")
+    p.add_argument("--stary", type=int, default=100_000, help="wpisów w starym eksporcie (0 – pomiń)")
+
+    args = parser.parse_args()
+    if args.polecenie == "konfiguracja":
+        return 0 if stres_konfiguracji(args.procesy, args.zapisy) else 1
+    if args.polecenie == "polaczenie":
+        porownaj_polaczenia(args.n)
+    if args.polecenie == "pobierz":
+        porownaj_pobierz_wszystkie(args.rozmiary)
+    if args.polecenie == "wstawianie":
+        porownaj_wstawianie(args.n)
+    if args.polecenie == "eksport":
+        porownaj_eksport(args.n, args.stary)
+    if args.polecenie == "cache":
+        porownaj_cache(args.n)
+    if args.polecenie == "import":
+        pomiar_importu(args.n)
+    if args.polecenie == "historia":
+        porownaj_historie(args.n)
+    if args.polecenie == "odswiezanie":
+        porownaj_odswiezanie(args.n)
+    if args.polecenie == "filtry":
+        pomiar_filtrow(args.n)
+    if args.polecenie == "slowniki":
+        porownaj_slowniki(args.n)
+    if args.polecenie == "powtorzenia":
+        porownaj_powtorzenia(args.n, args.powtorzen)
+    if args.polecenie == "kolejka":
+        porownaj_zapis_w_tle(args.n)
+    if args.polecenie == "plany":
+        return 0 if sprawdz_plany(args.n) else 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    sys.exit(main())
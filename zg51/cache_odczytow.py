@@ -0,0 +1,95 @@
+"""Cache wyników odczytów historii ważny, dopóki dane w bazie się nie zmienią.
+
+Wynik metody odczytu BazaDanych zapamiętywany jest pod kluczem (metoda,
+argumenty) razem z wersją danych, przy której powstał. Wersja to para:
+licznik transakcji zatwierdzonych przez to połączenie i PRAGMA
+data_version – ta zmienia się po zapisie innego połączenia, także z innego
+procesu (np. wątku zapisu w tle), ale nie po własnych zapisach połączenia.
+Sprawdzenie wersji to jedno zapytanie PRAGMA, więc powtórny odczyt
+niezmienionych danych kosztuje mikrosekundy. Zmiana wersji unieważnia cały
+cache naraz.
+
+Zapamiętany wynik jest współdzielony przez kolejne wywołania – wywołujący
+nie może go modyfikować.
+"""
+import functools
+from collections import OrderedDict
+
+
+def _zamroz(wartosc):
+    """Argument jako część klucza: listy i zbiory jako krotki."""
+    if isinstance(wartosc, (list, tuple)):
+        return tuple(_zamroz(w) for w in wartosc)
+    if isinstance(wartosc, (set, frozenset)):
+        return frozenset(wartosc)
+    return wartosc
+
+
+class CacheOdczytow:
+    """Wyniki odczytów w kolejności LRU, najwyżej `rozmiar` (0 – cache wyłączony)."""
+
+    def __init__(self, rozmiar=32):
+        self.rozmiar = rozmiar
+        self._wyniki = OrderedDict()
+        self._wersja = None
+        self._metryki = {'trafienia': 0, 'chybienia': 0, 'pominiete': 0, 'uniewaznienia': 0}
+
+    def pobierz(self, klucz, wersja, oblicz):
+        """Wynik dla klucza przy wersji danych `wersja`; brak – oblicz() i zapamiętanie."""
+        if wersja != self._wersja:
+            if self._wyniki:
+                self._metryki['uniewaznienia'] += 1
+            self._wyniki.clear()
+            self._wersja = wersja
+        try:
+            wynik = self._wyniki[klucz]
+        except KeyError:
+            pass
+        except TypeError:
+            # Argument bez hasha (np. słownik) – odczyt bez cache
+            self._metryki['pominiete'] += 1
+            return oblicz()
+        else:
+            self._wyniki.move_to_end(klucz)
+            self._metryki['trafienia'] += 1
+            return wynik
+        self._metryki['chybienia'] += 1
+        wynik = oblicz()
+        if self.rozmiar > 0:
+            self._wyniki[klucz] = wynik
+            while len(self._wyniki) > self.rozmiar:
+                self._wyniki.popitem(last=False)
+        return wynik
+
+    def pomin(self):
+        """Odczyt z pominięciem cache (np. wewnątrz otwartej transakcji)."""
+        self._metryki['pominiete'] += 1
+
+    def wyczysc(self):
+        self._wyniki.clear()
+        self._wersja = None
+
+    def metryki(self):
+        """Liczniki trafień, chybień, odczytów pominiętych i unieważnień, liczba wyników i skuteczność."""
+        wynik = dict(self._metryki)
+        wynik['wyniki'] = len(self._wyniki)
+        zapytania = wynik['trafienia'] + wynik['chybienia']
+        wynik['skutecznosc'] = wynik['trafienia'] / zapytania if zapytania else 0.0
+        return wynik
+
+
+def z_cache(metoda):
+    """
+    Dekorator metody odczytu BazaDanych: wynik z cache_odczytow, gdy wersja
+    danych (BazaDanych.wersja_danych) się nie zmieniła. Wewnątrz otwartej
+    transakcji widać niezatwierdzone zmiany – wtedy odczyt idzie do bazy.
+    """
+    @functools.wraps(metoda)
+    def odczyt(self, *args, **kwargs):
+        if self.conn.in_transaction:
+            self.cache_odczytow.pomin()
+            return metoda(self, *args, **kwargs)
+        klucz = (metoda.__name__, _zamroz(args), _zamroz(tuple(sorted(kwargs.items()))))
+        return self.cache_odczytow.pobierz(klucz, self.wersja_danych(),
+                                           lambda: metoda(self, *args, **kwargs))
+    return odczyt
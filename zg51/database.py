@@ -1,144 +1,1539 @@
+import functools
+import hashlib
+import heapq
+import os
 import sqlite3
-import pandas as pd
-from datetime import datetime
+from contextlib import contextmanager
+from datetime import date, datetime, time
+from itertools import islice
+
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font
+
+from cache_odczytow import CacheOdczytow, z_cache
+from migracja import (dodaj_wystapienia, dodaj_znacznik_czasu, migruj_z_zg5, przygotuj_migracje_zg5,
+                      zakoduj_slowniki)
+from utils import waliduj_kod
+
+# Numer schematu zapisywany w PRAGMA user_version (0 – baza sprzed numeracji)
+WERSJA_SCHEMATU = 5
+
+# Wierszy danych w arkuszu Excela (limit formatu: 1 048 576 wierszy z nagłówkiem)
+MAKS_WIERSZY_ARKUSZA = 1_048_575
+
+# Nagłówki arkusza "Podsumowanie" eksportu do Excela -> pola wpisu (import_excel.py czyta te same)
+KOLUMNY_EXCELA = {'ID': 'id', 'Kod': 'kod', 'Data': 'data', 'Grupa': 'grupa', 'Przedział': 'przedzial',
+                  'Czas total [min]': 'czas_total', 'Czas produkcji [min]': 'czas_produkcji',
+                  'Odchylenie [%]': 'odchylenie', 'Wystąpienia': 'wystapienia',
+                  'Pierwsza data': 'pierwsza_data'}
+
+# Od tylu wpisów w partii dodaj_wpisy liczy statystyki zbiorczo, bez wyzwalaczy
+PROG_ZAPISU_MASOWEGO = 1000
+
+# Tyle ostatnich zmian obliczeń pamięta dziennik zmian (tabela zmiany)
+DZIENNIK_ZMIAN = 10000
+
+# Powtórzenie obliczenia łączone jest z poprzednim wykonaniem, gdy dzieli je
+# najwyżej tyle sekund i ten sam dzień – wpis nie przechodzi przez granicę
+# dnia ani miesiąca statystyk (patrz dodaj_wpisy)
+OKNO_POWTORZEN_S = 15 * 60
+
+# Czas obliczenia to `znacznik` – sekundy od epoki Unix (UTC). Daty dla ludzi
+# (pole 'data' wpisów, miesiące statystyk, dni i tygodnie) liczone są w SQL
+# w czasie lokalnym.
+def data_lokalna(wyrazenie, format="%Y-%m-%dT%H:%M:%S"):
+    """Wyrażenie SQL: znacznik czasu `wyrazenie` jako tekst w czasie lokalnym."""
+    return f"strftime('{format}', {wyrazenie}, 'unixepoch', 'localtime')"
+
+
+def znacznik(wartosc):
+    """
+    Znacznik czasu (sekundy od epoki) dla datetime/date lub tekstu ISO –
+    bez strefy czasowej traktowanych jako czas lokalny – albo liczby.
+    """
+    if isinstance(wartosc, (int, float)):
+        return int(wartosc)
+    if isinstance(wartosc, str):
+        wartosc = datetime.fromisoformat(wartosc)
+    elif not isinstance(wartosc, datetime):
+        wartosc = datetime.combine(wartosc, time())
+    return int(wartosc.timestamp())
+
+
+# Grupy, przedziały i metody zapisywane są jako klucze tabel słownikowych
+# (słownik archiwum jest kopią słownika bazy głównej, więc klucz znaczy to
+# samo w każdym pliku), a kod xxx-xxxx-xxx – jako liczba z jego 10 cyfr.
+# Kod spoza formatu (dane sprzed walidacji kodów) zostaje tekstem.
+SLOWNIKI = ("grupy", "przedzialy", "metody")
+KOD_TEKST = ("CASE typeof(kod) WHEN 'integer' THEN "
+             "printf('%03d-%04d-%03d', kod / 10000000, kod / 1000 % 10000, kod % 1000) ELSE kod END")
+
+
+def kod_liczba(kod):
+    """Kod xxx-xxxx-xxx jako liczba zapisywana w bazie; kod spoza formatu bez zmian."""
+    return int(kod.replace("-", "")) if waliduj_kod(kod) else kod
+
+
+def nazwa_ze_slownika(slownik, klucz, schemat=None):
+    """Wyrażenie SQL: nazwa ze słownika `slownik` dla wyrażenia-klucza `klucz`."""
+    tabela = f"{schemat}.{slownik}" if schemat else slownik
+    return f"(SELECT nazwa FROM {tabela} WHERE {tabela}.id = {klucz})"
+
+
+def powtorzenie(ostatni, czas):
+    """Czy obliczenie z chwili `czas` łączy się z wykonanym o `ostatni` (OKNO_POWTORZEN_S, ten sam dzień)."""
+    return (abs(czas - ostatni) <= OKNO_POWTORZEN_S
+            and datetime.fromtimestamp(czas).date() == datetime.fromtimestamp(ostatni).date())
+
+
+def skrot_obliczenia(wpis):
+    """
+    Skrót treści obliczenia (wpis jak w dodaj_wpisy): kod, grupa, przedział,
+    metraże, wymuszeni pracownicy, wersja stawek i wynik – 64-bitowa liczba
+    ze znakiem. Kolejność metod w słownikach nie ma znaczenia.
+    """
+    # repr krotki nazw i liczb jest kanoniczny, a kilka razy szybszy od json.dumps
+    tresc = (wpis['kod'], wpis['grupa'], wpis['przedzial'],
+             sorted((m, float(v)) for m, v in wpis['metry_dict'].items() if v > 0),
+             sorted((m, int(n)) for m, n in (wpis.get('wymuszeni_pracownicy') or {}).items()),
+             wpis.get('wersja_stawek'), float(wpis['czas_total']))
+    return int.from_bytes(hashlib.blake2b(repr(tresc).encode(), digest_size=8).digest(), "big", signed=True)
+
+
+# Kolumny tabeli obliczenia i kolumny wpisu zwracane przez zapytania historii
+# (te drugie pokrywa idx_obliczenia_historia; klucze grupy i przedziału
+# zamienia na nazwy _dolacz_metraze). Powtórzone obliczenie to jeden wiersz:
+# wystapienia – ile razy je wykonano, znacznik – ostatni raz, pierwszy_znacznik
+# – pierwszy (NULL, gdy wykonano je raz). Liczby obliczeń i sumy czasów
+# (statystyki, podsumuj_zakres) ważone są liczbą wystąpień.
+KOLUMNY_OBLICZENIA = ("id, kod, znacznik, grupa_id, przedzial_id, czas_total, czas_produkcji, odchylenie, "
+                      "skrot, wystapienia, pierwszy_znacznik")
+KOLUMNY_WPISU = (f"id, {KOD_TEKST} AS kod, {data_lokalna('znacznik')} AS data, znacznik, "
+                 "grupa_id AS grupa, przedzial_id AS przedzial, czas_total, czas_produkcji, odchylenie, "
+                 f"wystapienia, {data_lokalna('COALESCE(pierwszy_znacznik, znacznik)')} AS pierwsza_data")
+
+# Okresy podsumowań zakresu: etykieta okresu (dzień lub poniedziałek tygodnia)
+OKRESY = {
+    "dzien": "date(znacznik, 'unixepoch', 'localtime')",
+    "tydzien": "date(znacznik, 'unixepoch', 'localtime', 'weekday 0', '-6 days')",
+}
+
+# Statusy odchylenia z progami jak w podsumowaniu walidacji. Status obejmuje
+# zwykle sporą część historii – stronę szybciej daje indeks sortowania niż
+# zakres odchylenia, więc warunki na abs() celowo nie trafiają w indeks
+STATUSY_ODCHYLENIA = {
+    "niezwalidowane": "czas_produkcji IS NULL",
+    "zwalidowane": "czas_produkcji IS NOT NULL",
+    "w_normie": "abs(odchylenie) <= 10",
+    "dopuszczalne": "abs(odchylenie) > 10 AND abs(odchylenie) <= 20",
+    "poza_norma": "abs(odchylenie) > 20",
+}
+
+# Filtr grupy i przedziału obejmujący co najmniej taki ułamek historii nie
+# wybiera indeksu strony: szybciej przejść indeks sortowania (pasujący wpis
+# trafia się co kilkadziesiąt wierszy), niż posortować wszystkie wpisy grupy.
+# Ułamki liczone są z tabeli statystyki – statystyki planisty z próbki
+# (konserwacja.analizuj, analysis_limit) zaniżają liczbę wierszy na klucz
+# kilku wartości i planista sam wybierałby indeks grupy
+PROG_INDEKSU_SLOWNIKA = 0.01
+
+# Pola wpisu, wg których można sortować strony historii (patrz _segmenty_sortowania)
+SORTOWANIA = ("id", "kod", "data", "grupa", "przedzial", "czas_total", "czas_produkcji", "odchylenie",
+              "wystapienia")
+
+
+def warunki_kodu(prefiks=None, srodek=None, koncowka=None):
+    """
+    Warunki WHERE dla fragmentów kodu xxx-xxxx-xxx, dobrane tak, by trafiały
+    w indeksy. Kod zapisany jest jako liczba z jego cyfr, więc prefiks to
+    przedział liczb na kolumnie kod; srodek – przedział na kod / 1000 % 10000;
+    koncowka (1–3 ostatnie cyfry) – lista IN pełnych wariantów kod % 1000.
+    Zwraca (lista_warunków, parametry).
+    """
+    warunki, parametry = [], []
+    if prefiks:
+        if len(prefiks) > 12 or not all(z == "-" if i in (3, 8) else z.isdigit() for i, z in enumerate(prefiks)):
+            raise ValueError(f"Nieprawidłowy prefiks kodu: {prefiks!r}")
+        cyfry = prefiks.replace("-", "")
+        mnoznik = 10 ** (10 - len(cyfry))
+        warunki.append("kod >= ? AND kod < ?")
+        parametry += [int(cyfry) * mnoznik, (int(cyfry) + 1) * mnoznik]
+    if srodek:
+        if not (srodek.isdigit() and len(srodek) <= 4):
+            raise ValueError(f"Nieprawidłowy segment środkowy kodu: {srodek!r}")
+        mnoznik = 10 ** (4 - len(srodek))
+        warunki.append("kod / 1000 % 10000 >= ? AND kod / 1000 % 10000 < ?")
+        parametry += [int(srodek) * mnoznik, (int(srodek) + 1) * mnoznik]
+    if koncowka:
+        if not (koncowka.isdigit() and len(koncowka) <= 3):
+            raise ValueError(f"Nieprawidłowa końcówka kodu: {koncowka!r}")
+        warianty = [i * 10 ** len(koncowka) + int(koncowka) for i in range(10 ** (3 - len(koncowka)))]
+        warunki.append(f"kod % 1000 IN ({','.join('?' * len(warianty))})")
+        parametry += warianty
+    return warunki, parametry
+
+def _zmiana_statystyk(wiersz, znak):
+    """
+    SQL dodający (znak "+") lub odejmujący ("-") wiersz obliczenia `wiersz`
+    (NEW/OLD w wyzwalaczu) od tabeli statystyki.
+    """
+    grupa = nazwa_ze_slownika("grupy", f"{wiersz}.grupa_id")
+    przedzial = nazwa_ze_slownika("przedzialy", f"{wiersz}.przedzial_id")
+    sql = f"""
+        INSERT INTO statystyki (grupa, przedzial, miesiac, liczba, suma_czas_total, liczba_walidacji,
+                                suma_czas_produkcji, suma_odchylen, suma_odchylen_abs)
+        VALUES ({grupa}, {przedzial}, {data_lokalna(f'{wiersz}.znacznik', '%Y-%m')}, {znak}{wiersz}.wystapienia,
+                {znak}{wiersz}.czas_total * {wiersz}.wystapienia, {znak}({wiersz}.odchylenie IS NOT NULL),
+                {znak}COALESCE({wiersz}.czas_produkcji, 0), {znak}COALESCE({wiersz}.odchylenie, 0),
+                {znak}COALESCE(abs({wiersz}.odchylenie), 0))
+        ON CONFLICT (grupa, przedzial, miesiac) DO UPDATE SET
+            liczba = liczba + excluded.liczba,
+            suma_czas_total = suma_czas_total + excluded.suma_czas_total,
+            liczba_walidacji = liczba_walidacji + excluded.liczba_walidacji,
+            suma_czas_produkcji = suma_czas_produkcji + excluded.suma_czas_produkcji,
+            suma_odchylen = suma_odchylen + excluded.suma_odchylen,
+            suma_odchylen_abs = suma_odchylen_abs + excluded.suma_odchylen_abs;"""
+    if znak == "-":
+        sql += f"""
+        DELETE FROM statystyki
+        WHERE grupa = {grupa} AND przedzial = {przedzial}
+          AND miesiac = {data_lokalna(f'{wiersz}.znacznik', '%Y-%m')} AND liczba = 0;"""
+    return sql
+
+
+def _zmiana_statystyk_metod(zrodlo, grupa, czas, wystapienia, znak):
+    """
+    SQL dodający lub odejmujący metraże ze `zrodlo` (FROM ... WHERE zwracające
+    kolumny metoda_id, metry) od statystyk metod dla wyrażeń `grupa` (nazwa),
+    `czas` (znacznik) i `wystapienia` (waga metrażu).
+    """
+    miesiac = data_lokalna(czas, "%Y-%m")
+    sql = f"""
+        INSERT INTO statystyki_metod (grupa, metoda, miesiac, liczba, suma_metrow)
+        SELECT {grupa}, {nazwa_ze_slownika("metody", "metoda_id")}, {miesiac}, {znak}{wystapienia},
+               {znak}metry * {wystapienia} {zrodlo}
+        ON CONFLICT (grupa, metoda, miesiac) DO UPDATE SET
+            liczba = liczba + excluded.liczba,
+            suma_metrow = suma_metrow + excluded.suma_metrow;"""
+    if znak == "-":
+        sql += f"""
+        DELETE FROM statystyki_metod WHERE liczba = 0 AND grupa = {grupa} AND miesiac = {miesiac};"""
+    return sql
+
+
+def _zmiana_statystyk_metrazu(wiersz, znak):
+    """Zmiana statystyk metod dla pojedynczego wiersza metry_obliczenia (NEW/OLD)."""
+    rodzic = f"FROM obliczenia WHERE id = {wiersz}.obliczenie_id"
+    return _zmiana_statystyk_metod(
+        f"FROM (SELECT {wiersz}.metoda_id AS metoda_id, {wiersz}.metry AS metry) "
+        f"WHERE EXISTS (SELECT 1 {rodzic})",
+        f"(SELECT {nazwa_ze_slownika('grupy', 'grupa_id')} {rodzic})", f"(SELECT znacznik {rodzic})",
+        f"(SELECT wystapienia {rodzic})", znak)
+
+
+# Wyzwalacze utrzymujące tabele statystyk i dziennik zmian. Usunięcie obliczenia odejmuje
+# metraże jego dzieci już w BEFORE DELETE – wyzwalacz metraży działa tylko,
+# gdy rodzic wciąż istnieje, więc kaskada (lub jej brak) niczego nie liczy dwa razy.
+_ZMIANA_STATYSTYK_METOD = (f"(OLD.grupa_id IS NOT NEW.grupa_id OR OLD.wystapienia IS NOT NEW.wystapienia "
+                           f"OR {data_lokalna('OLD.znacznik', '%Y-%m')} IS NOT {data_lokalna('NEW.znacznik', '%Y-%m')})")
+WYZWALACZE = {
+    "tr_obliczenia_ins": f"""
+        AFTER INSERT ON obliczenia BEGIN
+            {_zmiana_statystyk("NEW", "+")}
+        END""",
+    "tr_obliczenia_upd": f"""
+        AFTER UPDATE OF grupa_id, przedzial_id, znacznik, czas_total, czas_produkcji, odchylenie, wystapienia
+        ON obliczenia BEGIN
+            {_zmiana_statystyk("OLD", "-")}
+            {_zmiana_statystyk("NEW", "+")}
+            {_zmiana_statystyk_metod(
+                f"FROM metry_obliczenia WHERE obliczenie_id = OLD.id AND {_ZMIANA_STATYSTYK_METOD}",
+                nazwa_ze_slownika("grupy", "OLD.grupa_id"), "OLD.znacznik", "OLD.wystapienia", "-")}
+            {_zmiana_statystyk_metod(
+                f"FROM metry_obliczenia WHERE obliczenie_id = NEW.id AND {_ZMIANA_STATYSTYK_METOD}",
+                nazwa_ze_slownika("grupy", "NEW.grupa_id"), "NEW.znacznik", "NEW.wystapienia", "+")}
+        END""",
+    "tr_obliczenia_del": f"""
+        BEFORE DELETE ON obliczenia BEGIN
+            {_zmiana_statystyk_metod("FROM metry_obliczenia WHERE obliczenie_id = OLD.id",
+                                     nazwa_ze_slownika("grupy", "OLD.grupa_id"), "OLD.znacznik",
+                                     "OLD.wystapienia", "-")}
+            {_zmiana_statystyk("OLD", "-")}
+        END""",
+    "tr_metry_ins": f"""
+        AFTER INSERT ON metry_obliczenia BEGIN
+            {_zmiana_statystyk_metrazu("NEW", "+")}
+        END""",
+    "tr_metry_del": f"""
+        AFTER DELETE ON metry_obliczenia BEGIN
+            {_zmiana_statystyk_metrazu("OLD", "-")}
+        END""",
+    "tr_metry_upd": f"""
+        AFTER UPDATE ON metry_obliczenia BEGIN
+            {_zmiana_statystyk_metrazu("OLD", "-")}
+            {_zmiana_statystyk_metrazu("NEW", "+")}
+        END""",
+    # Dziennik zmian (patrz zmiany_historii) – nowe obliczenia rozpoznaje się po ID,
+    # więc wstawień się nie notuje; najstarsze zmiany ponad DZIENNIK_ZMIAN są usuwane
+    "tr_zmiany_upd": f"""
+        AFTER UPDATE ON obliczenia BEGIN
+            INSERT INTO zmiany (obliczenie_id) VALUES (NEW.id);
+            DELETE FROM zmiany WHERE nr <= last_insert_rowid() - {DZIENNIK_ZMIAN};
+        END""",
+    "tr_zmiany_del": f"""
+        AFTER DELETE ON obliczenia BEGIN
+            INSERT INTO zmiany (obliczenie_id) VALUES (OLD.id);
+            DELETE FROM zmiany WHERE nr <= last_insert_rowid() - {DZIENNIK_ZMIAN};
+        END""",
+}
+
+
+@functools.total_ordering
+class _Malejaco:
+    """Wartość porównywana odwrotnie – część klucza kolejności malejącej."""
+    __slots__ = ("wartosc",)
+
+    def __init__(self, wartosc):
+        self.wartosc = wartosc
+
+    def __eq__(self, inna):
+        return self.wartosc == inna.wartosc
+
+    def __lt__(self, inna):
+        return inna.wartosc < self.wartosc
+
 
 class BazaDanych:
-    """Klasa zarządzająca relacyjną bazą SQLite z historią obliczeń."""
-    def __init__(self, db_path="historia.db"):
+    """Klasa zarządzająca relacyjną bazą SQLite z historią obliczeń.
+
+    Trzyma jedno długotrwałe połączenie (tryb autocommit, transakcje otwierane
+    jawnie przez `transakcja()`), z dziennikiem WAL, więc odczyty nie czekają
+    na zapisy. Na udziale sieciowym należy podać journal_mode="DELETE".
+    Baza w schemacie zg5 jest przy otwarciu migrowana (patrz migracja.py).
+    Wyniki metod odczytu oznaczonych @z_cache trafiają do cache_odczytow
+    (cache_wynikow – ile ostatnich wyników, 0 – bez cache) i są ważne do
+    zmiany danych w bazie (patrz cache_odczytow.py).
+    scalaj_powtorzenia=False – każde obliczenie to osobny wiersz (patrz dodaj_wpisy).
+    """
+    def __init__(self, db_path="historia.db", journal_mode="WAL", synchronous="NORMAL",
+                 cache_kb=16384, busy_timeout_ms=5000, postep_migracji=None, cache_wynikow=32,
+                 scalaj_powtorzenia=True):
         self.db_path = db_path
-        self._init_db()
+        self.scalaj_powtorzenia = scalaj_powtorzenia
+        self.journal_mode = journal_mode
+        self.synchronous = synchronous
+        self.cache_kb = cache_kb
+        self.busy_timeout_ms = busy_timeout_ms
+        self._wyczysc_klucze()
+        self.cache_odczytow = CacheOdczytow(cache_wynikow)
+        self._zatwierdzone = 0         # transakcje zatwierdzone przez to połączenie
+        self.conn = self._polacz()
+        if self.wersja_schematu() > WERSJA_SCHEMATU:
+            self.zamknij()
+            raise RuntimeError(f"Baza {db_path} ma schemat w wersji nowszej niż obsługiwana ({WERSJA_SCHEMATU}).")
+        migracja_zg5 = przygotuj_migracje_zg5(self.conn)
+        dodaj_znacznik_czasu(self)
+        zakoduj_slowniki(self)
+        dodaj_wystapienia(self)
+        self._init_db(migracja_zg5)
+        if migracja_zg5:
+            migruj_z_zg5(self, WERSJA_SCHEMATU, postep=postep_migracji)
+
+    def _polacz(self):
+        """Otwiera połączenie i ustawia parametry pracy SQLite."""
+        conn = sqlite3.connect(self.db_path, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.execute(f"PRAGMA busy_timeout = {int(self.busy_timeout_ms)}")
+        # Działa tylko w nowej, pustej bazie – musi poprzedzać journal_mode (patrz konserwacja.py)
+        conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        conn.execute(f"PRAGMA journal_mode = {self.journal_mode}")
+        conn.execute(f"PRAGMA synchronous = {self.synchronous}")
+        conn.execute(f"PRAGMA cache_size = -{int(self.cache_kb)}")
+        conn.execute("PRAGMA temp_store = MEMORY")
+        # ON DELETE CASCADE metraży działa tylko z włączonymi kluczami obcymi
+        conn.execute("PRAGMA foreign_keys = ON")
+        return conn
+
+    @contextmanager
+    def transakcja(self):
+        """Jawna transakcja zapisu; wewnątrz innej transakcji dołącza do niej."""
+        if self.conn.in_transaction:
+            yield self.conn
+            return
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield self.conn
+        except BaseException:
+            self.conn.execute("ROLLBACK")
+            # Klucze nadane w wycofanej transakcji nie istnieją
+            self._wyczysc_klucze()
+            raise
+        self.conn.execute("COMMIT")
+        self._zatwierdzone += 1
+
+    @contextmanager
+    def odczyt(self):
+        """Transakcja tylko do odczytu – kilka zapytań widzi tę samą migawkę."""
+        if self.conn.in_transaction:
+            yield self.conn
+            return
+        self.conn.execute("BEGIN")
+        try:
+            yield self.conn
+        finally:
+            self.conn.execute("COMMIT")
+
+    def zamknij(self):
+        """Zamyka połączenie (przy WAL wykonuje też checkpoint)."""
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+    def wersja_danych(self):
+        """
+        Wersja danych dla cache odczytów: liczba własnych zatwierdzonych
+        transakcji i PRAGMA data_version (zmienia ją zapis innego połączenia).
+        """
+        return self._zatwierdzone, self.conn.execute("PRAGMA data_version").fetchone()[0]
 
-    def _init_db(self):
+    def metryki_cache(self):
+        """Trafienia, chybienia, skuteczność itd. cache odczytów (CacheOdczytow.metryki)."""
+        return self.cache_odczytow.metryki()
+
+    def wersja_schematu(self):
+        """Numer schematu zapisany w bazie (PRAGMA user_version)."""
+        return self.conn.execute("PRAGMA user_version").fetchone()[0]
+
+    @staticmethod
+    def _utworz_tabele(conn, schemat="main"):
+        """Tworzy tabele historii i ich indeksy w bazie głównej lub dołączonym archiwum."""
+        # Słowniki nazw grup, przedziałów i metod
+        for slownik in SLOWNIKI:
+            conn.execute(f"""
+                CREATE TABLE IF NOT EXISTS {schemat}.{slownik} (
+                    id INTEGER PRIMARY KEY,
+                    nazwa TEXT NOT NULL UNIQUE
+                )
+            """)
+        # Główna tabela obliczeń (kod – patrz KOD_TEKST)
+        conn.execute(f"""
+            CREATE TABLE IF NOT EXISTS {schemat}.obliczenia (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                kod INTEGER NOT NULL,
+                znacznik INTEGER NOT NULL,
+                grupa_id INTEGER NOT NULL REFERENCES grupy(id),
+                przedzial_id INTEGER NOT NULL REFERENCES przedzialy(id),
+                czas_total REAL NOT NULL,
+                czas_produkcji REAL,
+                odchylenie REAL,
+                skrot INTEGER,
+                wystapienia INTEGER NOT NULL DEFAULT 1,
+                pierwszy_znacznik INTEGER
+            )
+        """)
+        # Tabela metraży – osobne wiersze dla każdej metody
+        conn.execute(f"""
+            CREATE TABLE IF NOT EXISTS {schemat}.metry_obliczenia (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                obliczenie_id INTEGER NOT NULL,
+                metoda_id INTEGER NOT NULL REFERENCES metody(id),
+                metry REAL NOT NULL,
+                FOREIGN KEY (obliczenie_id) REFERENCES obliczenia(id) ON DELETE CASCADE
+            )
+        """)
+        # Indeksy pod rzeczywiste ścieżki dostępu; CREATE IF NOT EXISTS dokłada je
+        # także w istniejących bazach. Indeks metraży jest pokrywający, więc
+        # zastępuje dawny idx_metry_obliczenie.
+        conn.execute(f"DROP INDEX IF EXISTS {schemat}.idx_metry_obliczenie")
+        conn.execute(f"CREATE INDEX IF NOT EXISTS {schemat}.idx_metry_pokrywajacy "
+                     "ON metry_obliczenia(obliczenie_id, metoda_id, metry)")
+        # Lista historii (znacznik, id malejąco) w całości z indeksu
+        conn.execute(f"CREATE INDEX IF NOT EXISTS {schemat}.idx_obliczenia_historia ON obliczenia("
+                     "znacznik, id, kod, grupa_id, przedzial_id, czas_total, czas_produkcji, odchylenie, "
+                     "wystapienia, pierwszy_znacznik)")
+        # Ostatnie obliczenia kodu w całości z indeksu (pokrywający zastępuje dawny idx_obliczenia_kod)
+        conn.execute(f"DROP INDEX IF EXISTS {schemat}.idx_obliczenia_kod")
+        conn.execute(f"CREATE INDEX IF NOT EXISTS {schemat}.idx_obliczenia_kod_pokrywajacy ON obliczenia("
+                     "kod, znacznik, id, grupa_id, przedzial_id, czas_total, czas_produkcji, odchylenie, "
+                     "wystapienia, pierwszy_znacznik)")
+        # Wyszukiwanie po segmencie środkowym (cyfry 4–7) i wariancie (3 ostatnie cyfry) kodu
+        conn.execute(f"CREATE INDEX IF NOT EXISTS {schemat}.idx_obliczenia_kod_srodek "
+                     "ON obliczenia(kod / 1000 % 10000, kod, znacznik)")
+        conn.execute(f"CREATE INDEX IF NOT EXISTS {schemat}.idx_obliczenia_kod_wariant "
+                     "ON obliczenia(kod % 1000, kod, znacznik)")
+        conn.execute(f"CREATE INDEX IF NOT EXISTS {schemat}.idx_obliczenia_grupa "
+                     "ON obliczenia(grupa_id, znacznik)")
+        conn.execute(f"CREATE INDEX IF NOT EXISTS {schemat}.idx_obliczenia_przedzial "
+                     "ON obliczenia(przedzial_id, znacznik)")
+        # Strony historii sortowane po kolumnach wyniku. Czas produkcji i odchylenie
+        # mają tylko obliczenia zwalidowane, a wystapienia > 1 – tylko powtórzone,
+        # więc te indeksy są częściowe i nowy wpis ich nie zmienia
+        conn.execute(f"CREATE INDEX IF NOT EXISTS {schemat}.idx_obliczenia_czas_total "
+                     "ON obliczenia(czas_total, znacznik)")
+        conn.execute(f"CREATE INDEX IF NOT EXISTS {schemat}.idx_obliczenia_czas_produkcji "
+                     "ON obliczenia(czas_produkcji, znacznik) WHERE czas_produkcji IS NOT NULL")
+        conn.execute(f"CREATE INDEX IF NOT EXISTS {schemat}.idx_obliczenia_odchylenie "
+                     "ON obliczenia(odchylenie, znacznik) WHERE odchylenie IS NOT NULL")
+        conn.execute(f"CREATE INDEX IF NOT EXISTS {schemat}.idx_obliczenia_wystapienia "
+                     "ON obliczenia(wystapienia, znacznik) WHERE wystapienia > 1")
+        # Wyszukiwanie powtórzenia – tylko obliczenia bez walidacji i ze skrótem. Wiersze
+        # sprzed schematu 4 (bez skrótu) poza indeksem: jako jeden klucz NULL zawyżałyby
+        # w statystykach ANALYZE koszt wyszukiwania i planista wybierałby pełny skan
+        conn.execute(f"DROP INDEX IF EXISTS {schemat}.idx_obliczenia_powtorzenia")
+        conn.execute(f"CREATE INDEX IF NOT EXISTS {schemat}.idx_obliczenia_skrot "
+                     "ON obliczenia(skrot) WHERE czas_produkcji IS NULL AND skrot IS NOT NULL")
+
+    def _init_db(self, migracja_zg5=False):
         """Tworzy tabele, jeśli nie istnieją."""
-        with sqlite3.connect(self.db_path) as conn:
-            # Główna tabela obliczeń
+        with self.transakcja() as conn:
+            self._utworz_tabele(conn)
+            # Archiwa roczne (pliki obok bazy głównej); wpisy roku `rok` sprzed
+            # `granica` zostały przeniesione do pliku `plik`
             conn.execute("""
-                CREATE TABLE IF NOT EXISTS obliczenia (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    kod TEXT NOT NULL,
-                    data TEXT NOT NULL,
+                CREATE TABLE IF NOT EXISTS archiwa (
+                    rok INTEGER PRIMARY KEY,
+                    plik TEXT NOT NULL,
+                    granica TEXT NOT NULL
+                )
+            """)
+
+            # Tabele podsumowań utrzymywane przez wyzwalacze (miesiac = 'RRRR-MM')
+            nowe_statystyki = conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'statystyki'").fetchone() is None
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS statystyki (
                     grupa TEXT NOT NULL,
                     przedzial TEXT NOT NULL,
-                    czas_total REAL NOT NULL,
-                    czas_produkcji REAL,
-                    odchylenie REAL
-                )
+                    miesiac TEXT NOT NULL,
+                    liczba INTEGER NOT NULL,
+                    suma_czas_total REAL NOT NULL,
+                    liczba_walidacji INTEGER NOT NULL,
+                    suma_czas_produkcji REAL NOT NULL,
+                    suma_odchylen REAL NOT NULL,
+                    suma_odchylen_abs REAL NOT NULL,
+                    PRIMARY KEY (grupa, przedzial, miesiac)
+                ) WITHOUT ROWID
             """)
-            # Tabela metraży – osobne wiersze dla każdej metody
             conn.execute("""
-                CREATE TABLE IF NOT EXISTS metry_obliczenia (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    obliczenie_id INTEGER NOT NULL,
+                CREATE TABLE IF NOT EXISTS statystyki_metod (
+                    grupa TEXT NOT NULL,
                     metoda TEXT NOT NULL,
-                    metry REAL NOT NULL,
-                    FOREIGN KEY (obliczenie_id) REFERENCES obliczenia(id) ON DELETE CASCADE
+                    miesiac TEXT NOT NULL,
+                    liczba INTEGER NOT NULL,
+                    suma_metrow REAL NOT NULL,
+                    PRIMARY KEY (grupa, metoda, miesiac)
+                ) WITHOUT ROWID
+            """)
+            # Dziennik zmian obliczeń bazy głównej (patrz zmiany_historii);
+            # obliczenie_id NULL – zmiana wielu wpisów naraz (archiwizacja)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS zmiany (
+                    nr INTEGER PRIMARY KEY AUTOINCREMENT,
+                    obliczenie_id INTEGER
                 )
             """)
-            # Indeks dla szybszego wyszukiwania
-            conn.execute("CREATE INDEX IF NOT EXISTS idx_metry_obliczenie ON metry_obliczenia(obliczenie_id)")
+            # Wyzwalacze odtwarzane przy każdym starcie – zawsze zgodne z kodem
+            self._usun_wyzwalacze(conn)
+            self._utworz_wyzwalacze(conn)
+            # Schemat 5: statystyki ważone liczbą wystąpień – starsze liczone od nowa
+            if nowe_statystyki or self.wersja_schematu() < 5:
+                self.przelicz_statystyki()
+            # Baza migrowana z zg5 dostaje numer schematu dopiero po przeniesieniu danych
+            if not migracja_zg5:
+                conn.execute(f"PRAGMA user_version = {WERSJA_SCHEMATU}")
 
-    def dodaj_wpis(self, kod, grupa, przedzial, metry_dict, czas_total, czas_produkcji=None):
+    def dodaj_wpis(self, kod, grupa, przedzial, metry_dict, czas_total, czas_produkcji=None,
+                   wymuszeni_pracownicy=None, wersja_stawek=None):
         """
         metry_dict: słownik {nazwa_metody: metry} dla metod, które mają metraż > 0
-        Zwraca ID nowego wpisu.
-        """
-        data = datetime.now().isoformat()
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.execute("""
-                INSERT INTO obliczenia (kod, data, grupa, przedzial, czas_total, czas_produkcji, odchylenie)
-                VALUES (?, ?, ?, ?, ?, ?, ?)
-            """, (kod, data, grupa, przedzial, czas_total, czas_produkcji, None))
-            obliczenie_id = cursor.lastrowid
-
-            # Dodaj metraże
-            for metoda, metry in metry_dict.items():
-                if metry > 0:
-                    conn.execute("""
-                        INSERT INTO metry_obliczenia (obliczenie_id, metoda, metry)
-                        VALUES (?, ?, ?)
-                    """, (obliczenie_id, metoda, metry))
+        wymuszeni_pracownicy: {nazwa_metody: liczba}, wersja_stawek: tekst – obie
+        wchodzą tylko do skrótu obliczenia (patrz dodaj_wpisy).
+        Zwraca ID wpisu.
+        """
+        return self.dodaj_wpisy([{
+            'kod': kod, 'grupa': grupa, 'przedzial': przedzial, 'metry_dict': metry_dict,
+            'czas_total': czas_total, 'czas_produkcji': czas_produkcji,
+            'wymuszeni_pracownicy': wymuszeni_pracownicy, 'wersja_stawek': wersja_stawek
+        }])[0]
 
-            return obliczenie_id
+    def dodaj_wpisy(self, wpisy, rozmiar_partii=50000, scalaj=None):
+        """
+        Wstawia strumień obliczeń partiami – każda partia to jedna transakcja
+        z executemany. Wpis to słownik z kluczami jak argumenty dodaj_wpis
+        oraz opcjonalnie 'data' (datetime, tekst ISO lub znacznik), 'odchylenie',
+        'wystapienia' i 'pierwsza_data' (np. przy imporcie).
+        Obliczenie bez czasu produkcji, którego skrót (skrot_obliczenia) ma
+        niezwalidowany wpis w bazie głównej wykonany ostatnio najwyżej
+        OKNO_POWTORZEN_S wcześniej lub później tego samego dnia, nie tworzy
+        nowego wiersza: wpis dostaje kolejne wystąpienie i czas ostatniego
+        wykonania. scalaj=False (domyślnie scalaj_powtorzenia bazy) – każdy
+        wpis to osobny wiersz.
+        Przepustowość ogranicza utrzymanie indeksów obliczeń (historia, kod,
+        sortowania – jedenaście drzew na wiersz): sam executemany do tabeli
+        z indeksami to ok. 30 tys. wierszy/s, całość – ok. 14 tys./s
+        (benchmark.py wstawianie).
+        Zwraca listę ID w kolejności wpisów (przy powtórzeniu – ID istniejącego).
+        """
+        if scalaj is None:
+            scalaj = self.scalaj_powtorzenia
+        ids = []
+        wpisy = iter(wpisy)
+        while True:
+            partia = list(islice(wpisy, rozmiar_partii))
+            if not partia:
+                return ids
+            teraz = znacznik(datetime.now())
+            with self.transakcja() as conn:
+                # BEGIN IMMEDIATE wyklucza innych piszących, więc kolejne ID
+                # można nadać z góry i od razu zbudować wiersze metraży
+                start = conn.execute("""
+                    SELECT MAX(COALESCE((SELECT seq FROM sqlite_sequence WHERE name = 'obliczenia'), 0),
+                               COALESCE((SELECT MAX(id) FROM obliczenia), 0)) + 1
+                """).fetchone()[0]
+                skroty = [skrot_obliczenia(w) for w in partia]
+                # Skrót -> [ID, ostatnie wykonanie] niezwalidowanego wpisu, z którym łączy się powtórzenie
+                ostatnie = self._niezwalidowane(
+                    conn, {skrot for skrot, w in zip(skroty, partia) if w.get('czas_produkcji') is None}
+                ) if scalaj else {}
+                wiersze, metry, powtorzenia = {}, [], {}
+                grupy, przedzialy, metody = (self._klucze[slownik] for slownik in SLOWNIKI)
+                obliczenie_id = start
+                for w, skrot in zip(partia, skroty):
+                    czas = znacznik(w['data']) if w.get('data') is not None else teraz
+                    wystapienia = w.get('wystapienia') or 1
+                    if scalaj and w.get('czas_produkcji') is None and wystapienia == 1:
+                        poprzedni = ostatnie.get(skrot)
+                        if poprzedni is not None and powtorzenie(poprzedni[1], czas):
+                            powtorzony = poprzedni[0]
+                            wiersz = wiersze.get(powtorzony)
+                            if wiersz is not None:
+                                # Powtórzenie wpisu z tej samej partii
+                                wiersz[9] += 1
+                                wiersz[10] = min(wiersz[10] or wiersz[2], czas)
+                                wiersz[2] = max(wiersz[2], czas)
+                            else:
+                                liczba, pierwszy, ostatni = powtorzenia.get(powtorzony, (0, czas, czas))
+                                powtorzenia[powtorzony] = (liczba + 1, min(pierwszy, czas), max(ostatni, czas))
+                            poprzedni[1] = max(poprzedni[1], czas)
+                            ids.append(powtorzony)
+                            continue
+                        ostatnie[skrot] = [obliczenie_id, czas]
+                    pierwszy = None
+                    if wystapienia > 1 and w.get('pierwsza_data') is not None:
+                        pierwszy = znacznik(w['pierwsza_data'])
+                    # Klucze słowników prosto z pamięci podręcznej – _klucz tylko dla nowej nazwy
+                    wiersze[obliczenie_id] = [obliczenie_id, kod_liczba(w['kod']), czas,
+                                              grupy.get(w['grupa']) or self._klucz(conn, "grupy", w['grupa']),
+                                              przedzialy.get(w['przedzial'])
+                                              or self._klucz(conn, "przedzialy", w['przedzial']),
+                                              w['czas_total'], w.get('czas_produkcji'), w.get('odchylenie'),
+                                              skrot, wystapienia, pierwszy]
+                    for metoda, m in w['metry_dict'].items():
+                        if m > 0:
+                            metry.append((obliczenie_id, metody.get(metoda) or self._klucz(conn, "metody", metoda),
+                                          m))
+                    ids.append(obliczenie_id)
+                    obliczenie_id += 1
+                # Dużą partię wstawiamy bez wyzwalaczy (usunięcie i odtworzenie w tej
+                # samej transakcji jest niewidoczne dla innych połączeń), a jej
+                # statystyki doliczamy jednym zapytaniem
+                masowo = len(wiersze) >= PROG_ZAPISU_MASOWEGO
+                if masowo:
+                    self._usun_wyzwalacze(conn)
+                conn.executemany(f"""
+                    INSERT INTO obliczenia ({KOLUMNY_OBLICZENIA})
+                    VALUES ({', '.join('?' * len(KOLUMNY_OBLICZENIA.split(',')))})
+                """, wiersze.values())
+                conn.executemany("""
+                    INSERT INTO metry_obliczenia (obliczenie_id, metoda_id, metry)
+                    VALUES (?, ?, ?)
+                """, metry)
+                if masowo:
+                    self._utworz_wyzwalacze(conn)
+                    self._dolicz_statystyki(conn, start, obliczenie_id - 1)
+                # Z wyzwalaczami – statystyki dostają nowe wystąpienia (znacznik nie
+                # zmienia dnia ani miesiąca – patrz powtorzenie)
+                conn.executemany("""
+                    UPDATE obliczenia
+                    SET wystapienia = wystapienia + ?,
+                        pierwszy_znacznik = MIN(COALESCE(pierwszy_znacznik, znacznik), ?),
+                        znacznik = MAX(znacznik, ?)
+                    WHERE id = ?
+                """, [(liczba, pierwszy, ostatni, wpis_id)
+                      for wpis_id, (liczba, pierwszy, ostatni) in powtorzenia.items()])
+
+    @staticmethod
+    def _niezwalidowane(conn, skroty):
+        """
+        {skrot: [ID, znacznik]} najpóźniej wykonanych wpisów bez czasu produkcji
+        o podanych skrótach – zapytaniami po 500 skrótów.
+        """
+        skroty = list(skroty)
+        cursor = conn.cursor()
+        cursor.row_factory = None
+        wynik = {}
+        for i in range(0, len(skroty), 500):
+            porcja = skroty[i:i + 500]
+            for skrot, wpis_id, czas in cursor.execute(
+                    "SELECT skrot, id, znacznik FROM obliczenia "
+                    f"WHERE czas_produkcji IS NULL AND skrot IN ({','.join('?' * len(porcja))})", porcja):
+                if skrot not in wynik or czas > wynik[skrot][1]:
+                    wynik[skrot] = [wpis_id, czas]
+        return wynik
+
+    def _wyczysc_klucze(self):
+        self._klucze = {slownik: {} for slownik in SLOWNIKI}
+
+    def _klucz(self, conn, slownik, nazwa):
+        """Klucz nazwy w słowniku bazy głównej; nowa nazwa jest do niego dopisywana."""
+        klucze = self._klucze[slownik]
+        klucz = klucze.get(nazwa)
+        if klucz is None:
+            conn.execute(f"INSERT OR IGNORE INTO main.{slownik} (nazwa) VALUES (?)", (nazwa,))
+            klucz = klucze[nazwa] = conn.execute(
+                f"SELECT id FROM main.{slownik} WHERE nazwa = ?", (nazwa,)).fetchone()[0]
+        return klucz
 
     def aktualizuj_czas_produkcji(self, wpis_id, czas_produkcji, odchylenie):
-        """Aktualizuje czas produkcji i odchylenie dla istniejącego wpisu."""
-        with sqlite3.connect(self.db_path) as conn:
+        """
+        Aktualizuje czas produkcji i odchylenie dla istniejącego wpisu. Czas
+        produkcji dotyczy ostatniego wykonania: z powtórzonego obliczenia
+        (wystapienia > 1) jest ono wydzielane jako nowy wpis z tymi samymi
+        metrażami. Zwraca ID wpisu, który dostał czas produkcji.
+        """
+        with self.transakcja() as conn:
+            wiersz = conn.execute("SELECT wystapienia FROM obliczenia WHERE id = ?", (wpis_id,)).fetchone()
+            if wiersz is not None and wiersz[0] > 1:
+                zwalidowany = conn.execute(f"""
+                    INSERT INTO obliczenia ({KOLUMNY_OBLICZENIA.replace("id, ", "", 1)})
+                    SELECT kod, znacznik, grupa_id, przedzial_id, czas_total, ?, ?, skrot, 1, NULL
+                    FROM obliczenia WHERE id = ?
+                """, (czas_produkcji, odchylenie, wpis_id)).lastrowid
+                conn.execute("""
+                    INSERT INTO metry_obliczenia (obliczenie_id, metoda_id, metry)
+                    SELECT ?, metoda_id, metry FROM metry_obliczenia WHERE obliczenie_id = ?
+                """, (zwalidowany, wpis_id))
+                # Czas pozostałych wykonań nie jest znany dokładniej niż [pierwszy, ostatni]
+                conn.execute("""
+                    UPDATE obliczenia
+                    SET wystapienia = wystapienia - 1,
+                        znacznik = CASE WHEN wystapienia = 2 THEN COALESCE(pierwszy_znacznik, znacznik) ELSE znacznik END,
+                        pierwszy_znacznik = CASE WHEN wystapienia = 2 THEN NULL ELSE pierwszy_znacznik END
+                    WHERE id = ?
+                """, (wpis_id,))
+                return zwalidowany
             conn.execute("""
                 UPDATE obliczenia 
                 SET czas_produkcji = ?, odchylenie = ?
                 WHERE id = ?
             """, (czas_produkcji, odchylenie, wpis_id))
+            return wpis_id
 
     def usun_wpis(self, wpis_id):
         """Usuwa wpis o podanym ID (kaskadowo usuwa też metraże)."""
-        with sqlite3.connect(self.db_path) as conn:
+        with self.transakcja() as conn:
             cursor = conn.execute("DELETE FROM obliczenia WHERE id = ?", (wpis_id,))
             return cursor.rowcount > 0
 
-    def pobierz_wszystkie(self):
+    def _dolacz_metraze(self, conn, rows, pelny_przebieg=False, schemat="main"):
+        """
+        Dołącza do wpisów słownik 'metraze' stałą liczbą zapytań: jednym
+        przebiegiem po całej tabeli metraży (pelny_przebieg) albo zapytaniami
+        o identyfikatory wpisów, porcjami po 500. Klucze grupy i przedziału
+        (KOLUMNY_WPISU) zamienia na nazwy – słownikiem w Pythonie, taniej niż
+        podzapytaniem w każdym wierszu.
+        """
+        po_id = {}
+        for row in rows:
+            row['metraze'] = {}
+            po_id[row['id']] = row['metraze']
+        if pelny_przebieg:
+            zapytania = [("SELECT obliczenie_id, metoda_id, metry "
+                          f"FROM {schemat}.metry_obliczenia ORDER BY obliczenie_id", ())]
+        else:
+            ids = list(po_id)
+            zapytania = []
+            for i in range(0, len(ids), 500):
+                porcja = ids[i:i + 500]
+                zapytania.append((
+                    f"SELECT obliczenie_id, metoda_id, metry FROM {schemat}.metry_obliczenia "
+                    f"WHERE obliczenie_id IN ({','.join('?' * len(porcja))})", porcja))
+        # Krotki zamiast sqlite3.Row – przy milionach metraży to zauważalna różnica
+        cursor = conn.cursor()
+        cursor.row_factory = None
+        grupy, przedzialy, metody = (dict(cursor.execute(f"SELECT id, nazwa FROM {schemat}.{slownik}"))
+                                     for slownik in SLOWNIKI)
+        for row in rows:
+            row['grupa'] = grupy[row['grupa']]
+            row['przedzial'] = przedzialy[row['przedzial']]
+        for sql, parametry in zapytania:
+            for obliczenie_id, metoda_id, metry in cursor.execute(sql, parametry):
+                metraze = po_id.get(obliczenie_id)
+                if metraze is not None:
+                    metraze[metody[metoda_id]] = metry
+        return rows
+
+    @staticmethod
+    def _warunki(grupa=None, przedzial=None, kod_prefix=None, od=None, do=None, status=None,
+                 indeks_slownikow=True):
+        """
+        Buduje warunki WHERE dla filtrów historii. Zwraca (lista_warunków, parametry).
+        Prefiks kodu zamieniany jest na przedział liczb (warunki_kodu), żeby
+        zapytanie mogło korzystać z indeksu. `od` włącznie, `do` wyłącznie
+        (datetime, date, tekst ISO lub znacznik czasu). status – klucz
+        STATUSY_ODCHYLENIA. indeks_slownikow=False – warunki grupy i przedziału
+        bez indeksu (patrz PROG_INDEKSU_SLOWNIKA).
+        """
+        warunki, parametry = warunki_kodu(prefiks=kod_prefix)
+        # Klucze ze słownika bazy głównej – te same w archiwach; jednoargumentowy + wyłącza indeks
+        plus = "" if indeks_slownikow else "+"
+        if grupa is not None:
+            warunki.append(f"{plus}grupa_id = (SELECT id FROM main.grupy WHERE nazwa = ?)")
+            parametry.append(grupa)
+        if przedzial is not None:
+            warunki.append(f"{plus}przedzial_id = (SELECT id FROM main.przedzialy WHERE nazwa = ?)")
+            parametry.append(przedzial)
+        if od is not None:
+            warunki.append("znacznik >= ?")
+            parametry.append(znacznik(od))
+        if do is not None:
+            warunki.append("znacznik < ?")
+            parametry.append(znacznik(do))
+        if status is not None:
+            if status not in STATUSY_ODCHYLENIA:
+                raise ValueError(f"Nieznany status odchylenia: {status!r}")
+            warunki.append(STATUSY_ODCHYLENIA[status])
+        return warunki, parametry
+
+    def _pobierz_z_partycji(self, where, parametry, lata, limit=None, pelny_przebieg=False,
+                            kolumny=("znacznik", "id"), rosnaco=False, klucz=None):
+        """
+        Wpisy (z metrażami) spełniające `where` z bazy głównej i archiwów z lat
+        `lata` (od najnowszego), najwyżej `limit`, w kolejności kolumn `kolumny`
+        malejąco (rosnaco=True – rosnąco). klucz(wpis) – te kolumny jako klucz
+        porównania przy łączeniu plików (domyślnie kursor).
+        """
+        kierunek = "ASC" if rosnaco else "DESC"
+        # Nazwa tabeli, bo kod w KOLUMNY_WPISU to alias tekstu kodu
+        porzadek = ", ".join(f"obliczenia.{kolumna} {kierunek}" for kolumna in kolumny)
+        rows = []
+        for rok in [None] + lata:
+            # Archiwum roku `rok` ma tylko wpisy sprzed roku rok + 1 – gdy strona
+            # od najnowszych jest pełna i nowsza, starsze archiwa nic do niej nie wniosą
+            if (rok is not None and limit is not None and len(rows) == limit
+                    and kolumny[0] == "znacznik" and not rosnaco
+                    and rows[-1]['znacznik'] >= znacznik(date(rok + 1, 1, 1))):
+                break
+            with self._archiwum(rok) as schemat, self.odczyt() as conn:
+                cursor = conn.execute(
+                    f"SELECT {KOLUMNY_WPISU} FROM {schemat}.obliczenia {where} ORDER BY {porzadek}"
+                    + (" LIMIT ?" if limit is not None else ""),
+                    parametry + ([limit] if limit is not None else []))
+                nowe = self._dolacz_metraze(conn, [dict(row) for row in cursor.fetchall()],
+                                            pelny_przebieg=pelny_przebieg, schemat=schemat)
+            if rows:
+                rows = list(heapq.merge(rows, nowe, key=klucz or self.kursor, reverse=not rosnaco))[:limit]
+            else:
+                rows = nowe
+        return rows
+
+    @z_cache
+    def pobierz_wszystkie(self, z_archiwum=False):
         """
         Zwraca listę wpisów z dołączonymi metrażami.
-        Każdy wpis to słownik zawierający pola z tabeli obliczenia oraz
-        dodatkowo słownik 'metraze' z metrażami dla poszczególnych metod.
-        """
-        with sqlite3.connect(self.db_path) as conn:
-            conn.row_factory = sqlite3.Row
-            # Pobierz główne dane
-            cursor = conn.execute("SELECT * FROM obliczenia ORDER BY data DESC")
-            rows = [dict(row) for row in cursor.fetchall()]
-
-            # Dla każdego wpisu dołącz metraże
-            for row in rows:
-                cursor_metry = conn.execute(
-                    "SELECT metoda, metry FROM metry_obliczenia WHERE obliczenie_id = ?",
-                    (row['id'],)
-                )
-                metraze = {m['metoda']: m['metry'] for m in cursor_metry.fetchall()}
-                row['metraze'] = metraze
+        Każdy wpis to słownik zawierający pola z tabeli obliczenia (w tym
+        'data' – tekst ISO w czasie lokalnym) oraz słownik 'metraze'
+        z metrażami dla poszczególnych metod.
+        Domyślnie tylko bieżąca baza; z_archiwum=True dołącza wszystkie archiwa.
+        """
+        # Metraże wszystkich wpisów jednym przebiegiem (zamiast zapytania na wpis)
+        return self._pobierz_z_partycji("", [], self._lata_archiwow(z_archiwum=z_archiwum),
+                                        pelny_przebieg=True)
 
-            return rows
+    @z_cache
+    def pobierz_strone(self, po=None, limit=200, grupa=None, przedzial=None,
+                       kod_prefix=None, od=None, do=None, z_archiwum=None, status=None,
+                       sortuj=None, rosnaco=False):
+        """
+        Zwraca stronę wpisów (z metrażami) od najnowszych, w kolejności (znacznik, id) malejąco.
+        po: kursor ostatniego wpisu poprzedniej strony (kursor z tym samym
+        sortuj); None – pierwsza strona. Kolejna strona zaczyna się za
+        kursorem, więc jej koszt nie zależy od tego, jak daleko przewinięto
+        historię (w przeciwieństwie do OFFSET).
+        Archiwa lat z zakresu [od, do) dołączane są same, gdy `od` sięga przed
+        granicę archiwum (z_archiwum=True – zawsze, False – nigdy).
+        status: klucz STATUSY_ODCHYLENIA. sortuj: pole z SORTOWANIA – strona
+        wg niego malejąco (rosnaco=True – rosnąco), równe wartości od najnowszych.
+        """
+        udzial = self._udzialy_w_historii()
+        indeks_slownikow = grupa is None and przedzial is None or udzial(grupa, przedzial) < PROG_INDEKSU_SLOWNIKA
+        warunki, parametry = self._warunki(grupa, przedzial, kod_prefix, od, do, status, indeks_slownikow)
+        lata = self._lata_archiwow(od, do, z_archiwum)
+        segmenty = self._segmenty_sortowania(sortuj, rosnaco, status, grupa, przedzial, udzial)
+        pierwszy = 0
+        if po is not None:
+            # Kursor spoza segmentów (np. nazwa grupy usunięta ze słownika) – koniec listy
+            pierwszy = next((i for i, segment in enumerate(segmenty) if segment[3](po)), len(segmenty))
+        rows = []
+        for i, (warunek, parametry_segmentu, kolumny, _) in enumerate(segmenty[pierwszy:], pierwszy):
+            warunki_segmentu = warunki + ([warunek] if warunek else [])
+            wartosci = parametry + parametry_segmentu
+            if po is not None and i == pierwszy:
+                warunki_segmentu.append(f"({', '.join(kolumny)}) {'>' if rosnaco else '<'} "
+                                        f"({', '.join('?' * len(kolumny))})")
+                wartosci += list(po[-len(kolumny):])
+            where = f"WHERE {' AND '.join(warunki_segmentu)}" if warunki_segmentu else ""
 
-    def export_do_excel(self, sciezka):
+            def klucz(wpis, n=len(kolumny)):
+                # Jak w SQLite: liczby przed tekstem (kody spoza formatu)
+                return tuple((isinstance(w, str), w) for w in self.kursor(wpis, sortuj)[-n:])
+            rows += self._pobierz_z_partycji(where, wartosci, lata, limit - len(rows), kolumny=kolumny,
+                                             rosnaco=rosnaco, klucz=klucz)
+            if len(rows) >= limit:
+                break
+        return rows
+
+    def _segmenty_sortowania(self, sortuj=None, rosnaco=False, status=None, grupa=None, przedzial=None,
+                             udzial=None):
         """
-        Eksportuje wszystkie dane do pliku Excel.
-        Tworzy arkusz z głównymi danymi i arkusz z metrażami.
+        Kolejność stron historii wg pola `sortuj` (None – data) jako lista
+        segmentów (warunek, parametry, kolumny, zawiera): wpisy kolejnych
+        segmentów idą jeden po drugim, w segmencie – wg kolumn, z indeksu.
+        zawiera(kursor) – czy kursor strony leży w segmencie (kolumny segmentu
+        to końcówka kursora). Wpisy bez czasu produkcji i odchylenia są zawsze
+        na końcu, grupy i przedziały idą w kolejności nazw. Segmenty, których
+        nie dopuszcza status odchylenia albo filtr grupy lub przedziału, są pomijane.
+        udzial – jak z _udzialy_w_historii.
         """
-        dane = self.pobierz_wszystkie()
-        if not dane:
-            return False
+        if sortuj in (None, "data"):
+            return [("", [], ("znacznik", "id"), lambda po: True)]
+        if sortuj == "id":
+            return [("", [], ("id",), lambda po: True)]
+        if sortuj in ("kod", "czas_total"):
+            return [("", [], (sortuj, "znacznik", "id"), lambda po: True)]
+        if sortuj in ("czas_produkcji", "odchylenie"):
+            segmenty = [(f"{sortuj} IS NOT NULL", [], (sortuj, "znacznik", "id"), lambda po: po[0] is not None),
+                        (f"{sortuj} IS NULL", [], ("znacznik", "id"), lambda po: po[0] is None)]
+            # Bez czasu produkcji nie ma odchylenia; status z progiem wymaga obu
+            if status == "niezwalidowane":
+                return segmenty[1:]
+            if status in ("w_normie", "dopuszczalne", "poza_norma") or status and sortuj == "czas_produkcji":
+                return segmenty[:1]
+            return segmenty
+        if sortuj == "wystapienia":
+            # Powtórzone obliczenia z indeksu częściowego, pozostałe – z indeksu historii
+            segmenty = [("wystapienia > 1", [], (sortuj, "znacznik", "id"), lambda po: po[0] > 1),
+                        ("wystapienia = 1", [], ("znacznik", "id"), lambda po: po[0] <= 1)]
+            return segmenty[::-1] if rosnaco else segmenty
+        if sortuj in ("grupa", "przedzial"):
+            slownik = "grupy" if sortuj == "grupa" else "przedzialy"
+            nazwy = sorted((tuple(r) for r in self.conn.execute(f"SELECT nazwa, id FROM main.{slownik}")),
+                           reverse=not rosnaco)
+            wybrana = grupa if sortuj == "grupa" else przedzial
+            if wybrana is not None:
+                nazwy = [(nazwa, klucz) for nazwa, klucz in nazwy if nazwa == wybrana]
+            # Prawdziwy ułamek historii dla planisty – patrz PROG_INDEKSU_SLOWNIKA
+            udzial = udzial or self._udzialy_w_historii()
+            return [(f"likelihood({sortuj}_id = ?, {udzial(**{sortuj: nazwa}):.6f})", [klucz],
+                     ("znacznik", "id"), lambda po, nazwa=nazwa: po[0] == nazwa)
+                    for nazwa, klucz in nazwy]
+        raise ValueError(f"Nieznane sortowanie historii: {sortuj!r}")
+
+    def porzadek_historii(self, sortuj=None, rosnaco=False, status=None, grupa=None, przedzial=None):
+        """
+        Kolejność pobierz_strone o tych samych argumentach jako funkcja
+        klucz(kursor): wpis o kursorze a jest na liście przed wpisem
+        o kursorze b, gdy klucz(a) < klucz(b).
+        """
+        segmenty = self._segmenty_sortowania(sortuj, rosnaco, status, grupa, przedzial)
+
+        def klucz(po):
+            numer = next((i for i, segment in enumerate(segmenty) if segment[3](po)), len(segmenty))
+            if numer == len(segmenty):
+                return (numer,)
+            # Jak w SQLite: liczby przed tekstem (kody spoza formatu)
+            wartosci = tuple((isinstance(w, str), w) for w in po[-len(segmenty[numer][2]):])
+            return (numer, wartosci if rosnaco else _Malejaco(wartosci))
+        return klucz
+
+    @z_cache
+    def pobierz_zakres(self, od=None, do=None, grupa=None, przedzial=None, kod_prefix=None, z_archiwum=None):
+        """
+        Wszystkie wpisy (z metrażami) z zakresu czasu [od, do), od najnowszych.
+        Zakres wybierany jest z indeksu po znaczniku czasu; archiwa jak w pobierz_strone.
+        """
+        warunki, parametry = self._warunki(grupa, przedzial, kod_prefix, od, do)
+        where = f"WHERE {' AND '.join(warunki)}" if warunki else ""
+        return self._pobierz_z_partycji(where, parametry, self._lata_archiwow(od, do, z_archiwum))
+
+    @z_cache
+    def podsumuj_zakres(self, od=None, do=None, okres="dzien", grupa=None, przedzial=None, z_archiwum=None):
+        """
+        Podsumowanie wpisów z zakresu [od, do) w okresach `okres` ("dzien" albo
+        "tydzien" – od poniedziałku), liczone w SQL po znaczniku czasu. Liczba
+        i suma czasu obejmują każde wystąpienie powtórzonego obliczenia.
+        Zwraca słowniki {okres, liczba, suma_czas_total, liczba_walidacji,
+        srednie_odchylenie, srednie_odchylenie_abs} rosnąco wg okresu
+        (okres to data dnia lub poniedziałku tygodnia, RRRR-MM-DD).
+        """
+        if okres not in OKRESY:
+            raise ValueError(f"Nieznany okres podsumowania: {okres!r}")
+        warunki, parametry = self._warunki(grupa, przedzial, od=od, do=do)
+        where = f"WHERE {' AND '.join(warunki)}" if warunki else ""
+        okresy = {}
+        for rok in [None] + self._lata_archiwow(od, do, z_archiwum):
+            with self._archiwum(rok) as schemat:
+                cursor = self.conn.execute(f"""
+                    SELECT {OKRESY[okres]} AS okres, SUM(wystapienia), TOTAL(czas_total * wystapienia),
+                           COUNT(odchylenie),
+                           TOTAL(odchylenie), TOTAL(abs(odchylenie))
+                    FROM {schemat}.obliczenia {where} GROUP BY 1
+                """, parametry)
+                for wiersz in cursor.fetchall():
+                    # Okres na granicy archiwum może mieć wiersze w dwóch plikach
+                    sumy = okresy.setdefault(wiersz[0], [0, 0.0, 0, 0.0, 0.0])
+                    for i, wartosc in enumerate(wiersz[1:]):
+                        sumy[i] += wartosc
+        return [{
+            'okres': nazwa, 'liczba': liczba, 'suma_czas_total': suma_czasu, 'liczba_walidacji': walidacje,
+            'srednie_odchylenie': suma_odchylen / walidacje if walidacje else None,
+            'srednie_odchylenie_abs': suma_abs / walidacje if walidacje else None,
+        } for nazwa, (liczba, suma_czasu, walidacje, suma_odchylen, suma_abs) in sorted(okresy.items())]
+
+    def iteruj_wpisy(self, z_archiwum=False, rozmiar_porcji=5000, grupa=None, przedzial=None,
+                     kod_prefix=None, od=None, do=None):
+        """
+        Wszystkie wpisy (z metrażami) spełniające filtry jako generator – w pamięci
+        jest naraz jedna porcja `rozmiar_porcji` wpisów. Każda porcja to osobne
+        zapytanie za kursorem (znacznik, id), więc odczyt nie trzyma migawki bazy
+        przez cały przebieg. Kolejność jak w pobierz_wszystkie, plik po pliku:
+        baza główna, potem archiwa od najnowszego (z_archiwum jak w pobierz_strone).
+        """
+        warunki, parametry = self._warunki(grupa, przedzial, kod_prefix, od, do)
+        for rok in [None] + self._lata_archiwow(od, do, z_archiwum):
+            with self._archiwum(rok) as schemat:
+                po = None
+                while True:
+                    za_kursorem = ["(znacznik, id) < (?, ?)"] if po is not None else []
+                    where = f"WHERE {' AND '.join(warunki + za_kursorem)}" if warunki or za_kursorem else ""
+                    with self.odczyt() as conn:
+                        cursor = conn.execute(
+                            f"SELECT {KOLUMNY_WPISU} FROM {schemat}.obliczenia {where} "
+                            "ORDER BY znacznik DESC, id DESC LIMIT ?",
+                            parametry + (list(po) if po is not None else []) + [rozmiar_porcji])
+                        porcja = self._dolacz_metraze(conn, [dict(row) for row in cursor.fetchall()],
+                                                      schemat=schemat)
+                    if not porcja:
+                        break
+                    yield from porcja
+                    po = self.kursor(porcja[-1])
+
+    @z_cache
+    def metody_w_historii(self, z_archiwum=False, od=None, do=None):
+        """
+        Posortowane nazwy metod, które mają metraże w historii i w archiwach,
+        które dołączyłoby iteruj_wpisy z tymi samymi z_archiwum, od i do.
+        """
+        metody = set()
+        for rok in [None] + self._lata_archiwow(od, do, z_archiwum):
+            with self._archiwum(rok) as schemat:
+                metody.update(r[0] for r in self.conn.execute(
+                    f"SELECT nazwa FROM {schemat}.metody "
+                    f"WHERE id IN (SELECT DISTINCT metoda_id FROM {schemat}.metry_obliczenia)"))
+        return sorted(metody)
+
+    def _udzialy_w_historii(self):
+        """
+        Funkcja udzial(grupa=None, przedzial=None) – ułamek wpisów bazy głównej
+        w grupie i przedziale, z tabeli statystyki (pusta baza – 1).
+        """
+        liczby = self.conn.execute(
+            "SELECT grupa, przedzial, TOTAL(liczba) FROM statystyki GROUP BY grupa, przedzial").fetchall()
+        wszystkie = sum(liczba for _, _, liczba in liczby)
+
+        def udzial(grupa=None, przedzial=None):
+            if not wszystkie:
+                return 1.0
+            return sum(liczba for g, p, liczba in liczby
+                       if grupa in (None, g) and przedzial in (None, p)) / wszystkie
+        return udzial
+
+    @staticmethod
+    def kursor(wpis, sortuj=None):
+        """
+        Kursor strony za podanym wpisem – argument `po` dla pobierz_strone
+        z tym samym sortuj: (znacznik, id), przy sortowaniu po ID – (id,),
+        po innym polu – (wartość pola, znacznik, id).
+        """
+        if sortuj in (None, "data"):
+            return (wpis['znacznik'], wpis['id'])
+        if sortuj == "id":
+            return (wpis['id'],)
+        return (kod_liczba(wpis['kod']) if sortuj == "kod" else wpis[sortuj], wpis['znacznik'], wpis['id'])
+
+    def stan_zmian(self):
+        """Stan historii dla zmiany_historii: (numer ostatniej zmiany w dzienniku, największe ID obliczenia)."""
+        return tuple(self.conn.execute("""
+            SELECT (SELECT COALESCE(MAX(nr), 0) FROM zmiany), (SELECT COALESCE(MAX(id), 0) FROM obliczenia)
+        """).fetchone())
+
+    def zmiany_historii(self, stan, limit=1000):
+        """
+        Obliczenia bazy głównej zmienione od stanu `stan` (ze stan_zmian) – do
+        przyrostowego odświeżania widoku historii. Zwraca (nowy stan, ID):
+        posortowane ID wpisów zmienionych (walidacja, powtórzenie), usuniętych
+        i nowych. Zamiast listy None, gdy zmian jest więcej niż `limit` albo
+        dziennik ich nie obejmuje (najstarsze już usunięte, archiwizacja,
+        baza odtworzona z kopii) – widok trzeba wtedy wczytać od nowa.
+        """
+        with self.odczyt() as conn:
+            nowy = self.stan_zmian()
+            if nowy[0] < stan[0]:
+                return nowy, None
+            zmiany = conn.execute("SELECT nr, obliczenie_id FROM zmiany WHERE nr > ? ORDER BY nr LIMIT ?",
+                                  (stan[0], limit + 1)).fetchall()
+            # Numery zmian są kolejne – luka na początku to zmiany usunięte z dziennika
+            if (len(zmiany) > limit or zmiany and zmiany[0][0] != stan[0] + 1
+                    or any(obliczenie_id is None for _, obliczenie_id in zmiany)):
+                return nowy, None
+            nowe = conn.execute("SELECT id FROM obliczenia WHERE id > ? ORDER BY id LIMIT ?",
+                                (stan[1], limit + 1 - len(zmiany))).fetchall()
+        if len(zmiany) + len(nowe) > limit:
+            return nowy, None
+        return nowy, sorted({obliczenie_id for _, obliczenie_id in zmiany} | {r[0] for r in nowe})
+
+    @z_cache
+    def pobierz_wpisy(self, ids, grupa=None, przedzial=None, kod_prefix=None, od=None, do=None,
+                      z_archiwum=None, status=None):
+        """
+        Wpisy (z metrażami) o podanych ID spełniające filtry jak w pobierz_strone,
+        jako słownik {ID: wpis}. Brak ID w wyniku – wpisu nie ma albo nie spełnia filtrów.
+        """
+        # Wpisy wyszukiwane po kluczu głównym – grupa i przedział bez indeksu
+        warunki, parametry = self._warunki(grupa, przedzial, kod_prefix, od, do, status, indeks_slownikow=False)
+        lata = self._lata_archiwow(od, do, z_archiwum)
+        ids = list(ids)
+        wpisy = {}
+        for i in range(0, len(ids), 500):
+            porcja = ids[i:i + 500]
+            where = " AND ".join([f"id IN ({','.join('?' * len(porcja))})"] + warunki)
+            wpisy.update((wpis['id'], wpis) for wpis in self._pobierz_z_partycji(f"WHERE {where}",
+                                                                                porcja + parametry, lata))
+        return wpisy
+
+    @z_cache
+    def nazwy_slownika(self, slownik):
+        """Posortowane nazwy słownika bazy głównej ("grupy", "przedzialy" albo "metody")."""
+        if slownik not in SLOWNIKI:
+            raise ValueError(f"Nieznany słownik: {slownik!r}")
+        return [r[0] for r in self.conn.execute(f"SELECT nazwa FROM main.{slownik} ORDER BY nazwa")]
+
+    @z_cache
+    def szukaj_kodow(self, prefiks=None, srodek=None, koncowka=None, limit=100):
+        """
+        Wyszukuje kody produktów w historii po fragmentach (patrz warunki_kodu),
+        np. rodzina "123-45", segment środkowy "4567" albo wariant "891".
+        Zwraca listę słowników {kod, liczba, ostatnia_data} posortowaną po kodzie.
+        """
+        warunki, parametry = warunki_kodu(prefiks, srodek, koncowka)
+        where = f"WHERE {' AND '.join(warunki)}" if warunki else ""
+        cursor = self.conn.execute(f"""
+            SELECT {KOD_TEKST} AS kod, SUM(wystapienia) AS liczba, {data_lokalna("MAX(znacznik)")} AS ostatnia_data
+            FROM obliczenia {where}
+            GROUP BY obliczenia.kod ORDER BY obliczenia.kod LIMIT ?
+        """, parametry + [limit])
+        return [dict(row) for row in cursor.fetchall()]
+
+    @z_cache
+    def ostatnie_obliczenia(self, kod, limit=5, z_archiwum=False):
+        """
+        `limit` najnowszych wpisów (z metrażami) produktu `kod`, od najnowszego.
+        Jedno zapytanie na plik: wpisy z idx_obliczenia_kod_pokrywajacy, nazwy
+        i metraże dołączone złączeniami. z_archiwum=True – brakujące do
+        `limit` wpisy z archiwów, od najnowszego.
+        """
+        rows = []
+        for rok in [None] + self._lata_archiwow(z_archiwum=z_archiwum):
+            if len(rows) >= limit:
+                break
+            with self._archiwum(rok) as schemat:
+                cursor = self.conn.execute(f"""
+                    WITH ostatnie AS (
+                        SELECT {KOLUMNY_WPISU} FROM {schemat}.obliczenia
+                        WHERE kod = ? ORDER BY znacznik DESC, id DESC LIMIT ?
+                    )
+                    SELECT ostatnie.*, g.nazwa AS nazwa_grupy, p.nazwa AS nazwa_przedzialu,
+                           mt.nazwa AS metoda, m.metry
+                    FROM ostatnie
+                    JOIN {schemat}.grupy g ON g.id = ostatnie.grupa
+                    JOIN {schemat}.przedzialy p ON p.id = ostatnie.przedzial
+                    LEFT JOIN {schemat}.metry_obliczenia m ON m.obliczenie_id = ostatnie.id
+                    LEFT JOIN {schemat}.metody mt ON mt.id = m.metoda_id
+                    ORDER BY ostatnie.znacznik DESC, ostatnie.id DESC
+                """, (kod_liczba(kod), limit - len(rows)))
+                wpisy = {}
+                for wiersz in cursor:
+                    wpis = wpisy.get(wiersz['id'])
+                    if wpis is None:
+                        wpis = wpisy[wiersz['id']] = dict(wiersz)
+                        wpis.update(grupa=wpis.pop('nazwa_grupy'), przedzial=wpis.pop('nazwa_przedzialu'),
+                                    metraze={})
+                        del wpis['metoda'], wpis['metry']
+                    if wiersz['metoda'] is not None:
+                        wpis['metraze'][wiersz['metoda']] = wiersz['metry']
+                rows.extend(wpisy.values())
+        return rows
+
+    @staticmethod
+    def _usun_wyzwalacze(conn):
+        for nazwa in WYZWALACZE:
+            conn.execute(f"DROP TRIGGER IF EXISTS {nazwa}")
+
+    @staticmethod
+    def _utworz_wyzwalacze(conn):
+        for nazwa, tresc in WYZWALACZE.items():
+            conn.execute(f"CREATE TRIGGER {nazwa} {tresc}")
+
+    def _dolicz_statystyki(self, conn, od_id=None, do_id=None, schemat="main"):
+        """Dodaje do statystyk obliczenia o ID z przedziału [od_id, do_id] (domyślnie wszystkie)."""
+        warunek, parametry = "", ()
+        if od_id is not None:
+            warunek, parametry = "WHERE o.id BETWEEN ? AND ?", (od_id, do_id)
+        conn.execute(f"""
+            INSERT INTO statystyki (grupa, przedzial, miesiac, liczba, suma_czas_total, liczba_walidacji,
+                                    suma_czas_produkcji, suma_odchylen, suma_odchylen_abs)
+            SELECT {nazwa_ze_slownika("grupy", "grupa_id", schemat)},
+                   {nazwa_ze_slownika("przedzialy", "przedzial_id", schemat)},
+                   {data_lokalna("znacznik", "%Y-%m")}, SUM(wystapienia), TOTAL(czas_total * wystapienia),
+                   COUNT(odchylenie),
+                   TOTAL(czas_produkcji), TOTAL(odchylenie), TOTAL(abs(odchylenie))
+            FROM {schemat}.obliczenia o {warunek or "WHERE true"} GROUP BY grupa_id, przedzial_id, 3
+            ON CONFLICT (grupa, przedzial, miesiac) DO UPDATE SET
+                liczba = liczba + excluded.liczba,
+                suma_czas_total = suma_czas_total + excluded.suma_czas_total,
+                liczba_walidacji = liczba_walidacji + excluded.liczba_walidacji,
+                suma_czas_produkcji = suma_czas_produkcji + excluded.suma_czas_produkcji,
+                suma_odchylen = suma_odchylen + excluded.suma_odchylen,
+                suma_odchylen_abs = suma_odchylen_abs + excluded.suma_odchylen_abs
+        """, parametry)
+        conn.execute(f"""
+            INSERT INTO statystyki_metod (grupa, metoda, miesiac, liczba, suma_metrow)
+            SELECT {nazwa_ze_slownika("grupy", "o.grupa_id", schemat)},
+                   {nazwa_ze_slownika("metody", "m.metoda_id", schemat)},
+                   {data_lokalna("o.znacznik", "%Y-%m")}, SUM(o.wystapienia), TOTAL(m.metry * o.wystapienia)
+            FROM {schemat}.metry_obliczenia m JOIN {schemat}.obliczenia o ON o.id = m.obliczenie_id
+            {warunek or "WHERE true"} GROUP BY o.grupa_id, m.metoda_id, 3
+            ON CONFLICT (grupa, metoda, miesiac) DO UPDATE SET
+                liczba = liczba + excluded.liczba,
+                suma_metrow = suma_metrow + excluded.suma_metrow
+        """, parametry)
+
+    def przelicz_statystyki(self):
+        """
+        Odbudowuje tabele statystyk od zera na podstawie historii. Statystyki
+        obejmują też wpisy przeniesione do archiwów – te doliczane są kolejno,
+        każde archiwum w osobnej transakcji.
+        """
+        with self.transakcja() as conn:
+            conn.execute("DELETE FROM statystyki")
+            conn.execute("DELETE FROM statystyki_metod")
+            self._dolicz_statystyki(conn)
+        for rok in self._lata_archiwow(z_archiwum=True):
+            with self._archiwum(rok) as schemat, self.transakcja() as conn:
+                self._dolicz_statystyki(conn, schemat=schemat)
+
+    @staticmethod
+    def _filtry_statystyk(wg, dozwolone, filtry, od_miesiaca, do_miesiaca):
+        niedozwolone = set(wg) - set(dozwolone)
+        if niedozwolone:
+            raise ValueError(f"Nieznane wymiary podsumowania: {', '.join(sorted(niedozwolone))}")
+        warunki, parametry = [], []
+        for kolumna, wartosc in filtry.items():
+            if wartosc is not None:
+                warunki.append(f"{kolumna} = ?")
+                parametry.append(wartosc)
+        if od_miesiaca is not None:
+            warunki.append("miesiac >= ?")
+            parametry.append(od_miesiaca)
+        if do_miesiaca is not None:
+            warunki.append("miesiac <= ?")
+            parametry.append(do_miesiaca)
+        where = f"WHERE {' AND '.join(warunki)}" if warunki else ""
+        kolumny = "".join(f"{k}, " for k in wg)
+        grupowanie = f"GROUP BY {', '.join(wg)} ORDER BY {', '.join(wg)}" if wg else ""
+        return kolumny, where, grupowanie, parametry
+
+    @z_cache
+    def pobierz_statystyki(self, wg=("grupa", "przedzial", "miesiac"), grupa=None, przedzial=None,
+                           od_miesiaca=None, do_miesiaca=None):
+        """
+        Podsumowanie historii z tabeli statystyk, zagregowane wg wymiarów `wg`
+        (dowolny podzbiór: grupa, przedzial, miesiac). Miesiące w formacie 'RRRR-MM'.
+        Zwraca słowniki z liczbą obliczeń, sumą roboczominut (suma_czas_total),
+        liczbą walidacji i średnim odchyleniem (zwykłym i bezwzględnym) w %.
+        """
+        kolumny, where, grupowanie, parametry = self._filtry_statystyk(
+            wg, ("grupa", "przedzial", "miesiac"), {"grupa": grupa, "przedzial": przedzial},
+            od_miesiaca, do_miesiaca)
+        cursor = self.conn.execute(f"""
+            SELECT {kolumny}SUM(liczba) AS liczba, SUM(suma_czas_total) AS suma_czas_total,
+                   SUM(liczba_walidacji) AS liczba_walidacji,
+                   SUM(suma_odchylen) / NULLIF(SUM(liczba_walidacji), 0) AS srednie_odchylenie,
+                   SUM(suma_odchylen_abs) / NULLIF(SUM(liczba_walidacji), 0) AS srednie_odchylenie_abs
+            FROM statystyki {where} {grupowanie}
+        """, parametry)
+        return [dict(row) for row in cursor.fetchall()]
+
+    @z_cache
+    def pobierz_statystyki_metod(self, wg=("grupa", "metoda", "miesiac"), grupa=None, metoda=None,
+                                 od_miesiaca=None, do_miesiaca=None):
+        """Suma i liczba metraży wg wymiarów `wg` (podzbiór: grupa, metoda, miesiac)."""
+        kolumny, where, grupowanie, parametry = self._filtry_statystyk(
+            wg, ("grupa", "metoda", "miesiac"), {"grupa": grupa, "metoda": metoda},
+            od_miesiaca, do_miesiaca)
+        cursor = self.conn.execute(f"""
+            SELECT {kolumny}SUM(liczba) AS liczba, SUM(suma_metrow) AS suma_metrow
+            FROM statystyki_metod {where} {grupowanie}
+        """, parametry)
+        return [dict(row) for row in cursor.fetchall()]
+
+    def sciezka_archiwum(self, rok):
+        """Plik archiwum roku `rok` – obok bazy głównej, np. historia_2023.db."""
+        katalog, nazwa = os.path.split(os.path.abspath(self.db_path))
+        return os.path.join(katalog, f"{os.path.splitext(nazwa)[0]}_{rok}.db")
 
-        # Przygotuj DataFrame dla głównych danych
-        df_glowne = pd.DataFrame([{
-            'ID': r['id'],
-            'Kod': r['kod'],
-            'Data': r['data'],
-            'Grupa': r['grupa'],
-            'Przedział': r['przedzial'],
-            'Czas total [min]': r['czas_total'],
-            'Czas produkcji [min]': r['czas_produkcji'] if r['czas_produkcji'] is not None else '',
-            'Odchylenie [%]': r['odchylenie'] if r['odchylenie'] is not None else ''
-        } for r in dane])
-
-        # Przygotuj DataFrame dla metraży (w formacie "szerokim" – metody w kolumnach)
-        # Najpierw zbierz wszystkie unikalne metody
-        wszystkie_metody = set()
-        for r in dane:
-            wszystkie_metody.update(r['metraze'].keys())
-        wszystkie_metody = sorted(wszystkie_metody)
-
-        # Stwórz wiersze dla każdego ID z wartościami metraży
-        metry_data = []
-        for r in dane:
-            wiersz = {'ID': r['id']}
-            for metoda in wszystkie_metody:
-                wiersz[metoda] = r['metraze'].get(metoda, 0.0)
-            metry_data.append(wiersz)
-
-        df_metry = pd.DataFrame(metry_data)
-
-        # Zapisz do Excela z dwoma arkuszami
-        with pd.ExcelWriter(sciezka, engine='openpyxl') as writer:
-            df_glowne.to_excel(writer, sheet_name='Podsumowanie', index=False)
-            df_metry.to_excel(writer, sheet_name='Metry', index=False)
-
-        return True
\ No newline at end of file
+    def _lata_archiwow(self, od=None, do=None, z_archiwum=None):
+        """
+        Lata archiwów potrzebnych zapytaniu o zakres dat [od, do), od najnowszego.
+        z_archiwum=None – tylko gdy `od` sięga przed granicę archiwum.
+        """
+        if z_archiwum is False:
+            return []
+        od = znacznik(od) if od is not None else None
+        if z_archiwum is None:
+            granica = self.conn.execute("SELECT MAX(granica) FROM archiwa").fetchone()[0]
+            if od is None or granica is None or od >= znacznik(granica):
+                return []
+        warunki, parametry = [], []
+        if od is not None:
+            warunki.append("rok >= ?")
+            parametry.append(datetime.fromtimestamp(od).year)
+        if do is not None:
+            warunki.append("rok <= ?")
+            parametry.append(datetime.fromtimestamp(znacznik(do)).year)
+        where = f"WHERE {' AND '.join(warunki)}" if warunki else ""
+        return [r[0] for r in self.conn.execute(f"SELECT rok FROM archiwa {where} ORDER BY rok DESC", parametry)]
+
+    @contextmanager
+    def _archiwum(self, rok, utworz=False):
+        """
+        Dołącza (ATTACH) plik archiwum roku `rok` jako schemat "archiwum_<rok>"
+        i zwraca nazwę schematu; rok None oznacza bazę główną ("main").
+        Odłączenie wymaga zakończonej transakcji – wewnątrz transakcji archiwum
+        zostaje dołączone do czasu kolejnego użycia poza nią.
+        """
+        if rok is None:
+            yield "main"
+            return
+        schemat = f"archiwum_{int(rok)}"
+        dolaczone = {r[1] for r in self.conn.execute("PRAGMA database_list")}
+        if schemat not in dolaczone:
+            sciezka = self.sciezka_archiwum(rok)
+            if not utworz and not os.path.exists(sciezka):
+                raise FileNotFoundError(f"Brak pliku archiwum {sciezka}")
+            self.conn.execute(f"ATTACH DATABASE ? AS {schemat}", (sciezka,))
+            if not self.conn.in_transaction:
+                self.conn.execute(f"PRAGMA {schemat}.auto_vacuum = INCREMENTAL")
+                self.conn.execute(f"PRAGMA {schemat}.journal_mode = {self.journal_mode}")
+                self.conn.execute(f"PRAGMA {schemat}.synchronous = {self.synchronous}")
+            # Archiwum zapisane przez starszą wersję programu
+            if (dodaj_znacznik_czasu(self, schemat) | zakoduj_slowniki(self, schemat)
+                    | dodaj_wystapienia(self, schemat)):
+                with self.transakcja() as conn:
+                    self._utworz_tabele(conn, schemat)
+                    conn.execute(f"PRAGMA {schemat}.user_version = {WERSJA_SCHEMATU}")
+        try:
+            yield schemat
+        finally:
+            if not self.conn.in_transaction:
+                self.conn.execute(f"DETACH DATABASE {schemat}")
+
+    def archiwizuj(self, przed, rozmiar_partii=20000, postep=None):
+        """
+        Przenosi wpisy starsze niż `przed` (jak `od` w _warunki) do rocznych plików
+        archiwum, partiami po `rozmiar_partii` – każda partia to jedna transakcja
+        obejmująca bazę główną i archiwum. ID i metraże przenoszone są bez zmian,
+        a statystyki nadal obejmują przeniesione wpisy.
+        W trybie WAL transakcja na dwóch plikach nie jest atomowa względem awarii;
+        wpisy, które trafiły już do archiwum, a zostały w bazie, zastąpi następne
+        wywołanie (INSERT OR REPLACE). postep(przeniesione) po każdej partii.
+        Zwraca liczbę przeniesionych wpisów.
+        """
+        przed = datetime.fromtimestamp(znacznik(przed))
+        lata = [int(r[0]) for r in self.conn.execute(
+            f"SELECT DISTINCT {data_lokalna('znacznik', '%Y')} FROM obliczenia WHERE znacznik < ?",
+            (znacznik(przed),))]
+        przeniesione = 0
+        for rok in lata:
+            zakres = "znacznik >= ? AND znacznik < ?"
+            granica = min(przed, datetime(rok + 1, 1, 1))
+            granice = (znacznik(date(rok, 1, 1)), znacznik(granica))
+            with self._archiwum(rok, utworz=True) as schemat:
+                with self.transakcja() as conn:
+                    self._utworz_tabele(conn, schemat)
+                    conn.execute(f"PRAGMA {schemat}.user_version = {WERSJA_SCHEMATU}")
+                    # Słowniki archiwum to kopie słowników bazy głównej (te same klucze)
+                    for slownik in SLOWNIKI:
+                        conn.execute(f"INSERT OR IGNORE INTO {schemat}.{slownik} "
+                                     f"SELECT id, nazwa FROM main.{slownik}")
+                    conn.execute("""
+                        INSERT INTO archiwa (rok, plik, granica) VALUES (?, ?, ?)
+                        ON CONFLICT (rok) DO UPDATE SET granica = MAX(granica, excluded.granica)
+                    """, (rok, os.path.basename(self.sciezka_archiwum(rok)), granica.isoformat()))
+                while True:
+                    with self.transakcja() as conn:
+                        ostatni = conn.execute(
+                            f"SELECT znacznik, id FROM obliczenia WHERE {zakres} ORDER BY znacznik DESC, id DESC "
+                            "LIMIT 1 OFFSET ?", granice + (rozmiar_partii - 1,)).fetchone()
+                        # Partia: wpisy zakresu do kursora (znacznik, id) włącznie albo cała reszta zakresu
+                        partia, parametry = zakres, granice
+                        if ostatni is not None:
+                            partia += " AND (znacznik, id) >= (?, ?)"
+                            parametry += tuple(ostatni)
+                        conn.execute(f"""
+                            INSERT OR REPLACE INTO {schemat}.obliczenia ({KOLUMNY_OBLICZENIA})
+                            SELECT {KOLUMNY_OBLICZENIA} FROM main.obliczenia WHERE {partia}
+                        """, parametry)
+                        liczba = conn.execute("SELECT changes()").fetchone()[0]
+                        if liczba == 0:
+                            break
+                        conn.execute(f"""
+                            INSERT OR REPLACE INTO {schemat}.metry_obliczenia (id, obliczenie_id, metoda_id, metry)
+                            SELECT id, obliczenie_id, metoda_id, metry FROM main.metry_obliczenia
+                            WHERE obliczenie_id IN (SELECT id FROM main.obliczenia WHERE {partia})
+                        """, parametry)
+                        # Bez wyzwalaczy – przeniesione wpisy zostają w statystykach
+                        self._usun_wyzwalacze(conn)
+                        conn.execute(f"""
+                            DELETE FROM main.metry_obliczenia
+                            WHERE obliczenie_id IN (SELECT id FROM main.obliczenia WHERE {partia})
+                        """, parametry)
+                        conn.execute(f"DELETE FROM main.obliczenia WHERE {partia}", parametry)
+                        self._utworz_wyzwalacze(conn)
+                        conn.execute("INSERT INTO zmiany (obliczenie_id) VALUES (NULL)")
+                    przeniesione += liczba
+                    if postep:
+                        postep(przeniesione)
+        return przeniesione
+
+    def sprawdz_plany_zapytan(self):
+        """
+        Wykonuje zapytania API na próbnym wpisie (w wycofywanej transakcji)
+        i sprawdza ich EXPLAIN QUERY PLAN. Zwraca listę (sql, krok_planu) dla
+        kroków będących pełnym skanem tabeli – pusta lista oznacza, że każde
+        zapytanie korzysta z indeksu. pobierz_wszystkie czyta całą bazę, więc
+        metodę należy uruchamiać na kopii lub małej bazie.
+        """
+        zapytania = []
+        filtry = ({}, {"grupa": "Box"}, {"przedzial": "do 2m2"},
+                  {"grupa": "Box", "przedzial": "do 2m2"}, {"kod_prefix": "123-45"},
+                  {"od": "2000-01-01", "do": "2100-01-01"})
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            self.conn.set_trace_callback(zapytania.append)
+            wpis_id = self.dodaj_wpis("123-4567-890", "Box", "do 2m2", {"HF Duży (ZEMAT)": 1.0}, 2.0)
+            self.dodaj_wpis("123-4567-890", "Box", "do 2m2", {"HF Duży (ZEMAT)": 1.0}, 2.0)
+            self.aktualizuj_czas_produkcji(wpis_id, 2.5, 25.0)
+            self.pobierz_wszystkie()
+            for f in filtry:
+                strona = self.pobierz_strone(**f)
+                self.pobierz_strone(po=self.kursor(strona[0]), **f)
+                list(islice(self.iteruj_wpisy(rozmiar_porcji=1, **f), 2))
+            for sortuj in SORTOWANIA:
+                for f in ({}, {"status": "poza_norma"}, {"grupa": "Box", "kod_prefix": "123-45"}):
+                    strona = self.pobierz_strone(limit=1, sortuj=sortuj, **f)
+                    self.pobierz_strone(po=self.kursor(strona[0], sortuj), limit=1, sortuj=sortuj, **f)
+            for f in filtry + ({"status": "poza_norma"},):
+                self.pobierz_wpisy([wpis_id], **f)
+            self.zmiany_historii((0, 0))
+            self.pobierz_zakres("2000-01-01", "2100-01-01", grupa="Box")
+            for okres in OKRESY:
+                self.podsumuj_zakres("2000-01-01", "2100-01-01", okres)
+                self.podsumuj_zakres("2000-01-01", "2100-01-01", okres, przedzial="do 2m2")
+            for fragmenty in ({"prefiks": "123-45"}, {"srodek": "4567"}, {"srodek": "45"},
+                              {"koncowka": "890"}, {"koncowka": "90"}):
+                self.szukaj_kodow(**fragmenty)
+            self.ostatnie_obliczenia("123-4567-890")
+            self.usun_wpis(wpis_id)
+        finally:
+            self.conn.set_trace_callback(None)
+            self.conn.execute("ROLLBACK")
+            # Klucze słowników nadane próbnym wpisom zniknęły razem z nimi
+            self._wyczysc_klucze()
+
+        problemy = []
+        for sql in dict.fromkeys(zapytania):
+            if sql.split(None, 1)[0].upper() not in ("SELECT", "WITH", "UPDATE", "DELETE"):
+                continue
+            materializowane = set()
+            for krok in self.conn.execute("EXPLAIN QUERY PLAN " + sql):
+                opis = krok[3]
+                # Podzapytanie z LIMIT sprawdzane jest we własnym kroku; skan jego wyniku – nie
+                if opis.startswith("MATERIALIZE "):
+                    materializowane.add(opis.split()[1])
+                    continue
+                if opis.startswith("SCAN ") and opis.split()[1] in materializowane:
+                    continue
+                # Strona wg ID czyta tabelę w kolejności klucza głównego tylko do LIMIT
+                if (opis.startswith("SCAN ") and opis.split()[1].endswith("obliczenia")
+                        and "ORDER BY obliczenia.id" in sql and "LIMIT" in sql):
+                    continue
+                # Pomijamy wyrażenia stałe, wewnętrzne tabele SQLite (np. sqlite_sequence)
+                # i małe tabele: listę archiwów, słowniki i podsumowania miesięczne
+                if (opis.startswith("SCAN ") and "INDEX" not in opis
+                        and not opis.startswith(("SCAN CONSTANT ROW", "SCAN sqlite_", "SCAN archiwa",
+                                                 "SCAN statystyki"))
+                        and not opis.endswith(tuple(f".{slownik}" for slownik in SLOWNIKI))):
+                    problemy.append((sql, opis))
+        return problemy
+
+    def export_do_excel(self, sciezka, z_archiwum=False, postep=None):
+        """
+        Eksportuje wszystkie dane do pliku Excel (z_archiwum=True – razem z archiwami).
+        Tworzy arkusz z głównymi danymi i arkusz z metrażami (metody w kolumnach).
+        Wiersze zapisywane są strumieniowo (openpyxl w trybie write-only) prosto
+        z iteruj_wpisy, więc zużycie pamięci nie zależy od liczby wpisów.
+        Ponad MAKS_WIERSZY_ARKUSZA wpisów trafia do kolejnych par arkuszy.
+        postep(wyeksportowane) co 10 000 wpisów. Zwraca False, gdy nie ma danych.
+        """
+        metody = self.metody_w_historii(z_archiwum)
+        wb = Workbook(write_only=True)
+        pogrubienie = Font(bold=True)
+
+        def naglowek(arkusz, nazwy):
+            komorki = []
+            for nazwa in nazwy:
+                komorka = WriteOnlyCell(arkusz, nazwa)
+                komorka.font = pogrubienie
+                komorki.append(komorka)
+            arkusz.append(komorki)
+
+        n = 0
+        for n, r in enumerate(self.iteruj_wpisy(z_archiwum), 1):
+            numer, reszta = divmod(n - 1, MAKS_WIERSZY_ARKUSZA)
+            if not reszta:
+                dopisek = f" ({numer + 1})" if numer else ""
+                podsumowanie = wb.create_sheet(f"Podsumowanie{dopisek}")
+                naglowek(podsumowanie, list(KOLUMNY_EXCELA))
+                metry = wb.create_sheet(f"Metry{dopisek}")
+                naglowek(metry, ['ID'] + metody)
+            podsumowanie.append([r[pole] for pole in KOLUMNY_EXCELA.values()])
+            metraze = r['metraze']
+            metry.append([r['id']] + [metraze.get(metoda, 0.0) for metoda in metody])
+            if postep and n % 10000 == 0:
+                postep(n)
+        if not n:
+            return False
+        wb.save(sciezka)
+        return True
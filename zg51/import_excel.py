@@ -0,0 +1,184 @@
+"""Import historii obliczeń ze skoroszytów Excela w układzie eksportu.
+
+Skoroszyt jak z export_do_excel: arkusz "Podsumowanie" (nagłówki
+KOLUMNY_EXCELA w dowolnej kolejności) i arkusz "Metry" – kolumna ID i po
+kolumnie na metodę – albo kolejne pary "Podsumowanie (2)"/"Metry (2)"...
+Oba arkusze czytane są równolegle, wiersz po wierszu (openpyxl w trybie
+read-only), więc wiersze arkusza Metry muszą iść w kolejności wierszy
+podsumowania (jak w eksporcie). Wpisy trafiają do bazy partiami przez
+dodaj_wpisy – pamięć zależy od rozmiaru partii, nie skoroszytu.
+
+Wiersz z błędem (kod spoza formatu xxx-xxxx-xxx, brak daty, grupy lub
+przedziału, tekst zamiast liczby, metraże innego ID) jest pomijany
+i zgłaszany, a import idzie dalej. Wpisy dostają nowe ID. Wiersz to jeden
+wpis z liczbą wystąpień i pierwszą datą z eksportu – import nie łączy
+powtórzeń, więc nie rozpoznaje też obliczeń już obecnych w bazie: ponowny
+import tego samego pliku dopisze je drugi raz.
+"""
+from datetime import date
+from itertools import islice
+
+from openpyxl import load_workbook
+
+from database import KOLUMNY_EXCELA, znacznik
+from utils import waliduj_kod
+
+# Bez tych kolumn arkusz podsumowania nie nadaje się do importu
+WYMAGANE = ('kod', 'data', 'grupa', 'przedzial', 'czas_total')
+
+# Tyle pierwszych odrzuconych wierszy zapamiętuje raport
+MAKS_PRZYKLADOW = 100
+
+
+def _liczba(wartosc, pole):
+    """Liczba z komórki (także tekst z przecinkiem dziesiętnym); pusta komórka – None."""
+    if wartosc is None or wartosc == "":
+        return None
+    if isinstance(wartosc, (int, float)) and not isinstance(wartosc, bool):
+        return float(wartosc)
+    try:
+        return float(str(wartosc).strip().replace(",", "."))
+    except ValueError:
+        raise ValueError(f"{pole}: {wartosc!r} nie jest liczbą") from None
+
+
+def _tekst(wartosc, pole):
+    tekst = str(wartosc).strip() if wartosc is not None else ""
+    if not tekst:
+        raise ValueError(f"brak wartości {pole}")
+    return tekst
+
+
+def _wpis(wartosci):
+    """Wpis dla dodaj_wpisy z wartości wiersza podsumowania {pole: wartość}."""
+    kod = str(wartosci.get('kod') or "").strip()
+    if not waliduj_kod(kod):
+        raise ValueError(f"kod {kod!r} nie ma formatu xxx-xxxx-xxx")
+    data = wartosci.get('data')
+    # Liczba w kolumnie daty to zwykle numer dnia Excela, nie znacznik czasu
+    if not isinstance(data, (str, date)) or data == "":
+        raise ValueError(f"data {data!r} nie jest datą")
+    try:
+        czas = znacznik(data)
+    except (ValueError, OverflowError, OSError):
+        raise ValueError(f"data {data!r} nie jest datą") from None
+    czas_total = _liczba(wartosci.get('czas_total'), "czas total")
+    if czas_total is None or czas_total < 0:
+        raise ValueError(f"nieprawidłowy czas total {wartosci.get('czas_total')!r}")
+    czas_produkcji = _liczba(wartosci.get('czas_produkcji'), "czas produkcji")
+    odchylenie = _liczba(wartosci.get('odchylenie'), "odchylenie")
+    if odchylenie is None and czas_produkcji is not None and czas_total > 0:
+        # Jak Produkt.oblicz_odchylenie
+        odchylenie = (czas_produkcji - czas_total) / czas_total * 100
+    wystapienia = _liczba(wartosci.get('wystapienia'), "wystąpienia")
+    if wystapienia is None:
+        wystapienia = 1
+    elif wystapienia < 1 or wystapienia != int(wystapienia):
+        raise ValueError(f"nieprawidłowa liczba wystąpień {wartosci.get('wystapienia')!r}")
+    pierwsza_data = wartosci.get('pierwsza_data')
+    if wystapienia > 1 and pierwsza_data not in (None, ""):
+        try:
+            pierwsza_data = znacznik(pierwsza_data)
+        except (ValueError, OverflowError, OSError, TypeError):
+            raise ValueError(f"pierwsza data {pierwsza_data!r} nie jest datą") from None
+    else:
+        pierwsza_data = None
+    return {'kod': kod, 'data': czas, 'grupa': _tekst(wartosci.get('grupa'), "grupy"),
+            'przedzial': _tekst(wartosci.get('przedzial'), "przedziału"), 'czas_total': czas_total,
+            'czas_produkcji': czas_produkcji, 'odchylenie': None if czas_produkcji is None else odchylenie,
+            'wystapienia': int(wystapienia), 'pierwsza_data': pierwsza_data, 'metry_dict': {}}
+
+
+def _naglowek(wiersze):
+    naglowek = next(wiersze, ())
+    return [str(h).strip() if h is not None else None for h in naglowek]
+
+
+def _pary_arkuszy(wb):
+    """(arkusz podsumowania, arkusz metraży lub None) dla każdej pary arkuszy eksportu."""
+    for nazwa in wb.sheetnames:
+        if nazwa.startswith("Podsumowanie"):
+            metry = "Metry" + nazwa[len("Podsumowanie"):]
+            yield wb[nazwa], wb[metry] if metry in wb.sheetnames else None
+
+
+def _wczytaj(wb, metody, raport, odrzucony):
+    """Wpisy kolejnych par arkuszy; odrzucone wiersze trafiają do raportu."""
+    def odrzuc(arkusz, nr, wpis_id, powod):
+        raport['odrzucone'] += 1
+        if len(raport['przyklady']) < MAKS_PRZYKLADOW:
+            raport['przyklady'].append((arkusz, nr, wpis_id, powod))
+        if odrzucony:
+            odrzucony(arkusz, nr, wpis_id, powod)
+
+    pary = list(_pary_arkuszy(wb))
+    if not pary:
+        raise ValueError("Skoroszyt nie ma arkusza Podsumowanie.")
+    for podsumowanie, metry in pary:
+        wiersze = podsumowanie.iter_rows(values_only=True)
+        kolumny = {KOLUMNY_EXCELA[h]: i for i, h in enumerate(_naglowek(wiersze)) if h in KOLUMNY_EXCELA}
+        brakujace = [h for h, pole in KOLUMNY_EXCELA.items()
+                     if pole not in kolumny and (pole in WYMAGANE or pole == 'id' and metry is not None)]
+        if brakujace:
+            raise ValueError(f"Arkusz {podsumowanie.title} nie ma kolumn: {', '.join(brakujace)}.")
+        wiersze_metrow, kolumny_metod = None, []
+        if metry is not None:
+            wiersze_metrow = metry.iter_rows(values_only=True)
+            naglowek = _naglowek(wiersze_metrow)
+            if 'ID' not in naglowek:
+                raise ValueError(f"Arkusz {metry.title} nie ma kolumny ID.")
+            kolumna_id = naglowek.index('ID')
+            # Nagłówek spoza słownika metod jest nazwą metody; nazwa pusta – kolumna pominięta
+            kolumny_metod = [(i, metody.get(h, h)) for i, h in enumerate(naglowek)
+                             if h and i != kolumna_id and metody.get(h, h)]
+
+        for nr, wiersz in enumerate(wiersze, 2):
+            wiersz_metrow = next(wiersze_metrow, ()) if wiersze_metrow is not None else ()
+            if all(v is None for v in wiersz):
+                continue
+            raport['wczytane'] += 1
+            wartosci = {pole: wiersz[i] if i < len(wiersz) else None for pole, i in kolumny.items()}
+            try:
+                wpis = _wpis(wartosci)
+                if wiersze_metrow is not None:
+                    id_metrow = wiersz_metrow[kolumna_id] if kolumna_id < len(wiersz_metrow) else None
+                    if _liczba(id_metrow, "ID") != _liczba(wartosci['id'], "ID"):
+                        raise ValueError(f"wiersz {nr} arkusza {metry.title} ma ID {id_metrow!r}")
+                    for i, metoda in kolumny_metod:
+                        metraz = _liczba(wiersz_metrow[i] if i < len(wiersz_metrow) else None, metoda)
+                        if metraz is not None and metraz < 0:
+                            raise ValueError(f"{metoda}: ujemny metraż {metraz}")
+                        if metraz:
+                            wpis['metry_dict'][metoda] = wpis['metry_dict'].get(metoda, 0.0) + metraz
+            except ValueError as e:
+                odrzuc(podsumowanie.title, nr, wartosci.get('id'), str(e))
+                continue
+            yield wpis
+
+
+def importuj_z_excel(baza, sciezka, metody=None, rozmiar_partii=20000, odrzucony=None, postep=None):
+    """
+    Importuje obliczenia ze skoroszytu `sciezka` do bazy `baza`. metody:
+    {nagłówek kolumny arkusza Metry: nazwa metody w bazie} – nazwa None lub
+    pusta pomija kolumnę. Każda partia `rozmiar_partii` wpisów to jedna
+    transakcja. odrzucony(arkusz, wiersz, id, powod) dla każdego pominiętego
+    wiersza, postep(wczytane, zaimportowane) po każdej partii.
+    Zwraca raport: wczytane, zaimportowane, odrzucone (liczba wierszy)
+    i przyklady – pierwsze odrzucone wiersze jako (arkusz, wiersz, id, powod).
+    Skoroszyt bez wymaganych kolumn – ValueError przed zapisem czegokolwiek
+    z danego arkusza.
+    """
+    raport = {'wczytane': 0, 'zaimportowane': 0, 'odrzucone': 0, 'przyklady': []}
+    wb = load_workbook(sciezka, read_only=True, data_only=True)
+    try:
+        wpisy = _wczytaj(wb, metody or {}, raport, odrzucony)
+        while True:
+            partia = list(islice(wpisy, rozmiar_partii))
+            if not partia:
+                return raport
+            baza.dodaj_wpisy(partia, rozmiar_partii=rozmiar_partii, scalaj=False)
+            raport['zaimportowane'] += len(partia)
+            if postep:
+                postep(raport['wczytane'], raport['zaimportowane'])
+    finally:
+        wb.close()
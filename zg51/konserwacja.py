@@ -0,0 +1,113 @@
+"""Konserwacja bazy historii: osierocone metraże, statystyki planisty zapytań
+i odzyskiwanie miejsca po usuniętych wpisach.
+
+Bazy sprzed włączenia kluczy obcych (PRAGMA foreign_keys) zawierają metraże
+usuniętych obliczeń – usun_osierocone kasuje je partiami. Nowe bazy mają
+auto_vacuum = INCREMENTAL, więc wolne strony oddawane są systemowi małymi
+krokami (PRAGMA incremental_vacuum); starszą bazę przełącza jednorazowo
+pełny VACUUM (konserwuj(pelna=True)).
+
+Każdy krok to krótka, osobna transakcja, a przerwij() sprawdzane między
+krokami kończy konserwację, gdy pojawi się praca – zapis w tle uruchamia ją
+w czasie bezczynności. Przerwana konserwacja przy następnym uruchomieniu
+zaczyna od nowa.
+"""
+import os
+
+AUTO_VACUUM_INCREMENTAL = 2     # wartość PRAGMA auto_vacuum
+
+
+def _rozmiar(sciezka):
+    return os.path.getsize(sciezka) if os.path.exists(sciezka) else 0
+
+
+def _pragma(conn, nazwa):
+    return conn.execute(f"PRAGMA {nazwa}").fetchone()[0]
+
+
+def usun_osierocone(baza, okno=50000, przerwij=None):
+    """
+    Usuwa metraże obliczeń, których już nie ma w bazie. Tabela przeglądana jest
+    oknami po `okno` kolejnych ID, każde okno w osobnej transakcji.
+    Zwraca liczbę usuniętych wierszy.
+    """
+    conn = baza.conn
+    ostatnie_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM metry_obliczenia").fetchone()[0]
+    usuniete = 0
+    for poczatek in range(0, ostatnie_id, okno):
+        if przerwij and przerwij():
+            break
+        with baza.transakcja():
+            # Metraże bez rodzica nie są w statystykach – wyzwalacz usunięcia ich nie odejmie
+            usuniete += conn.execute("""
+                DELETE FROM metry_obliczenia
+                WHERE id > ? AND id <= ?
+                  AND NOT EXISTS (SELECT 1 FROM obliczenia o WHERE o.id = metry_obliczenia.obliczenie_id)
+            """, (poczatek, poczatek + okno)).rowcount
+    return usuniete
+
+
+def analizuj(baza, limit=1000):
+    """
+    ANALYZE bazy głównej – statystyki dla planisty zapytań. limit > 0 ogranicza
+    próbkę do tylu wierszy na indeks (PRAGMA analysis_limit), 0 – pełna analiza.
+    """
+    baza.conn.execute(f"PRAGMA analysis_limit = {int(limit)}")
+    with baza.transakcja() as conn:
+        conn.execute("ANALYZE main")
+
+
+def zwolnij_miejsce(baza, strony_na_krok=1000, przerwij=None):
+    """
+    Oddaje systemowi wolne strony bazy (PRAGMA incremental_vacuum), po
+    `strony_na_krok` w kroku. Zwraca liczbę zwolnionych stron – 0, gdy baza
+    nie ma auto_vacuum = INCREMENTAL.
+    """
+    conn = baza.conn
+    if _pragma(conn, "auto_vacuum") != AUTO_VACUUM_INCREMENTAL:
+        return 0
+    zwolnione = 0
+    while not (przerwij and przerwij()):
+        krok = min(_pragma(conn, "freelist_count"), strony_na_krok)
+        if not krok:
+            break
+        # fetchall – każdy krok wyniku PRAGMA zwalnia jedną stronę
+        conn.execute(f"PRAGMA incremental_vacuum({krok})").fetchall()
+        zwolnione += krok
+    return zwolnione
+
+
+def konserwuj(baza, pelna=False, przerwij=None):
+    """
+    Usuwa osierocone metraże, odświeża statystyki planisty i zwalnia wolne strony.
+    pelna=True: pełne ANALYZE, przełączenie starszej bazy na auto_vacuum =
+    INCREMENTAL (VACUUM – wymaga wyłącznego dostępu do bazy) i checkpoint
+    z obcięciem pliku WAL. Zwraca raport: osierocone, vacuum, strony_zwolnione,
+    bajty_zwolnione, wolne_strony, rozmiar_przed, rozmiar_po (bajty pliku
+    bazy), wal_przed, wal_po (bajty dziennika WAL – VACUUM i kroki konserwacji
+    same go powiększają, póki checkpoint PASSIVE nie może go obciąć) oraz
+    przerwana.
+    """
+    conn = baza.conn
+    przerwij = przerwij or (lambda: False)
+    rozmiar_strony = _pragma(conn, "page_size")
+    strony_przed = _pragma(conn, "page_count")
+    raport = {'rozmiar_przed': _rozmiar(baza.db_path), 'wal_przed': _rozmiar(baza.db_path + "-wal"),
+              'vacuum': False,
+              'osierocone': usun_osierocone(baza, przerwij=przerwij)}
+    if not przerwij():
+        analizuj(baza, limit=0 if pelna else 1000)
+    if pelna and _pragma(conn, "auto_vacuum") != AUTO_VACUUM_INCREMENTAL:
+        conn.execute(f"PRAGMA auto_vacuum = {AUTO_VACUUM_INCREMENTAL}")
+        conn.execute("VACUUM")
+        raport['vacuum'] = True
+    zwolnij_miejsce(baza, przerwij=przerwij)
+    if _pragma(conn, "journal_mode") == "wal":
+        # Plik bazy skraca się dopiero przy checkpoincie
+        conn.execute(f"PRAGMA wal_checkpoint({'TRUNCATE' if pelna else 'PASSIVE'})").fetchall()
+    strony_zwolnione = strony_przed - _pragma(conn, "page_count")
+    raport.update(strony_zwolnione=strony_zwolnione, bajty_zwolnione=strony_zwolnione * rozmiar_strony,
+                  wolne_strony=_pragma(conn, "freelist_count"), rozmiar_po=_rozmiar(baza.db_path),
+                  wal_po=_rozmiar(baza.db_path + "-wal"),
+                  przerwana=przerwij())
+    return raport
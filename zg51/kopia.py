@@ -0,0 +1,126 @@
+"""Kopie zapasowe bazy historii w czasie pracy programu.
+
+Zwykłe kopiowanie pliku historia.db w trakcie zapisu może dać kopię
+niespójną. utworz_kopie kopiuje bazę przez SQLite (Connection.backup)
+porcjami stron z krótką przerwą między porcjami, więc zapis w tle i okno
+nie czekają na całą kopię. W trybie WAL kopia czyta jedną migawkę bazy
+(transakcja odczytu przez całą kopię) – zapisy innych połączeń nie
+zaczynają jej od nowa. W innych trybach dziennika migawka blokowałaby
+zapisy, więc baza kopiowana jest w jednym kroku.
+
+Kopia trafia do pliku <nazwa>-RRRRMMDD-GGMMSS.db (opcjonalnie .db.gz)
+w katalogu kopii; najstarsze kopie ponad `zachowaj` są usuwane. Archiwa
+roczne to osobne pliki zmieniane tylko przez archiwizację – nie są
+kopiowane.
+"""
+import gzip
+import os
+import re
+import shutil
+import sqlite3
+import time
+from datetime import datetime
+
+FORMAT_CZASU = "%Y%m%d-%H%M%S"
+
+
+def katalog_domyslny(db_path):
+    """Katalog "kopie" obok pliku bazy."""
+    return os.path.join(os.path.dirname(os.path.abspath(db_path)), "kopie")
+
+
+def _wzorzec_kopii(db_path):
+    nazwa = re.escape(os.path.splitext(os.path.basename(db_path))[0])
+    return re.compile(rf"{nazwa}-\d{{8}}-\d{{6}}\.db(\.gz)?")
+
+
+def lista_kopii(db_path, katalog=None):
+    """Ścieżki kopii bazy `db_path` w katalogu, od najstarszej."""
+    katalog = katalog or katalog_domyslny(db_path)
+    if not os.path.isdir(katalog):
+        return []
+    wzorzec = _wzorzec_kopii(db_path)
+    # Znacznik czasu w nazwie – kolejność nazw to kolejność kopii
+    return [os.path.join(katalog, p) for p in sorted(os.listdir(katalog)) if wzorzec.fullmatch(p)]
+
+
+def usun_stare_kopie(db_path, katalog=None, zachowaj=7):
+    """Usuwa kopie poza `zachowaj` najnowszymi; zwraca ścieżki usuniętych."""
+    stare = lista_kopii(db_path, katalog)[:-zachowaj] if zachowaj > 0 else []
+    for sciezka in stare:
+        os.remove(sciezka)
+    return stare
+
+
+def _kopiuj(zrodlo, cel, strony_na_krok, przerwa_s, postep):
+    """Connection.backup z przerwą po każdej porcji stron."""
+    def krok(status, pozostalo, wszystkie):
+        if postep:
+            postep(wszystkie - pozostalo, wszystkie)
+        if pozostalo:
+            time.sleep(przerwa_s)
+
+    wal = zrodlo.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    if not wal:
+        zrodlo.backup(cel, progress=krok)
+        return
+    zrodlo.execute("BEGIN")
+    try:
+        # Pierwszy odczyt ustala migawkę, którą kopiują wszystkie kroki
+        zrodlo.execute("SELECT COUNT(*) FROM sqlite_master").fetchone()
+        zrodlo.backup(cel, pages=strony_na_krok, progress=krok)
+    finally:
+        zrodlo.execute("COMMIT")
+
+
+def utworz_kopie(db_path, katalog=None, kompresja=False, zachowaj=7, strony_na_krok=1024,
+                 przerwa_s=0.01, sprawdz=True, postep=None):
+    """
+    Tworzy kopię bazy `db_path` (własne połączenie tylko do odczytu – można
+    wywołać z dowolnego wątku). Kopia sprawdzana jest PRAGMA quick_check
+    (sprawdz=False – bez sprawdzenia), zapisywana w trybie dziennika DELETE
+    (jeden plik) i dopiero gotowa dostaje docelową nazwę; kompresja=True –
+    plik .db.gz. postep(skopiowane_strony, wszystkie_strony) po każdym kroku.
+    Zwraca raport: plik, strony, rozmiar (bajty pliku kopii), czas_s, usuniete.
+    """
+    start = time.perf_counter()
+    katalog = katalog or katalog_domyslny(db_path)
+    os.makedirs(katalog, exist_ok=True)
+    nazwa = f"{os.path.splitext(os.path.basename(db_path))[0]}-{datetime.now().strftime(FORMAT_CZASU)}.db"
+    plik = os.path.join(katalog, nazwa + (".gz" if kompresja else ""))
+    if os.path.exists(plik):
+        raise FileExistsError(f"Kopia {plik} już istnieje.")
+    tymczasowy = os.path.join(katalog, nazwa + ".tmp")
+
+    try:
+        zrodlo = sqlite3.connect(f"file:{os.path.abspath(db_path)}?mode=ro", uri=True, isolation_level=None)
+        try:
+            cel = sqlite3.connect(tymczasowy)
+            try:
+                _kopiuj(zrodlo, cel, strony_na_krok, przerwa_s, postep)
+                cel.execute("PRAGMA journal_mode = DELETE")
+                strony = cel.execute("PRAGMA page_count").fetchone()[0]
+                if sprawdz:
+                    wynik = cel.execute("PRAGMA quick_check").fetchone()[0]
+                    if wynik != "ok":
+                        raise sqlite3.DatabaseError(f"Kopia bazy jest uszkodzona: {wynik}")
+            finally:
+                cel.close()
+        finally:
+            zrodlo.close()
+        if kompresja:
+            with open(tymczasowy, "rb") as wejscie, gzip.open(plik + ".tmp", "wb") as wyjscie:
+                shutil.copyfileobj(wejscie, wyjscie, 1 << 20)
+            os.remove(tymczasowy)
+            os.replace(plik + ".tmp", plik)
+        else:
+            os.replace(tymczasowy, plik)
+    except BaseException:
+        for niedokonczony in (tymczasowy, plik + ".tmp"):
+            if os.path.exists(niedokonczony):
+                os.remove(niedokonczony)
+        raise
+
+    return {'plik': plik, 'strony': strony, 'rozmiar': os.path.getsize(plik),
+            'czas_s': time.perf_counter() - start,
+            'usuniete': usun_stare_kopie(db_path, katalog, zachowaj)}
@@ -1,18 +1,30 @@
 import sys
-from PySide6.QtWidgets import QApplication
+from PySide6.QtWidgets import QApplication, QMessageBox
 from models import ZarzadcaDanych
 from views.main_window import MainWindow
+from zapis_w_tle import ZapisWTle
 
 
 def main():
     app = QApplication(sys.argv)
     app.setApplicationName("Zgrzewanie 4.0")
 
-    zarzadca = ZarzadcaDanych()
-    window = MainWindow(zarzadca)
+    try:
+        zarzadca = ZarzadcaDanych()
+    except OSError as e:
+        QMessageBox.critical(None, "Błąd danych", f"Nie można wczytać pliku konfiguracji grup: {e}")
+        sys.exit(1)
+    zapis = ZapisWTle(zarzadca.baza.db_path)
+    window = MainWindow(zarzadca, zapis)
     window.show()
 
-    sys.exit(app.exec())
+    kod = app.exec()
+    # Obliczenia czekające w kolejce trafiają do bazy przed wyjściem
+    if not zapis.zamknij():
+        QMessageBox.warning(None, "Błąd bazy", "Nie wszystkie obliczenia zostały zapisane "
+                            "w bazie historii.")
+    zarzadca.baza.zamknij()
+    sys.exit(kod)
 
 
 if __name__ == "__main__":
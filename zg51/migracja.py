@@ -0,0 +1,243 @@
+"""Migracje bazy historii: ze schematu zg5 i między wersjami schematu zg51.
+
+zg5 trzymał metraże w tabeli obliczenia – jedna kolumna REAL na metodę
+(nazwy "bezpieczne", bez polskich znaków). Migracja przemianowuje tę tabelę
+na obliczenia_zg5, BazaDanych tworzy obok nowy schemat, a wiersze są
+przenoszone porcjami – każda porcja w osobnej transakcji. Postęp wynika
+z największego przeniesionego ID, więc przerwana migracja wznawia się od
+miejsca przerwania. Po zakończeniu stara tabela jest usuwana, a numer
+schematu zapisywany w PRAGMA user_version.
+
+Schemat 2 zastępuje tekstową kolumnę data (ISO, czas lokalny) znacznikiem
+czasu – liczbą sekund od epoki Unix (dodaj_znacznik_czasu).
+
+Schemat 3 zastępuje nazwy grup, przedziałów i metod kluczami tabel
+słownikowych, a kody xxx-xxxx-xxx – liczbami (zakoduj_slowniki).
+
+Schemat 4 dodaje skrót treści obliczenia i licznik jego wystąpień
+(dodaj_wystapienia).
+"""
+
+KOLUMNY_PODSTAWOWE = ("id", "kod", "data", "grupa", "przedzial", "czas_total", "czas_produkcji", "odchylenie")
+# Tekst ISO w czasie lokalnym -> sekundy od epoki (UTC)
+ZNACZNIK_Z_DATY = "CAST(strftime('%s', data, 'utc') AS INTEGER)"
+TABELA_ZG5 = "obliczenia_zg5"
+# Kod xxx-xxxx-xxx -> liczba z jego cyfr (jak database.kod_liczba); inny tekst bez zmian
+KOD_LICZBA = ("CASE WHEN kod GLOB '[0-9][0-9][0-9]-[0-9][0-9][0-9][0-9]-[0-9][0-9][0-9]' "
+              "THEN CAST(replace(kod, '-', '') AS INTEGER) ELSE kod END")
+
+# Metody znane w zg5 – do odtworzenia oryginalnych nazw z nazw kolumn
+METODY_ZG5 = [
+    "HF Duży (ZEMAT)",
+    "HF Mały (WOLDAN)",
+    "Gorące Powietrze (MILLER)",
+    "Gorące Powietrze (Ręcznie)",
+    "Gorące Powietrze (Zgrzewarka jezdna)",
+    "Gorące Powietrze (ASATECH)",
+    "Gorący Klin (SEAMTEC)"
+]
+
+
+def nazwa_kolumny_zg5(oryginalna):
+    """Nazwa kolumny, pod którą zg5 zapisywał metraż metody (jak zg5/database.py)."""
+    zamiany = {" ": "_", "(": "", ")": "", "ą": "a", "ć": "c", "ę": "e", "ł": "l", "ń": "n",
+               "ó": "o", "ś": "s", "ź": "z", "ż": "z", "Ł": "L", "Ó": "O"}
+    return "".join(zamiany.get(z, z) for z in oryginalna)
+
+
+def _kolumny(conn, tabela, schemat="main"):
+    return [wiersz[1] for wiersz in conn.execute(f"PRAGMA {schemat}.table_info({tabela})")]
+
+
+def _istnieje(conn, tabela):
+    return conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?",
+                        (tabela,)).fetchone() is not None
+
+
+def schemat_zg5(conn):
+    """Czy tabela obliczenia ma szeroki schemat zg5 (kolumny metraży)."""
+    return bool(set(_kolumny(conn, "obliczenia")) - set(KOLUMNY_PODSTAWOWE)
+                - {"znacznik", "grupa_id", "przedzial_id", "skrot", "wystapienia", "pierwszy_znacznik"})
+
+
+def przygotuj_migracje_zg5(conn):
+    """
+    Jeśli baza ma schemat zg5, przenosi szeroką tabelę pod nazwę obliczenia_zg5
+    (bez jej indeksów i wyzwalaczy), robiąc miejsce na nowy schemat.
+    Zwraca True, gdy migracja jest do wykonania lub była przerwana.
+    """
+    if _istnieje(conn, TABELA_ZG5):
+        return True
+    if not _istnieje(conn, "obliczenia") or not schemat_zg5(conn):
+        return False
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        for typ, nazwa in conn.execute(
+                "SELECT type, name FROM sqlite_master WHERE tbl_name = 'obliczenia' "
+                "AND type IN ('index', 'trigger') AND sql IS NOT NULL").fetchall():
+            conn.execute(f"DROP {typ.upper()} {nazwa}")
+        # legacy_alter_table: klucze obce metry_obliczenia mają dalej wskazywać "obliczenia"
+        conn.execute("PRAGMA legacy_alter_table = ON")
+        conn.execute(f"ALTER TABLE obliczenia RENAME TO {TABELA_ZG5}")
+        conn.execute("PRAGMA legacy_alter_table = OFF")
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    conn.execute("COMMIT")
+    return True
+
+
+def dodaj_znacznik_czasu(baza, schemat="main"):
+    """
+    Schemat 1 -> 2: zastępuje kolumnę data tabeli obliczenia w `schemat`
+    (baza główna lub dołączone archiwum) kolumną znacznik. Usuwa indeksy
+    i wyzwalacze oparte na dacie – odtwarza je BazaDanych. Zwraca True,
+    jeśli tabela wymagała zmiany.
+    """
+    conn = baza.conn
+    if "data" not in _kolumny(conn, "obliczenia", schemat):
+        return False
+    with baza.transakcja():
+        for typ, nazwa in conn.execute(
+                f"SELECT type, name FROM {schemat}.sqlite_master WHERE sql IS NOT NULL AND "
+                "(type = 'trigger' OR (type = 'index' AND tbl_name = 'obliczenia'))").fetchall():
+            conn.execute(f"DROP {typ.upper()} {schemat}.{nazwa}")
+        conn.execute(f"ALTER TABLE {schemat}.obliczenia ADD COLUMN znacznik INTEGER NOT NULL DEFAULT 0")
+        conn.execute(f"UPDATE {schemat}.obliczenia SET znacznik = {ZNACZNIK_Z_DATY}")
+        conn.execute(f"ALTER TABLE {schemat}.obliczenia DROP COLUMN data")
+    return True
+
+
+def zakoduj_slowniki(baza, schemat="main"):
+    """
+    Schemat 2 -> 3: przebudowuje tabele obliczenia i metry_obliczenia
+    w `schemat` na klucze słowników i kody liczbowe. Nazwy trafiają do
+    słowników bazy głównej (archiwum dostaje ich kopię), ID wierszy i licznik
+    AUTOINCREMENT zostają bez zmian, a metraże bez obliczenia są pomijane.
+    Indeksy i wyzwalacze odtwarza BazaDanych. Zwraca True, jeśli tabele
+    wymagały zmiany.
+    """
+    conn = baza.conn
+    if "grupa" not in _kolumny(conn, "obliczenia", schemat):
+        return False
+    with baza.transakcja():
+        for typ, nazwa in conn.execute(
+                f"SELECT type, name FROM {schemat}.sqlite_master WHERE sql IS NOT NULL AND (type = 'trigger' "
+                "OR (type = 'index' AND tbl_name IN ('obliczenia', 'metry_obliczenia')))").fetchall():
+            conn.execute(f"DROP {typ.upper()} {schemat}.{nazwa}")
+        # legacy_alter_table: klucz obcy starych metraży nie przechodzi na obliczenia_v2
+        conn.execute("PRAGMA legacy_alter_table = ON")
+        conn.execute(f"ALTER TABLE {schemat}.obliczenia RENAME TO obliczenia_v2")
+        conn.execute(f"ALTER TABLE {schemat}.metry_obliczenia RENAME TO metry_obliczenia_v2")
+        conn.execute("PRAGMA legacy_alter_table = OFF")
+        baza._utworz_tabele(conn, schemat)
+
+        for slownik, tabela, kolumna in (("grupy", "obliczenia_v2", "grupa"),
+                                         ("przedzialy", "obliczenia_v2", "przedzial"),
+                                         ("metody", "metry_obliczenia_v2", "metoda")):
+            conn.execute(f"INSERT OR IGNORE INTO main.{slownik} (nazwa) "
+                         f"SELECT DISTINCT {kolumna} FROM {schemat}.{tabela}")
+            if schemat != "main":
+                conn.execute(f"INSERT OR IGNORE INTO {schemat}.{slownik} SELECT id, nazwa FROM main.{slownik}")
+        conn.execute(f"""
+            INSERT INTO {schemat}.obliczenia
+                (id, kod, znacznik, grupa_id, przedzial_id, czas_total, czas_produkcji, odchylenie)
+            SELECT o.id, {KOD_LICZBA}, o.znacznik, g.id, p.id, o.czas_total, o.czas_produkcji, o.odchylenie
+            FROM {schemat}.obliczenia_v2 o
+            JOIN main.grupy g ON g.nazwa = o.grupa
+            JOIN main.przedzialy p ON p.nazwa = o.przedzial
+        """)
+        conn.execute(f"""
+            INSERT INTO {schemat}.metry_obliczenia (id, obliczenie_id, metoda_id, metry)
+            SELECT m.id, m.obliczenie_id, s.id, m.metry
+            FROM {schemat}.metry_obliczenia_v2 m JOIN main.metody s ON s.nazwa = m.metoda
+            WHERE m.obliczenie_id IN (SELECT id FROM {schemat}.obliczenia)
+        """)
+
+        # Licznik AUTOINCREMENT przeszedł przy zmianie nazwy na tabele *_v2
+        for tabela in ("obliczenia", "metry_obliczenia"):
+            nazwy = (tabela, f"{tabela}_v2")
+            licznik = conn.execute(f"SELECT MAX(seq) FROM {schemat}.sqlite_sequence WHERE name IN (?, ?)",
+                                   nazwy).fetchone()[0]
+            conn.execute(f"DELETE FROM {schemat}.sqlite_sequence WHERE name IN (?, ?)", nazwy)
+            if licznik is not None:
+                conn.execute(f"INSERT INTO {schemat}.sqlite_sequence (name, seq) VALUES (?, ?)",
+                             (tabela, licznik))
+        conn.execute(f"DROP TABLE {schemat}.metry_obliczenia_v2")
+        conn.execute(f"DROP TABLE {schemat}.obliczenia_v2")
+    return True
+
+
+def dodaj_wystapienia(baza, schemat="main"):
+    """
+    Schemat 3 -> 4: dodaje do tabeli obliczenia w `schemat` kolumny skrot,
+    wystapienia i pierwszy_znacznik. Starsze wpisy nie mają skrótu (nie
+    znamy ich wymuszeń ani stawek), więc nie są łączone z nowymi. Usuwa
+    indeks historii – BazaDanych odtwarza go z nowymi kolumnami. Zwraca
+    True, jeśli tabela wymagała zmiany.
+    """
+    conn = baza.conn
+    kolumny = _kolumny(conn, "obliczenia", schemat)
+    if not kolumny or "skrot" in kolumny:
+        return False
+    with baza.transakcja():
+        conn.execute(f"DROP INDEX IF EXISTS {schemat}.idx_obliczenia_historia")
+        conn.execute(f"ALTER TABLE {schemat}.obliczenia ADD COLUMN skrot INTEGER")
+        conn.execute(f"ALTER TABLE {schemat}.obliczenia ADD COLUMN wystapienia INTEGER NOT NULL DEFAULT 1")
+        conn.execute(f"ALTER TABLE {schemat}.obliczenia ADD COLUMN pierwszy_znacznik INTEGER")
+    return True
+
+
+def migruj_z_zg5(baza, wersja_schematu, rozmiar_porcji=50000, postep=None):
+    """
+    Przenosi wiersze z obliczenia_zg5 do obliczenia/metry_obliczenia,
+    zachowując ID. postep(przeniesione, wszystkie) wywoływane po każdej porcji.
+    """
+    conn = baza.conn
+    nazwy_metod = {nazwa_kolumny_zg5(m): m for m in METODY_ZG5}
+    kolumny_metod = [k for k in _kolumny(conn, TABELA_ZG5) if k not in KOLUMNY_PODSTAWOWE]
+    # Kolumny nowej tabeli i wyrażenia, z których powstają w tabeli zg5
+    # (nazwy grup i przedziałów zamieniane są na klucze słowników niżej)
+    nowe_nazwy = {"data": "znacznik", "grupa": "grupa_id", "przedzial": "przedzial_id"}
+    kolumny = ", ".join(nowe_nazwy.get(k, k) for k in KOLUMNY_PODSTAWOWE)
+    wyrazenia = {"data": ZNACZNIK_Z_DATY, "kod": KOD_LICZBA}
+    wybor = ", ".join([wyrazenia.get(k, k) for k in KOLUMNY_PODSTAWOWE] + [f'"{k}"' for k in kolumny_metod])
+    metody = [nazwy_metod.get(k, k) for k in kolumny_metod]
+    wszystkie = conn.execute(f"SELECT COUNT(*) FROM {TABELA_ZG5}").fetchone()[0]
+
+    cursor = conn.cursor()
+    cursor.row_factory = None
+    while True:
+        with baza.transakcja():
+            ostatnie = conn.execute("SELECT COALESCE(MAX(id), 0) FROM obliczenia").fetchone()[0]
+            porcja = cursor.execute(f"SELECT {wybor} FROM {TABELA_ZG5} WHERE id > ? ORDER BY id LIMIT ?",
+                                    (ostatnie, rozmiar_porcji)).fetchall()
+            if not porcja:
+                break
+            n = len(KOLUMNY_PODSTAWOWE)
+            wiersze = [w[:3] + (baza._klucz(conn, "grupy", w[3]), baza._klucz(conn, "przedzialy", w[4]))
+                       + w[5:n] for w in porcja]
+            metry = [(w[0], baza._klucz(conn, "metody", metoda), m) for w in porcja
+                     for metoda, m in zip(metody, w[n:]) if m is not None and m > 0]
+            # Statystyki przeliczane raz, na końcu migracji
+            baza._usun_wyzwalacze(conn)
+            conn.executemany(f"INSERT INTO obliczenia ({kolumny}) "
+                             f"VALUES ({', '.join('?' * n)})", wiersze)
+            conn.executemany("INSERT INTO metry_obliczenia (obliczenie_id, metoda_id, metry) VALUES (?, ?, ?)",
+                             metry)
+            baza._utworz_wyzwalacze(conn)
+            przeniesione = conn.execute("SELECT COUNT(*) FROM obliczenia").fetchone()[0]
+        if postep:
+            postep(przeniesione, wszystkie)
+
+    with baza.transakcja():
+        # Zachowaj licznik AUTOINCREMENT zg5 (ID usuniętych wpisów nie wrócą)
+        conn.execute("""
+            UPDATE sqlite_sequence
+            SET seq = MAX(seq, COALESCE((SELECT seq FROM sqlite_sequence WHERE name = ?), 0))
+            WHERE name = 'obliczenia'
+        """, (TABELA_ZG5,))
+        conn.execute("DELETE FROM sqlite_sequence WHERE name = ?", (TABELA_ZG5,))
+        conn.execute(f"DROP TABLE {TABELA_ZG5}")
+        baza.przelicz_statystyki()
+        conn.execute(f"PRAGMA user_version = {int(wersja_schematu)}")
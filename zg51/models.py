@@ -1,59 +1,110 @@
+import errno
+import hashlib
 import json
 import os
+import tempfile
+import time
+from contextlib import contextmanager
 from datetime import datetime
 from typing import Dict, List, Optional, Tuple, Union
 from database import BazaDanych
 
+if os.name == "nt":
+    import msvcrt
+else:
+    import fcntl
+
+
+@contextmanager
+def blokada_pliku(sciezka: str, limit_s: float = 30.0):
+    """
+    Doradcza blokada wyłączna na pliku <sciezka>.lock (między procesami).
+    Gdy blokady nie da się uzyskać w `limit_s` sekund, zgłasza TimeoutError;
+    inne błędy (brak uprawnień, brak katalogu) – od razu jako OSError.
+    """
+    termin = time.monotonic() + limit_s
+    with open(sciezka + ".lock", "a+b") as f:
+        if os.name == "nt":
+            f.seek(0)
+            while True:
+                try:
+                    # LK_LOCK sam ponawia próbę przez ~10 s, potem zgłasza EDEADLOCK
+                    msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError as e:
+                    if e.errno not in (errno.EDEADLOCK, errno.EACCES):
+                        raise
+                    if time.monotonic() >= termin:
+                        raise TimeoutError(f"Plik {sciezka} jest zablokowany przez inny proces.") from e
+        else:
+            while True:
+                try:
+                    fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    break
+                except BlockingIOError:
+                    if time.monotonic() >= termin:
+                        raise TimeoutError(f"Plik {sciezka} jest zablokowany przez inny proces.") from None
+                    time.sleep(0.05)
+        try:
+            yield
+        finally:
+            if os.name == "nt":
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+            else:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
 
 class MetodaZgrzewania:
     """Klasa reprezentująca metodę zgrzewania z jej ustawieniami czasowymi"""
+    domyslne_czasy = {
+        "HF Duży (ZEMAT)": {
+            "do 2m2": (1, 2.0),
+            "od 2 do 20m2": (1, 3.0),
+            "od 20 do 60m2": (2, 2.0),
+            "powyżej 60m2": (3, 3.0)
+        },
+        "HF Mały (WOLDAN)": {
+            "do 2m2": (1, 2.0),
+            "od 2 do 20m2": (1, 3.0),
+            "od 20 do 60m2": (2, 2.0),
+            "powyżej 60m2": (3, 3.0)
+        },
+        "Gorące Powietrze (MILLER)": {
+            "do 2m2": (1, 1.5),
+            "od 2 do 20m2": (2, 1.5),
+            "od 20 do 60m2": (3, 1.5),
+            "powyżej 60m2": (4, 2.0)
+        },
+        "Gorące Powietrze (Ręcznie)": {
+            "do 2m2": (1, 3.0),
+            "od 2 do 20m2": (1, 5.0),
+            "od 20 do 60m2": (2, 4.0),
+            "powyżej 60m2": (3, 5.0)
+        },
+        "Gorące Powietrze (Zgrzewarka jezdna)": {
+            "do 2m2": (1, 1.5),
+            "od 2 do 20m2": (2, 2.0),
+            "od 20 do 60m2": (3, 3.0),
+            "powyżej 60m2": (4, 4.0)
+        },
+        "Gorące Powietrze (ASATECH)": {
+            "do 2m2": (1, 1.5),
+            "od 2 do 20m2": (2, 2.0),
+            "od 20 do 60m2": (3, 3.0),
+            "powyżej 60m2": (4, 4.0)
+        },
+        "Gorący Klin (SEAMTEC)": {
+            "do 2m2": (1, 1.5),
+            "od 2 do 20m2": (2, 1.5),
+            "od 20 do 60m2": (3, 1.5),
+            "powyżej 60m2": (4, 2.0)
+        }
+    }
+
     def __init__(self, nazwa: str):
         self.nazwa = nazwa
         self.czasy: Dict[str, Dict[str, Union[int, float]]] = {}
-        self.domyslne_czasy = {
-            "HF Duży (ZEMAT)": {
-                "do 2m2": (1, 2.0),
-                "od 2 do 20m2": (1, 3.0),
-                "od 20 do 60m2": (2, 2.0),
-                "powyżej 60m2": (3, 3.0)
-            },
-            "HF Mały (WOLDAN)": {
-                "do 2m2": (1, 2.0),
-                "od 2 do 20m2": (1, 3.0),
-                "od 20 do 60m2": (2, 2.0),
-                "powyżej 60m2": (3, 3.0)
-            },
-            "Gorące Powietrze (MILLER)": {
-                "do 2m2": (1, 1.5),
-                "od 2 do 20m2": (2, 1.5),
-                "od 20 do 60m2": (3, 1.5),
-                "powyżej 60m2": (4, 2.0)
-            },
-            "Gorące Powietrze (Ręcznie)": {
-                "do 2m2": (1, 3.0),
-                "od 2 do 20m2": (1, 5.0),
-                "od 20 do 60m2": (2, 4.0),
-                "powyżej 60m2": (3, 5.0)
-            },
-            "Gorące Powietrze (Zgrzewarka jezdna)": {
-                "do 2m2": (1, 1.5),
-                "od 2 do 20m2": (2, 2.0),
-                "od 20 do 60m2": (3, 3.0),
-                "powyżej 60m2": (4, 4.0)
-            },
-            "Gorące Powietrze (ASATECH)": {
-                "do 2m2": (1, 1.5),
-                "od 2 do 20m2": (2, 2.0),
-                "od 20 do 60m2": (3, 3.0),
-                "powyżej 60m2": (4, 4.0)
-            },
-            "Gorący Klin (SEAMTEC)": {
-                "do 2m2": (1, 1.5),
-                "od 2 do 20m2": (2, 1.5),
-                "od 20 do 60m2": (3, 1.5),
-                "powyżej 60m2": (4, 2.0)
-            }
-        }
         if nazwa in self.domyslne_czasy:
             self.czasy = {k: {"pracownicy": v[0], "czas": v[1]}
                          for k, v in self.domyslne_czasy[nazwa].items()}
@@ -69,30 +120,44 @@ class MetodaZgrzewania:
     def to_dict(self) -> dict:
         return {
             "nazwa": self.nazwa,
-            "czasy": self.czasy
+            "czasy": {k: dict(v) for k, v in self.czasy.items()}
         }
 
     @classmethod
     def from_dict(cls, data: dict) -> 'MetodaZgrzewania':
         metoda = cls(data["nazwa"])
-        metoda.czasy = data["czasy"]
+        # Kopia – słownik źródłowy służy jako migawka do scalania zapisów
+        metoda.czasy = {k: dict(v) for k, v in data["czasy"].items()}
         return metoda
 
 
 class Grupa:
-    """Klasa reprezentująca grupę produktów z metodami zgrzewania"""
+    """Klasa reprezentująca grupę produktów z metodami zgrzewania.
+
+    Grupa wczytana przez from_dict trzyma surowe słowniki metod i buduje
+    obiekty MetodaZgrzewania dopiero przy pierwszym odwołaniu do `metody`.
+    """
+    domyslne_metody = [
+        "HF Duży (ZEMAT)",
+        "HF Mały (WOLDAN)",
+        "Gorące Powietrze (MILLER)",
+        "Gorące Powietrze (Ręcznie)",
+        "Gorące Powietrze (Zgrzewarka jezdna)",
+        "Gorące Powietrze (ASATECH)",
+        "Gorący Klin (SEAMTEC)"
+    ]
+
     def __init__(self, nazwa: str):
         self.nazwa = nazwa
-        self.metody: List[MetodaZgrzewania] = []
-        self.domyslne_metody = [
-            "HF Duży (ZEMAT)",
-            "HF Mały (WOLDAN)",
-            "Gorące Powietrze (MILLER)",
-            "Gorące Powietrze (Ręcznie)",
-            "Gorące Powietrze (Zgrzewarka jezdna)",
-            "Gorące Powietrze (ASATECH)",
-            "Gorący Klin (SEAMTEC)"
-        ]
+        self._metody: List[MetodaZgrzewania] = []
+        self._surowe_metody: Optional[List[dict]] = None
+
+    @property
+    def metody(self) -> List[MetodaZgrzewania]:
+        if self._surowe_metody is not None:
+            self._metody = [MetodaZgrzewania.from_dict(m) for m in self._surowe_metody]
+            self._surowe_metody = None
+        return self._metody
 
     def dodaj_metode(self, metoda: MetodaZgrzewania):
         self.metody.append(metoda)
@@ -102,6 +167,9 @@ class Grupa:
             self.metody.pop(indeks)
 
     def to_dict(self) -> dict:
+        if self._surowe_metody is not None:
+            # Grupa nie była używana – zwracamy dane bez budowania obiektów
+            return {"nazwa": self.nazwa, "metody": self._surowe_metody}
         return {
             "nazwa": self.nazwa,
             "metody": [m.to_dict() for m in self.metody]
@@ -110,8 +178,7 @@ class Grupa:
     @classmethod
     def from_dict(cls, data: dict) -> 'Grupa':
         grupa = cls(data["nazwa"])
-        for metoda_data in data["metody"]:
-            grupa.dodaj_metode(MetodaZgrzewania.from_dict(metoda_data))
+        grupa._surowe_metody = data["metody"]
         return grupa
 
 
@@ -146,6 +213,12 @@ class Produkt:
     def oblicz_calkowity_czas(self) -> float:
         return sum(w["czas_calkowity"] for w in self.wyniki.values())
 
+    def wersja_stawek(self) -> str:
+        """Skrót stawek (pracownicy, czas na metr) metod użytych w obliczeniu dla jego przedziału."""
+        stawki = sorted((m.nazwa, m.pobierz_czas(self.przedzial)) for m in self.grupa.metody
+                        if m.nazwa in self.metry_zgrzewania)
+        return hashlib.blake2b(json.dumps(stawki, ensure_ascii=False).encode(), digest_size=8).hexdigest()
+
     def oblicz_odchylenie(self) -> Optional[float]:
         if self.czas_produkcji is not None:
             czas_obliczony = self.oblicz_calkowity_czas()
@@ -154,26 +227,87 @@ class Produkt:
         return None
 
 
+def _scal_liste(baza: Dict[str, dict], ich: List[dict], nasze: List[dict], scal,
+                konflikty: List[str], sciezka: Tuple[str, ...]) -> List[dict]:
+    """
+    Scala trójstronnie listy słowników o unikalnym kluczu "nazwa". Element
+    zmieniony po obu stronach scala `scal(baza, ich, nasz, konflikty, sciezka)`;
+    dodany po obu stronach pod tą samą nazwą – konflikt, wygrywa wersja lokalna.
+    """
+    ich_map = {e["nazwa"]: e for e in ich}
+    nasze_map = {e["nazwa"]: e for e in nasze}
+    wynik = []
+    for e in ich:
+        nazwa = e["nazwa"]
+        nasz = nasze_map.get(nazwa)
+        if nasz is not None:
+            pierwotny = baza.get(nazwa)
+            if nasz == pierwotny or e == nasz:
+                wynik.append(e)
+            elif e == pierwotny:
+                wynik.append(nasz)
+            elif pierwotny is None:
+                konflikty.append(" / ".join(sciezka + (nazwa,)))
+                wynik.append(nasz)
+            else:
+                wynik.append(scal(pierwotny, e, nasz, konflikty, sciezka + (nazwa,)))
+        elif nazwa in baza and e == baza[nazwa]:
+            continue  # usunięty lokalnie, nie zmieniony przez innych
+        else:
+            wynik.append(e)  # dodany przez innych lub zmieniony po naszym usunięciu
+    for e in nasze:
+        nazwa = e["nazwa"]
+        if nazwa in ich_map:
+            continue
+        if nazwa in baza and e == baza[nazwa]:
+            continue  # usunięty przez innych, lokalnie bez zmian
+        wynik.append(e)
+    return wynik
+
+
 class ZarzadcaDanych:
-    """Główny zarządca danych – wczytuje, zapisuje i modyfikuje grupy."""
+    """Główny zarządca danych – wczytuje, zapisuje i modyfikuje grupy.
+
+    Plik danych zawiera licznik "rewizja". Zapis odbywa się pod blokadą pliku:
+    jeśli rewizja na dysku różni się od wczytanej, zmiany innego procesu są
+    scalane z lokalnymi na poziomie czasów metod w przedziałach (konflikt –
+    wygrywa wersja lokalna, opis trafia do `konflikty`).
+    """
     def __init__(self, plik_danych: str = "dane_zgrzewania.json"):
         self.plik_danych = plik_danych
         self.grupy: List[Grupa] = []
         self.przedzialy = ["do 2m2", "od 2 do 20m2", "od 20 do 60m2", "powyżej 60m2"]
+        self.rewizja = 0
+        self._migawka: Dict[str, dict] = {}
+        self.konflikty: List[str] = []     # konflikty scalania przy ostatnim zapisie
         self._wczytaj()
         self.baza = BazaDanych()
 
+    def _czytaj_plik(self) -> Optional[dict]:
+        if not os.path.exists(self.plik_danych):
+            return None
+        with open(self.plik_danych, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
     def _wczytaj(self):
-        if os.path.exists(self.plik_danych):
-            try:
-                with open(self.plik_danych, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                    self.grupy = [Grupa.from_dict(g) for g in data.get("grupy", [])]
-            except (json.JSONDecodeError, IOError) as e:
-                print(f"Błąd wczytywania pliku: {e}. Tworzę domyślne grupy.")
-                self._utworz_domyslne()
-        else:
+        """
+        Wczytuje grupy z pliku danych; brak pliku – grupy domyślne. Błąd dostępu
+        (blokada, uprawnienia) jest zgłaszany dalej – grupy domyślne zapisane
+        później nadpisałyby konfigurację użytkownika.
+        """
+        try:
+            with blokada_pliku(self.plik_danych):
+                data = self._czytaj_plik()
+        except json.JSONDecodeError as e:
+            print(f"Błąd wczytywania pliku: {e}. Tworzę domyślne grupy.")
+            data = None
+        if data is None:
             self._utworz_domyslne()
+            return
+        grupy = data.get("grupy", [])
+        self.grupy = [Grupa.from_dict(g) for g in grupy]
+        self.rewizja = data.get("rewizja", 0)
+        self._migawka = {g["nazwa"]: g for g in grupy}
 
     def _utworz_domyslne(self):
         grupy_nazwy = ["Koła", "Box", "Płachty", "Nieregularne Drobne", "Nieregularne Duże"]
@@ -183,19 +317,102 @@ class ZarzadcaDanych:
                 grupa.dodaj_metode(MetodaZgrzewania(m_nazwa))
             self.grupy.append(grupa)
 
-    def zapisz(self):
+    def _scal(self, ich: List[dict], nasze: List[dict]) -> Tuple[List[dict], List[str]]:
+        """
+        Scala trójstronnie grupy z dysku (ich) z lokalnymi względem migawki – aż
+        do czasu metody w przedziale. Zwraca scalone grupy i opisy konfliktów
+        (ta sama wartość zmieniona inaczej przez obie strony – wygrywa lokalna).
+        """
+        konflikty: List[str] = []
+        wynik = _scal_liste(self._migawka, ich, nasze, self._scal_grupe, konflikty, ())
+        return wynik, konflikty
+
+    def _scal_grupe(self, baza: dict, ich: dict, nasza: dict, konflikty: List[str],
+                    sciezka: Tuple[str, ...]) -> dict:
+        metody_bazy = {m["nazwa"]: m for m in baza["metody"]}
+        metody = _scal_liste(metody_bazy, ich["metody"], nasza["metody"], self._scal_metode,
+                             konflikty, sciezka)
+        return {"nazwa": nasza["nazwa"], "metody": metody}
+
+    @staticmethod
+    def _scal_metode(baza: dict, ich: dict, nasza: dict, konflikty: List[str],
+                     sciezka: Tuple[str, ...]) -> dict:
+        czasy = {}
+        for przedzial in dict.fromkeys([*ich["czasy"], *nasza["czasy"]]):
+            b, t, n = (baza["czasy"].get(przedzial), ich["czasy"].get(przedzial),
+                       nasza["czasy"].get(przedzial))
+            if n == b:
+                wartosc = t
+            else:
+                if t != b and t != n:
+                    konflikty.append(" / ".join(sciezka + (przedzial,)))
+                wartosc = n
+            if wartosc is not None:
+                czasy[przedzial] = wartosc
+        return {"nazwa": nasza["nazwa"], "czasy": czasy}
+
+    def _zapisz_atomowo(self, data: dict):
+        katalog = os.path.dirname(os.path.abspath(self.plik_danych))
+        fd, tmp = tempfile.mkstemp(dir=katalog, prefix=".dane_", suffix=".tmp")
         try:
-            data = {
-                "grupy": [g.to_dict() for g in self.grupy],
-                "data_zapisu": datetime.now().isoformat()
-            }
-            with open(self.plik_danych, 'w', encoding='utf-8') as f:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
                 json.dump(data, f, ensure_ascii=False, indent=2)
-            return True
-        except IOError as e:
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, self.plik_danych)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+
+    def zapisz(self):
+        """
+        Zapisuje grupy, scalając je ze zmianami innych procesów. Konflikty
+        scalania (wygrała wersja lokalna) trafiają do `konflikty`.
+        """
+        konflikty: List[str] = []
+        try:
+            with blokada_pliku(self.plik_danych):
+                nasze = [g.to_dict() for g in self.grupy]
+                try:
+                    dysk = self._czytaj_plik()
+                except json.JSONDecodeError:
+                    dysk = None
+                rewizja = self.rewizja
+                scalone = nasze
+                if dysk is not None and dysk.get("rewizja", 0) != self.rewizja:
+                    rewizja = dysk.get("rewizja", 0)
+                    scalone, konflikty = self._scal(dysk.get("grupy", []), nasze)
+                data = {
+                    "rewizja": rewizja + 1,
+                    "grupy": scalone,
+                    "data_zapisu": datetime.now().isoformat()
+                }
+                self._zapisz_atomowo(data)
+        except (IOError, OSError) as e:
             print(f"Błąd zapisu pliku: {e}")
             return False
 
+        if scalone is not nasze:
+            # Obiekty grup zostają te same (widoki trzymają do nich odwołania);
+            # grupy scalone ze zmianami innych dostają nowe metody
+            obiekty = {g.nazwa: g for g in self.grupy}
+            nasze_id = {id(g) for g in nasze}
+            grupy = []
+            for g in scalone:
+                obiekt = obiekty.get(g["nazwa"])
+                if obiekt is None:
+                    obiekt = Grupa.from_dict(g)
+                elif id(g) not in nasze_id:
+                    obiekt._metody = []
+                    obiekt._surowe_metody = g["metody"]
+                grupy.append(obiekt)
+            self.grupy = grupy
+        self.rewizja = rewizja + 1
+        self._migawka = {g["nazwa"]: g for g in scalone}
+        self.konflikty = konflikty
+        return True
+
     # --- Zarządzanie grupami ---
     def dodaj_grupe(self, nazwa: str) -> bool:
         if not nazwa or any(g.nazwa.lower() == nazwa.lower() for g in self.grupy):
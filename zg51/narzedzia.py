@@ -0,0 +1,253 @@
+"""Narzędzia wiersza poleceń do obsługi bazy historii obliczeń.
+
+Uruchamianie: python narzedzia.py [--baza historia.db] <polecenie> [opcje]
+"""
+import argparse
+import csv
+import gzip
+import io
+import json
+import os
+import sys
+
+from database import BazaDanych
+from import_excel import importuj_z_excel
+from konserwacja import konserwuj
+from kopia import utworz_kopie
+
+
+def przelicz_statystyki(baza, args):
+    baza.przelicz_statystyki()
+    wiersze = baza.pobierz_statystyki(wg=())
+    liczba = wiersze[0]['liczba'] if wiersze and wiersze[0]['liczba'] else 0
+    print(f"Statystyki przeliczone ({liczba} obliczeń).")
+    return 0
+
+
+def pokaz_podsumowanie(baza, args):
+    for wiersz in baza.pobierz_statystyki(wg=args.wg, od_miesiaca=args.od, do_miesiaca=args.do):
+        odch = wiersz['srednie_odchylenie']
+        print("  ".join(str(wiersz[k]) for k in args.wg),
+              f"obliczeń: {wiersz['liczba']}",
+              f"roboczominuty: {wiersz['suma_czas_total']:.2f}",
+              f"śr. odchylenie: {odch:+.2f}%" if odch is not None else "śr. odchylenie: –")
+    return 0
+
+
+def pokaz_przebieg(baza, args):
+    for wiersz in baza.podsumuj_zakres(args.od, args.do, args.okres, grupa=args.grupa):
+        odch = wiersz['srednie_odchylenie']
+        print(wiersz['okres'],
+              f"obliczeń: {wiersz['liczba']}",
+              f"roboczominuty: {wiersz['suma_czas_total']:.2f}",
+              f"śr. odchylenie: {odch:+.2f}%" if odch is not None else "śr. odchylenie: –")
+    return 0
+
+
+def pokaz_wersje(baza, args):
+    # Migracja (jeśli potrzebna) wykonała się już przy otwarciu bazy
+    print(f"Schemat bazy {baza.db_path}: wersja {baza.wersja_schematu()}.")
+    return 0
+
+
+def archiwizuj(baza, args):
+    przeniesione = baza.archiwizuj(args.przed, postep=lambda n: print(f"Przeniesiono {n} obliczeń", flush=True))
+    print(f"Do archiwów rocznych przeniesiono {przeniesione} obliczeń sprzed {args.przed}.")
+    return 0
+
+
+KOLUMNY_EKSPORTU = ["id", "kod", "data", "znacznik", "grupa", "przedzial",
+                    "czas_total", "czas_produkcji", "odchylenie", "wystapienia", "pierwsza_data"]
+
+
+def _otworz_wyjscie(sciezka, kompresja):
+    """Plik tekstowy UTF-8 do zapisu (opcjonalnie gzip); "-" – standardowe wyjście."""
+    if sciezka == "-":
+        if kompresja:
+            return io.TextIOWrapper(gzip.GzipFile(fileobj=sys.stdout.buffer, mode="wb"),
+                                    encoding="utf-8", newline="")
+        return io.TextIOWrapper(sys.stdout.buffer, encoding="utf-8", newline="", write_through=True)
+    if kompresja:
+        return gzip.open(sciezka, "wt", encoding="utf-8", newline="")
+    return open(sciezka, "w", encoding="utf-8", newline="")
+
+
+def _zapisz_eksport(wyjscie, wpisy, format, metody):
+    """Zapisuje wpisy w formacie `format`; zwraca ich liczbę."""
+    n = 0
+    if format == "jsonl":
+        for n, wpis in enumerate(wpisy, 1):
+            wyjscie.write(json.dumps({k: wpis[k] for k in KOLUMNY_EKSPORTU + ["metraze"]},
+                                     ensure_ascii=False) + "\n")
+    elif format == "csv-dlugi":
+        # Wiersz na metraż: obliczenie powtórzone przy każdej metodzie
+        pisarz = csv.writer(wyjscie)
+        pisarz.writerow(KOLUMNY_EKSPORTU + ["metoda", "metry"])
+        for n, wpis in enumerate(wpisy, 1):
+            wiersz = [wpis[k] for k in KOLUMNY_EKSPORTU]
+            pisarz.writerows(wiersz + [metoda, metry] for metoda, metry in wpis['metraze'].items())
+            if not wpis['metraze']:
+                pisarz.writerow(wiersz + [None, None])
+    else:
+        # Kolumna na metodę; brak metrażu – pusta komórka
+        pisarz = csv.writer(wyjscie)
+        pisarz.writerow(KOLUMNY_EKSPORTU + metody)
+        for n, wpis in enumerate(wpisy, 1):
+            metraze = wpis['metraze']
+            pisarz.writerow([wpis[k] for k in KOLUMNY_EKSPORTU] + [metraze.get(m) for m in metody])
+    return n
+
+
+def eksportuj(baza, args):
+    z_archiwum = True if args.archiwum else None
+    metody = baza.metody_w_historii(z_archiwum, args.od, args.do) if args.format == "csv" else None
+    wpisy = baza.iteruj_wpisy(z_archiwum, grupa=args.grupa, przedzial=args.przedzial, od=args.od, do=args.do)
+    kompresja = args.gzip or args.wyjscie.endswith(".gz")
+    wyjscie = _otworz_wyjscie(args.wyjscie, kompresja)
+    try:
+        try:
+            n = _zapisz_eksport(wyjscie, wpisy, args.format, metody)
+        finally:
+            wpisy.close()
+            if wyjscie.buffer is sys.stdout.buffer:
+                wyjscie.flush()
+                wyjscie.detach()    # bez zamykania standardowego wyjścia
+            else:
+                wyjscie.close()
+    except BrokenPipeError:
+        # Odbiorca potoku (np. head) skończył czytać – reszta wyjścia do /dev/null
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        return 1
+    print(f"Wyeksportowano {n} obliczeń.", file=sys.stderr)
+    return 0
+
+
+def importuj(baza, args):
+    metody = {}
+    for mapowanie in args.metoda:
+        naglowek, _, nazwa = mapowanie.partition("=")
+        metody[naglowek.strip()] = nazwa.strip() or None
+    odrzucone = _otworz_wyjscie(args.odrzucone, args.odrzucone.endswith(".gz")) if args.odrzucone else None
+    try:
+        pisarz = None
+        if odrzucone:
+            pisarz = csv.writer(odrzucone)
+            pisarz.writerow(["arkusz", "wiersz", "id", "powod"])
+        raport = importuj_z_excel(
+            baza, args.plik, metody, rozmiar_partii=args.partia,
+            odrzucony=lambda *wiersz: pisarz.writerow(wiersz) if pisarz else None,
+            postep=lambda wczytane, zaimportowane: print(
+                f"Wczytano {wczytane} wierszy, zaimportowano {zaimportowane}", flush=True))
+    finally:
+        if odrzucone:
+            odrzucone.close()
+    print(f"Zaimportowano {raport['zaimportowane']} z {raport['wczytane']} wierszy; "
+          f"odrzucono {raport['odrzucone']}.")
+    if not odrzucone:
+        for arkusz, wiersz, wpis_id, powod in raport['przyklady'][:20]:
+            print(f"  {arkusz}, wiersz {wiersz} (ID {wpis_id}): {powod}")
+        if raport['odrzucone'] > 20:
+            print("  ... (wszystkie odrzucone wiersze: --odrzucone plik.csv)")
+    return 1 if raport['odrzucone'] else 0
+
+
+def konserwacja(baza, args):
+    raport = konserwuj(baza, pelna=args.pelna)
+    if raport['vacuum']:
+        print("Baza przełączona na auto_vacuum = INCREMENTAL (VACUUM).")
+    print(f"Usunięto osieroconych metraży: {raport['osierocone']}.")
+    print(f"Zwolniono {raport['strony_zwolnione']} stron ({raport['bajty_zwolnione'] / 2**20:.1f} MB); "
+          f"plik bazy: {raport['rozmiar_przed'] / 2**20:.1f} MB -> {raport['rozmiar_po'] / 2**20:.1f} MB, "
+          f"dziennik WAL: {raport['wal_przed'] / 2**20:.1f} MB -> {raport['wal_po'] / 2**20:.1f} MB.")
+    if raport['wolne_strony']:
+        print(f"Wolnych stron w pliku: {raport['wolne_strony']} (baza bez auto_vacuum = INCREMENTAL "
+              "– użyj --pelna).")
+    return 0
+
+
+def kopia(baza, args):
+    raport = utworz_kopie(baza.db_path, katalog=args.katalog, kompresja=args.gzip, zachowaj=args.zachowaj,
+                          strony_na_krok=args.strony, przerwa_s=args.przerwa_ms / 1000)
+    print(f"Kopia bazy: {raport['plik']} ({raport['strony']} stron, {raport['rozmiar'] / 2**20:.1f} MB, "
+          f"{raport['czas_s']:.1f} s).")
+    for sciezka in raport['usuniete']:
+        print(f"Usunięto starą kopię {sciezka}.")
+    return 0
+
+
+def postep_migracji(przeniesione, wszystkie):
+    print(f"Migracja z zg5: {przeniesione}/{wszystkie} obliczeń", flush=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--baza", default="historia.db", help="ścieżka do pliku bazy (domyślnie historia.db)")
+    sub = parser.add_subparsers(dest="polecenie", required=True)
+
+    p = sub.add_parser("statystyki", help="odbudowa tabel statystyk od zera")
+    p.set_defaults(funkcja=przelicz_statystyki)
+
+    p = sub.add_parser("podsumowanie", help="podsumowanie historii z tabel statystyk")
+    p.add_argument("--wg", nargs="*", default=["grupa"], choices=["grupa", "przedzial", "miesiac"])
+    p.add_argument("--od", help="pierwszy miesiąc RRRR-MM")
+    p.add_argument("--do", help="ostatni miesiąc RRRR-MM")
+    p.set_defaults(funkcja=pokaz_podsumowanie)
+
+    p = sub.add_parser("przebieg", help="obliczenia dzień po dniu lub tydzień po tygodniu")
+    p.add_argument("--okres", default="dzien", choices=["dzien", "tydzien"])
+    p.add_argument("--od", required=True, help="pierwszy dzień RRRR-MM-DD")
+    p.add_argument("--do", help="dzień RRRR-MM-DD, od którego już nie liczyć")
+    p.add_argument("--grupa")
+    p.set_defaults(funkcja=pokaz_przebieg)
+
+    p = sub.add_parser("migracja", help="migracja bazy zg5 do bieżącego schematu (wznawialna)")
+    p.set_defaults(funkcja=pokaz_wersje)
+
+    p = sub.add_parser("archiwizuj", help="przeniesienie starych obliczeń do rocznych plików archiwum")
+    p.add_argument("--przed", required=True, help="data RRRR-MM-DD – starsze obliczenia trafiają do archiwum")
+    p.set_defaults(funkcja=archiwizuj)
+
+    p = sub.add_parser("eksport", help="eksport historii do CSV lub JSONL (strumieniowo)")
+    p.add_argument("--format", default="csv", choices=["csv", "csv-dlugi", "jsonl"],
+                   help="csv – metoda w kolumnie, csv-dlugi – wiersz na metraż, jsonl – obiekt na obliczenie")
+    p.add_argument("-o", "--wyjscie", default="-", help="plik wynikowy (domyślnie standardowe wyjście)")
+    p.add_argument("--gzip", action="store_true", help="kompresja gzip (także gdy plik kończy się na .gz)")
+    p.add_argument("--od", help="pierwszy dzień RRRR-MM-DD")
+    p.add_argument("--do", help="dzień RRRR-MM-DD, od którego już nie eksportować")
+    p.add_argument("--grupa")
+    p.add_argument("--przedzial")
+    p.add_argument("--archiwum", action="store_true",
+                   help="także archiwa roczne (domyślnie tylko gdy --od sięga przed archiwizację)")
+    p.set_defaults(funkcja=eksportuj)
+
+    p = sub.add_parser("import", help="import obliczeń ze skoroszytu Excela w układzie eksportu")
+    p.add_argument("plik", help="plik .xlsx z arkuszami Podsumowanie i Metry")
+    p.add_argument("--metoda", action="append", default=[], metavar="NAGLOWEK=NAZWA",
+                   help="nazwa metody dla kolumny arkusza Metry (NAGLOWEK= – kolumna pominięta); można powtarzać")
+    p.add_argument("--odrzucone", metavar="PLIK", help="zapis odrzuconych wierszy z powodem do CSV")
+    p.add_argument("--partia", type=int, default=20000, help="wpisów na transakcję (domyślnie 20000)")
+    p.set_defaults(funkcja=importuj)
+
+    p = sub.add_parser("konserwacja", help="usunięcie osieroconych metraży, ANALYZE i zwolnienie miejsca")
+    p.add_argument("--pelna", action="store_true",
+                   help="pełne ANALYZE, VACUUM starszej bazy i obcięcie pliku WAL (wymaga wyłącznego dostępu)")
+    p.set_defaults(funkcja=konserwacja)
+
+    p = sub.add_parser("kopia", help="kopia zapasowa bazy w czasie pracy programu (porcjami stron)")
+    p.add_argument("--katalog", help="katalog kopii (domyślnie \"kopie\" obok bazy)")
+    p.add_argument("--zachowaj", type=int, default=7, help="tyle najnowszych kopii zostaje (domyślnie 7)")
+    p.add_argument("--gzip", action="store_true", help="kopia skompresowana (.db.gz)")
+    p.add_argument("--strony", type=int, default=1024, help="stron bazy na krok kopiowania (domyślnie 1024)")
+    p.add_argument("--przerwa-ms", type=float, default=10, help="przerwa między krokami w ms (domyślnie 10)")
+    p.set_defaults(funkcja=kopia)
+
+    args = parser.parse_args(argv)
+    baza = BazaDanych(args.baza, postep_migracji=postep_migracji)
+    try:
+        return args.funkcja(baza, args)
+    finally:
+        baza.zamknij()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Moduły aplikacji importowane są płasko (jak przy uruchamianiu z katalogu zg51)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
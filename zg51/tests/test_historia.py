@@ -0,0 +1,39 @@
+from database import BazaDanych
+from views.history import ModelHistorii
+
+
+def _model(baza):
+    model = ModelHistorii(baza)
+    model.ROZMIAR_STRONY, model.MAKS_STRON = 5, 1
+    model.odswiez()
+    while model.canFetchMore():
+        model.fetchMore()
+    return model
+
+
+def _wiersze(model):
+    return [model.wpis(w) for w in range(model.rowCount())]
+
+
+def test_wyparta_strona_po_zmianach_w_bazie_czytana_jest_bez_przesuniecia(tmp_path):
+    baza = BazaDanych(str(tmp_path / "historia.db"), scalaj_powtorzenia=False)
+    try:
+        for n in range(20):
+            baza.dodaj_wpis(f"100-1000-{n:03d}", "Box", "do 2m2", {"HF Duży (ZEMAT)": 1.0}, 2.0)
+        model = _model(baza)
+        przed = [wpis['id'] for wpis in _wiersze(model)]
+        # Strony 0–2 wyparte (w pamięci tylko ostatnia); zmiany w środku listy
+        baza.usun_wpis(przed[7])
+        baza.aktualizuj_czas_produkcji(przed[8], 5.0, 10.0)
+
+        # Przed uzgodnieniem ponowny odczyt pokazuje te same wpisy w tych samych wierszach
+        wiersze = _wiersze(model)
+        assert [wpis and wpis['id'] for wpis in wiersze] == przed[:7] + [None] + przed[8:]
+        assert wiersze[8]['czas_produkcji'] == 5.0
+
+        model.odswiez_zmiany()
+        oczekiwane = baza.pobierz_strone(limit=100, sortuj="data", rosnaco=False)
+        assert [wpis['id'] for wpis in _wiersze(model)] == [wpis['id'] for wpis in oczekiwane]
+        assert model.rowCount() == 19
+    finally:
+        baza.zamknij()
@@ -0,0 +1,21 @@
+import os
+
+from benchmark import przykladowe_wpisy
+from database import BazaDanych
+from konserwacja import konserwuj
+
+
+def test_raport_podaje_plik_bazy_i_dziennik_wal_osobno(tmp_path):
+    sciezka = str(tmp_path / "historia.db")
+    baza = BazaDanych(sciezka)
+    try:
+        baza.dodaj_wpisy([{'kod': k, 'grupa': g, 'przedzial': p, 'metry_dict': m, 'czas_total': c}
+                          for k, g, p, m, c in przykladowe_wpisy(2000)])
+        raport = konserwuj(baza)
+        assert raport['wal_przed'] > 0
+        assert raport['rozmiar_po'] == os.path.getsize(sciezka)
+        assert raport['wal_po'] == os.path.getsize(sciezka + "-wal")
+        raport = konserwuj(baza, pelna=True)
+        assert raport['wal_po'] == 0
+    finally:
+        baza.zamknij()
@@ -0,0 +1,145 @@
+import json
+import multiprocessing
+import os
+
+import pytest
+
+from models import ZarzadcaDanych, blokada_pliku
+
+
+@pytest.fixture
+def katalog(tmp_path, monkeypatch):
+    # ZarzadcaDanych otwiera historia.db w katalogu bieżącym
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+def _zarzadca(plik):
+    return ZarzadcaDanych(str(plik))
+
+
+def _czas(plik, nazwa_grupy, przedzial="do 2m2"):
+    with open(plik, encoding="utf-8") as f:
+        data = json.load(f)
+    grupa = next(g for g in data["grupy"] if g["nazwa"] == nazwa_grupy)
+    return grupa["metody"][0]["czasy"][przedzial]
+
+
+def test_rozne_grupy_obie_zmiany_zachowane(katalog):
+    plik = katalog / "dane.json"
+    a = _zarzadca(plik)
+    assert a.zapisz()
+    b = _zarzadca(plik)
+    try:
+        assert a.edytuj_metode_w_grupie(0, 0, {"do 2m2": (2, 1.5)})
+        assert b.edytuj_metode_w_grupie(1, 0, {"do 2m2": (3, 2.5)})
+
+        assert _czas(plik, a.grupy[0].nazwa) == {"pracownicy": 2, "czas": 1.5}
+        assert _czas(plik, a.grupy[1].nazwa) == {"pracownicy": 3, "czas": 2.5}
+        # Zapis scalający przejmuje zmianę drugiego pisarza do pamięci
+        assert b.grupy[0].metody[0].pobierz_czas("do 2m2") == (2, 1.5)
+        with open(plik, encoding="utf-8") as f:
+            assert json.load(f)["rewizja"] == b.rewizja == 3
+    finally:
+        a.baza.zamknij()
+        b.baza.zamknij()
+
+
+def test_ta_sama_grupa_rozne_metody_i_przedzialy_bez_konfliktu(katalog):
+    plik = katalog / "dane.json"
+    a = _zarzadca(plik)
+    assert a.zapisz()
+    b = _zarzadca(plik)
+    try:
+        assert a.edytuj_metode_w_grupie(0, 0, {"do 2m2": (2, 1.5)})
+        assert b.edytuj_metode_w_grupie(0, 1, {"do 2m2": (3, 2.5)})
+        assert b.edytuj_metode_w_grupie(0, 0, {"powyżej 60m2": (5, 7.0)})
+        assert a.edytuj_metode_w_grupie(0, 0, {"od 2 do 20m2": (4, 4.0)})
+
+        assert a.konflikty == [] and b.konflikty == []
+        c = _zarzadca(plik)
+        metody = c.grupy[0].metody
+        assert metody[0].pobierz_czas("do 2m2") == (2, 1.5)
+        assert metody[0].pobierz_czas("powyżej 60m2") == (5, 7.0)
+        assert metody[0].pobierz_czas("od 2 do 20m2") == (4, 4.0)
+        assert metody[1].pobierz_czas("do 2m2") == (3, 2.5)
+        # Scalona grupa to nadal ten sam obiekt – widoki trzymają do niej odwołania
+        assert a.grupy[0].metody[1].pobierz_czas("do 2m2") == (3, 2.5)
+        c.baza.zamknij()
+    finally:
+        a.baza.zamknij()
+        b.baza.zamknij()
+
+
+def test_ten_sam_przedzial_konflikt_wygrywa_pozniejszy(katalog):
+    plik = katalog / "dane.json"
+    a = _zarzadca(plik)
+    assert a.zapisz()
+    b = _zarzadca(plik)
+    try:
+        grupa = a.grupy[0].nazwa
+        metoda = a.grupy[0].metody[0].nazwa
+        assert a.edytuj_metode_w_grupie(0, 0, {"do 2m2": (2, 1.5)})
+        assert b.edytuj_metode_w_grupie(0, 0, {"do 2m2": (4, 9.0)})
+
+        assert b.konflikty == [f"{grupa} / {metoda} / do 2m2"]
+        assert _czas(plik, grupa) == {"pracownicy": 4, "czas": 9.0}
+        c = _zarzadca(plik)
+        assert c.grupy[0].metody[0].pobierz_czas("do 2m2") == (4, 9.0)
+        c.baza.zamknij()
+    finally:
+        a.baza.zamknij()
+        b.baza.zamknij()
+
+
+def _pisarz(katalog, nr, zapisy, start):
+    """Proces: dodaje własne grupy i zmienia czasy własnej metody we wspólnej grupie."""
+    os.chdir(katalog)
+    zarzadca = ZarzadcaDanych(os.path.join(katalog, "dane.json"))
+    start.wait()
+    for k in range(zapisy):
+        assert zarzadca.dodaj_grupe(f"P{nr}-{k}")
+        indeks = next(i for i, g in enumerate(zarzadca.grupy) if g.nazwa == "Koła")
+        assert zarzadca.edytuj_metode_w_grupie(indeks, nr, {"do 2m2": (1, float(k))})
+    zarzadca.baza.zamknij()
+
+
+def test_rownolegle_procesy_nie_gubia_zmian(katalog):
+    procesy, zapisy = 4, 15
+    plik = str(katalog / "dane.json")
+    z = ZarzadcaDanych(plik)
+    assert z.zapisz()
+    z.baza.zamknij()
+    start = multiprocessing.Event()
+    lista = [multiprocessing.Process(target=_pisarz, args=(str(katalog), nr, zapisy, start))
+             for nr in range(procesy)]
+    for p in lista:
+        p.start()
+    start.set()
+    for p in lista:
+        p.join(60)
+    assert [p.exitcode for p in lista] == [0] * procesy
+
+    wynik = ZarzadcaDanych(plik)
+    try:
+        nazwy = {g.nazwa: g for g in wynik.grupy}
+        assert {f"P{nr}-{k}" for nr in range(procesy) for k in range(zapisy)} <= set(nazwy)
+        kola = nazwy["Koła"].metody
+        assert [kola[nr].pobierz_czas("do 2m2") for nr in range(procesy)] == \
+            [(1, float(zapisy - 1))] * procesy
+        assert wynik.rewizja == 1 + procesy * zapisy * 2
+    finally:
+        wynik.baza.zamknij()
+
+
+def test_blokada_zajeta_konczy_sie_timeoutem(katalog):
+    plik = str(katalog / "dane.json")
+    with blokada_pliku(plik):
+        with pytest.raises(TimeoutError):
+            with blokada_pliku(plik, limit_s=0.2):
+                pass
+
+
+def test_brak_dostepu_do_pliku_blokady_nie_daje_domyslnych(katalog):
+    with pytest.raises(OSError):
+        ZarzadcaDanych(str(katalog / "brak" / "dane.json"))
@@ -0,0 +1,26 @@
+from benchmark import wypelnij_historie
+from database import BazaDanych
+
+
+def test_zapytania_api_korzystaja_z_indeksow(tmp_path):
+    sciezka = str(tmp_path / "historia.db")
+    BazaDanych(sciezka).zamknij()
+    wypelnij_historie(sciezka, 2000)
+    baza = BazaDanych(sciezka)
+    try:
+        baza.conn.execute("ANALYZE")
+        problemy = baza.sprawdz_plany_zapytan()
+        assert problemy == [], "\n".join(krok for _, krok in problemy)
+    finally:
+        baza.zamknij()
+
+
+def test_sprawdzenie_planow_na_pustej_bazie_nie_psuje_zapisu(tmp_path):
+    baza = BazaDanych(str(tmp_path / "historia.db"))
+    try:
+        assert baza.sprawdz_plany_zapytan() == []
+        # Próbne wpisy wycofano razem z kluczami słowników, które dla nich dopisano
+        wpis_id = baza.dodaj_wpis("123-4567-890", "Box", "do 2m2", {"HF Duży (ZEMAT)": 1.0}, 2.0)
+        assert baza.pobierz_wpisy([wpis_id])[wpis_id]["grupa"] == "Box"
+    finally:
+        baza.zamknij()
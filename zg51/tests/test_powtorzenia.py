@@ -0,0 +1,141 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from database import BazaDanych
+from import_excel import importuj_z_excel
+
+METRY = {"HF Duży (ZEMAT)": 2.0, "Gorący Klin (SEAMTEC)": 1.5}
+
+
+@pytest.fixture
+def baza(tmp_path):
+    baza = BazaDanych(str(tmp_path / "historia.db"))
+    yield baza
+    baza.zamknij()
+
+
+def _wpis(data, **inne):
+    return dict({'kod': "123-4567-890", 'grupa': "Box", 'przedzial': "do 2m2", 'metry_dict': METRY,
+                 'czas_total': 10.0, 'data': data}, **inne)
+
+
+def _miesiace(baza):
+    return {s['miesiac']: (s['liczba'], s['suma_czas_total'])
+            for s in baza.pobierz_statystyki(wg=("miesiac",))}
+
+
+def _statystyki(baza):
+    return (baza.pobierz_statystyki(), baza.pobierz_statystyki_metod())
+
+
+def test_powtorzenie_odlegle_w_czasie_to_osobny_wpis(baza):
+    ids = baza.dodaj_wpisy([_wpis(datetime(2025, 1, 15, 10))])
+    ids += baza.dodaj_wpisy([_wpis(datetime(2026, 10, 15, 10))])
+
+    assert ids[0] != ids[1]
+    assert _miesiace(baza) == {"2025-01": (1, 10.0), "2026-10": (1, 10.0)}
+    assert [w['id'] for w in baza.pobierz_zakres("2025-01-01", "2025-02-01")] == [ids[0]]
+    assert [w['id'] for w in baza.pobierz_zakres("2026-10-01", "2026-11-01")] == [ids[1]]
+
+
+def test_powtorzenia_kolejnych_dni_nie_lacza_sie(baza):
+    start = datetime(2025, 3, 1, 9)
+    baza.dodaj_wpisy([_wpis(start + timedelta(days=d)) for d in range(30)])
+
+    assert _miesiace(baza) == {"2025-03": (30, 300.0)}
+    dni = baza.podsumuj_zakres("2025-03-01", "2025-04-01")
+    assert [(d['okres'], d['liczba']) for d in dni] == [(f"2025-03-{d:02d}", 1) for d in range(1, 31)]
+
+
+def test_powtorzenia_w_oknie_to_jeden_wpis_liczony_razy_wystapienia(baza):
+    start = datetime(2025, 3, 5, 10)
+    ids = baza.dodaj_wpisy([_wpis(start), _wpis(start + timedelta(minutes=5))])
+    ids += baza.dodaj_wpisy([_wpis(start + timedelta(minutes=12))])
+
+    assert len(set(ids)) == 1
+    wpis = baza.pobierz_wpisy(ids[:1])[ids[0]]
+    assert wpis['wystapienia'] == 3
+    assert wpis['pierwsza_data'] == "2025-03-05T10:00:00"
+    assert wpis['data'] == "2025-03-05T10:12:00"
+    assert _miesiace(baza) == {"2025-03": (3, 30.0)}
+    assert [(d['liczba'], d['suma_czas_total']) for d in baza.podsumuj_zakres("2025-03-05", "2025-03-06")] == \
+        [(3, 30.0)]
+    metody = {s['metoda']: (s['liczba'], s['suma_metrow']) for s in baza.pobierz_statystyki_metod(wg=("metoda",))}
+    assert metody == {"HF Duży (ZEMAT)": (3, 6.0), "Gorący Klin (SEAMTEC)": (3, 4.5)}
+    assert baza.szukaj_kodow(prefiks="123-45")[0]['liczba'] == 3
+
+
+def test_powtorzenie_przez_polnoc_to_osobny_wpis(baza):
+    ids = baza.dodaj_wpisy([_wpis(datetime(2025, 1, 31, 23, 55)), _wpis(datetime(2025, 2, 1, 0, 5))])
+
+    assert ids[0] != ids[1]
+    assert _miesiace(baza) == {"2025-01": (1, 10.0), "2025-02": (1, 10.0)}
+
+
+def test_walidacja_wydziela_ostatnie_wykonanie(baza):
+    start = datetime(2025, 3, 5, 10)
+    wpis_id = baza.dodaj_wpisy([_wpis(start + timedelta(minutes=m)) for m in (0, 5, 10)])[0]
+
+    zwalidowany = baza.aktualizuj_czas_produkcji(wpis_id, 11.0, 10.0)
+
+    assert zwalidowany != wpis_id
+    wpisy = baza.pobierz_wpisy([wpis_id, zwalidowany])
+    assert wpisy[wpis_id]['wystapienia'] == 2 and wpisy[wpis_id]['czas_produkcji'] is None
+    assert wpisy[zwalidowany]['wystapienia'] == 1 and wpisy[zwalidowany]['czas_produkcji'] == 11.0
+    assert wpisy[zwalidowany]['data'] == "2025-03-05T10:10:00"
+    assert wpisy[zwalidowany]['metraze'] == METRY
+    statystyki = baza.pobierz_statystyki(wg=())[0]
+    assert (statystyki['liczba'], statystyki['liczba_walidacji']) == (3, 1)
+    # Wyzwalacze dają to samo, co przeliczenie od zera
+    przed = _statystyki(baza)
+    baza.przelicz_statystyki()
+    assert _statystyki(baza) == przed
+
+
+def test_bez_scalania_kazde_obliczenie_osobno(tmp_path):
+    baza = BazaDanych(str(tmp_path / "historia.db"), scalaj_powtorzenia=False)
+    try:
+        start = datetime(2025, 3, 5, 10)
+        ids = baza.dodaj_wpisy([_wpis(start), _wpis(start + timedelta(minutes=1))])
+        assert ids[0] != ids[1]
+        assert baza.dodaj_wpisy([_wpis(start)], scalaj=True) == [ids[1]]
+    finally:
+        baza.zamknij()
+
+
+def test_eksport_i_import_zachowuja_wystapienia(baza, tmp_path):
+    start = datetime(2025, 3, 5, 10)
+    baza.dodaj_wpisy([_wpis(start + timedelta(minutes=m)) for m in (0, 5, 10)])
+    baza.dodaj_wpisy([_wpis(start + timedelta(minutes=2), kod="123-4567-891")])
+    plik = str(tmp_path / "eksport.xlsx")
+    assert baza.export_do_excel(plik)
+
+    nowa = BazaDanych(str(tmp_path / "nowa.db"))
+    try:
+        raport = importuj_z_excel(nowa, plik)
+        assert (raport['zaimportowane'], raport['odrzucone']) == (2, 0)
+        pola = ('kod', 'data', 'pierwsza_data', 'wystapienia', 'czas_total', 'metraze')
+        assert [{p: w[p] for p in pola} for w in nowa.iteruj_wpisy()] == \
+            [{p: w[p] for p in pola} for w in baza.iteruj_wpisy()]
+        assert _statystyki(nowa) == _statystyki(baza)
+    finally:
+        nowa.zamknij()
+
+
+def test_statystyki_bazy_schematu_4_przeliczane_z_wagami(tmp_path):
+    sciezka = str(tmp_path / "historia.db")
+    baza = BazaDanych(sciezka)
+    start = datetime(2025, 3, 5, 10)
+    baza.dodaj_wpisy([_wpis(start + timedelta(minutes=m)) for m in (0, 5)])
+    # Statystyki jak w schemacie 4 – wiersz liczony raz, bez wystąpień
+    baza.conn.execute("UPDATE statystyki SET liczba = 1, suma_czas_total = 10.0")
+    baza.conn.execute("PRAGMA user_version = 4")
+    baza.zamknij()
+
+    baza = BazaDanych(sciezka)
+    try:
+        assert baza.wersja_schematu() == 5
+        assert _miesiace(baza) == {"2025-03": (2, 20.0)}
+    finally:
+        baza.zamknij()
@@ -0,0 +1,22 @@
+import time
+
+from benchmark import przykladowe_wpisy
+from database import BazaDanych
+
+# Najmniejsza przepustowość dodaj_wpisy (wpisów/s) – zapas ok. 3x względem
+# pomiaru na laptopie; dodaj_wpis w pętli (transakcja na wpis) daje ok. 2,5 tys./s
+PROG_WPISOW_NA_S = 5000
+
+
+def test_dodaj_wpisy_nie_spada_do_zapisu_pojedynczego(tmp_path):
+    wpisy = [{'kod': k, 'grupa': g, 'przedzial': p, 'metry_dict': m, 'czas_total': c}
+             for k, g, p, m, c in przykladowe_wpisy(20000)]
+    baza = BazaDanych(str(tmp_path / "historia.db"))
+    try:
+        t0 = time.perf_counter()
+        ids = baza.dodaj_wpisy(wpisy)
+        czas = time.perf_counter() - t0
+        assert ids == list(range(1, len(wpisy) + 1))
+        assert len(wpisy) / czas >= PROG_WPISOW_NA_S, f"{len(wpisy) / czas:.0f} wpisów/s"
+    finally:
+        baza.zamknij()
@@ -0,0 +1,60 @@
+import sqlite3
+
+import pytest
+from PySide6.QtCore import Qt
+
+from zapis_w_tle import ZapisWTle
+
+
+def _wpis(kod):
+    return (kod, "Koła", "do 2m2", {"Zgrzewanie": 1.5}, 3.75)
+
+
+def test_czas_produkcji_dla_zapomnianego_zlecenia_zglasza_blad(tmp_path):
+    zapis = ZapisWTle(str(tmp_path / "historia.db"), konserwacja_co_s=None)
+    zapis.MAKS_ZLECEN = 1
+    bledy = []
+    # Wątek zapisujący nie ma pętli zdarzeń – bez DirectConnection sygnał czekałby w kolejce
+    zapis.blad.connect(bledy.append, Qt.DirectConnection)
+    pierwsze = zapis.dodaj_wpis(*_wpis("100-1000-100"))
+    zapis.oproznij()
+    zapis.dodaj_wpis(*_wpis("100-1000-101"))
+    zapis.oproznij()
+
+    zapis.aktualizuj_czas_produkcji(pierwsze, 5.0, 10.0)
+    assert zapis.zamknij() is False
+    assert any(f"zlecenia {pierwsze}" in b for b in bledy)
+    assert zapis.metryki()['zapisane'] == 2
+
+
+def test_zablokowana_baza_ponawiana_skonczenie(tmp_path):
+    sciezka = str(tmp_path / "historia.db")
+    zapis = ZapisWTle(sciezka, konserwacja_co_s=None, busy_timeout_ms=10)
+    zapis.MAKS_PONOWIEN = 2
+    bledy = []
+    # Wątek zapisujący nie ma pętli zdarzeń – bez DirectConnection sygnał czekałby w kolejce
+    zapis.blad.connect(bledy.append, Qt.DirectConnection)
+    zapis.dodaj_wpis(*_wpis("100-1000-099"))
+    zapis.oproznij()
+
+    inny = sqlite3.connect(sciezka, isolation_level=None)
+    inny.execute("BEGIN EXCLUSIVE")
+    try:
+        zapis.dodaj_wpis(*_wpis("100-1000-100"))
+        zapis.oproznij()
+    finally:
+        inny.rollback()
+        inny.close()
+
+    assert sum("ponawiam" in b for b in bledy) == 2
+    assert "Nie zapisano 1 operacji" in bledy[-1]
+    assert zapis.zamknij() is False
+
+
+def test_nieudane_otwarcie_bazy_nie_zawiesza_oproznij(tmp_path):
+    zapis = ZapisWTle(str(tmp_path / "brak" / "historia.db"), konserwacja_co_s=None)
+    zapis._watek.join(10)
+    assert not zapis._watek.is_alive()
+    zapis.oproznij()
+    with pytest.raises(RuntimeError):
+        zapis.dodaj_wpis(*_wpis("100-1000-100"))
@@ -1,6 +1,8 @@
 import re
 
+_WZOR_KODU = re.compile(r'^\d{3}-\d{4}-\d{3}$')
+
+
 def waliduj_kod(kod: str) -> bool:
     """Sprawdza czy kod produktu ma format xxx-xxxx-xxx (same cyfry)."""
-    pattern = r'^\d{3}-\d{4}-\d{3}$'
-    return re.match(pattern, kod) is not None
\ No newline at end of file
+    return _WZOR_KODU.match(kod) is not None
\ No newline at end of file
@@ -1,23 +1,74 @@
+import queue
+import sqlite3
+import threading
 from PySide6.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QFormLayout,
                                QLineEdit, QComboBox, QGroupBox, QLabel,
                                QPushButton, QTableWidget, QTableWidgetItem,
                                QHeaderView, QMessageBox, QCheckBox, QSpinBox,
                                QDoubleSpinBox)
-from PySide6.QtCore import Qt
+from PySide6.QtCore import Qt, QObject, QTimer, Signal
 from PySide6.QtWidgets import QInputDialog
+from database import BazaDanych
 from models import ZarzadcaDanych, Produkt
 from utils import waliduj_kod
+from zapis_w_tle import ZapisWTle
+
+
+class PoprzednieWTle(QObject):
+    """
+    Wyszukuje ostatnie obliczenia kodu w osobnym wątku z własnym połączeniem –
+    udział sieciowy ani blokada bazy nie zatrzymują pisania w polu kodu.
+    Z kilku kodów zleconych w trakcie zapytania wyszukiwany jest tylko ostatni.
+    """
+    gotowe = Signal(str, object)       # kod, lista wpisów (pusta także po błędzie bazy)
+
+    def __init__(self, db_path, limit):
+        super().__init__()
+        self.limit = limit
+        self._kolejka = queue.Queue()
+        threading.Thread(target=self._petla, args=(db_path,), name="poprzednie-obliczenia",
+                         daemon=True).start()
+
+    def szukaj(self, kod):
+        self._kolejka.put(kod)
+
+    def _petla(self, db_path):
+        baza = None
+        while True:
+            kod = self._kolejka.get()
+            while not self._kolejka.empty():
+                kod = self._kolejka.get_nowait()
+            try:
+                if baza is None:
+                    baza = BazaDanych(db_path)
+                wpisy = baza.ostatnie_obliczenia(kod, self.limit)
+            except sqlite3.Error:
+                # Podpowiedź nie może przeszkadzać w pisaniu – bez listy, bez komunikatu
+                wpisy = []
+            self.gotowe.emit(kod, wpisy)
 
 
 class CalculationWidget(QWidget):
-    def __init__(self, zarzadca: ZarzadcaDanych):
+    LICZBA_POPRZEDNICH = 5     # tyle ostatnich obliczeń kodu proponuje lista do wypełnienia
+
+    def __init__(self, zarzadca: ZarzadcaDanych, zapis: ZapisWTle):
         super().__init__()
         self.zarzadca = zarzadca
+        self.zapis = zapis
         self.produkt = None
-        self.ostatni_wpis_id = None
+        self.ostatnie_zlecenie = None   # numer zlecenia zapisu ostatniego obliczenia
         self._setup_ui()
         self.refresh_groups()
         self.grupa_combo.currentIndexChanged.connect(self._odswiez_tabele_metrow)
+        # Lista poprzednich chwilę po ostatnim znaku kodu, nie po każdym
+        self._opoznienie_poprzednich = QTimer(self)
+        self._opoznienie_poprzednich.setSingleShot(True)
+        self._opoznienie_poprzednich.setInterval(250)
+        self._opoznienie_poprzednich.timeout.connect(self._pokaz_poprzednie)
+        self._poprzednie = PoprzednieWTle(self.zarzadca.baza.db_path, self.LICZBA_POPRZEDNICH)
+        self._poprzednie.gotowe.connect(self._wypelnij_poprzednie)
+        self.kod_input.textChanged.connect(self._opoznienie_poprzednich.start)
+        self.zapis.zapisano.connect(self._wpis_zapisany)
 
     def _setup_ui(self):
         main_layout = QVBoxLayout(self)
@@ -30,6 +81,17 @@ class CalculationWidget(QWidget):
         self.kod_input.setPlaceholderText("xxx-xxxx-xxx")
         form_layout.addRow("Kod produktu:", self.kod_input)
 
+        # Ostatnie obliczenia wpisanego kodu – wybrane wypełnia formularz
+        poprzednie_layout = QHBoxLayout()
+        self.poprzednie_combo = QComboBox()
+        self.poprzednie_combo.setEnabled(False)
+        poprzednie_layout.addWidget(self.poprzednie_combo, 1)
+        self.wypelnij_btn = QPushButton("Wypełnij")
+        self.wypelnij_btn.setEnabled(False)
+        self.wypelnij_btn.clicked.connect(self._wypelnij_z_poprzedniego)
+        poprzednie_layout.addWidget(self.wypelnij_btn)
+        form_layout.addRow("Poprzednie obliczenia:", poprzednie_layout)
+
         self.grupa_combo = QComboBox()
         form_layout.addRow("Grupa:", self.grupa_combo)
 
@@ -151,21 +213,64 @@ class CalculationWidget(QWidget):
         self.produkt = produkt
         self._wyswietl_wyniki(produkt)
 
-        # --- Zapis do bazy danych ---
+        # --- Zapis do bazy danych (w tle – okno nie czeka na bazę) ---
         metry_dict = produkt.metry_zgrzewania
         czas_total = produkt.oblicz_calkowity_czas()
-        self.ostatni_wpis_id = self.zarzadca.baza.dodaj_wpis(
-            kod=produkt.kod,
-            grupa=produkt.grupa.nazwa,
-            przedzial=produkt.przedzial,
-            metry_dict=metry_dict,
-            czas_total=czas_total,
-            czas_produkcji=None
-        )
+        try:
+            self.ostatnie_zlecenie = self.zapis.dodaj_wpis(
+                kod=produkt.kod,
+                grupa=produkt.grupa.nazwa,
+                przedzial=produkt.przedzial,
+                metry_dict=metry_dict,
+                czas_total=czas_total,
+                czas_produkcji=None,
+                wymuszeni_pracownicy=produkt.wymuszeni_pracownicy,
+                wersja_stawek=produkt.wersja_stawek()
+            )
+        except queue.Full:
+            self.ostatnie_zlecenie = None
+            QMessageBox.warning(self, "Błąd bazy", "Baza historii nie przyjmuje zapisów – "
+                                "obliczenie nie zostało zapisane. Spróbuj ponownie za chwilę.")
         # ---------------------------
 
         self.waliduj_btn.setEnabled(True)
 
+    def _wpis_zapisany(self, zlecenie, wpis_id):
+        if zlecenie == self.ostatnie_zlecenie:
+            # Nowe obliczenie jest już w bazie – na liście poprzednich
+            self._pokaz_poprzednie()
+
+    def _pokaz_poprzednie(self):
+        """Zleca wyszukanie ostatnich obliczeń, gdy w polu kodu jest poprawny kod."""
+        kod = self.kod_input.text().strip()
+        if waliduj_kod(kod):
+            self._poprzednie.szukaj(kod)
+        else:
+            self._wypelnij_poprzednie(kod, [])
+
+    def _wypelnij_poprzednie(self, kod, wpisy):
+        """Wypełnia listę ostatnich obliczeń – o ile kod w polu się w międzyczasie nie zmienił."""
+        if kod != self.kod_input.text().strip():
+            return
+        self.poprzednie_combo.clear()
+        for wpis in wpisy:
+            opis = (f"{wpis['data'][:16].replace('T', ' ')} · {wpis['grupa']} · {wpis['przedzial']} · "
+                    f"{wpis['czas_total']:.2f} min")
+            if wpis['wystapienia'] > 1:
+                opis += f" · ×{wpis['wystapienia']}"
+            if wpis['czas_produkcji'] is not None:
+                opis += f" · produkcja {wpis['czas_produkcji']:.2f} min"
+            self.poprzednie_combo.addItem(opis, wpis)
+        if not wpisy:
+            self.poprzednie_combo.addItem("brak" if waliduj_kod(kod) else "")
+        self.poprzednie_combo.setEnabled(bool(wpisy))
+        self.wypelnij_btn.setEnabled(bool(wpisy))
+
+    def _wypelnij_z_poprzedniego(self):
+        wpis = self.poprzednie_combo.currentData()
+        if wpis:
+            self.wypelnij_z_historii(wpis)
+
     def _wyswietl_wyniki(self, produkt: Produkt):
         """Wyświetla szczegółowe wyniki w etykiecie."""
         czas_calkowity = produkt.oblicz_calkowity_czas()
@@ -194,8 +299,12 @@ class CalculationWidget(QWidget):
         if ok:
             self.produkt.czas_produkcji = czas
             odchylenie = self.produkt.oblicz_odchylenie()
-            if odchylenie is not None and self.ostatni_wpis_id:
-                self.zarzadca.baza.aktualizuj_czas_produkcji(self.ostatni_wpis_id, czas, odchylenie)
+            if odchylenie is not None and self.ostatnie_zlecenie:
+                try:
+                    self.zapis.aktualizuj_czas_produkcji(self.ostatnie_zlecenie, czas, odchylenie)
+                except queue.Full:
+                    QMessageBox.warning(self, "Błąd bazy", "Baza historii nie przyjmuje zapisów – "
+                                        "walidacja nie została zapisana.")
             if odchylenie is not None:
                 msg = f"Czas obliczony: {self.produkt.oblicz_calkowity_czas():.2f} min\n"
                 msg += f"Czas z produkcji: {czas:.2f} min\n"
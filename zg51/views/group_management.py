@@ -17,6 +17,8 @@ class GroupManagementWidget(QWidget):
         self.aktualna_grupa = None
         self._setup_ui()
         self._odswiez_liste_grup()
+        # Każda udana zmiana kończy się zapisem – po nim zgłaszamy konflikty scalania
+        self.data_changed.connect(self._pokaz_konflikty)
 
     def _setup_ui(self):
         layout = QHBoxLayout(self)
@@ -112,6 +114,12 @@ class GroupManagementWidget(QWidget):
                     btn_edit.clicked.connect(lambda checked, idx=i: self._edytuj_metode(idx))
                     self.tabela_metod.setCellWidget(row, 5, btn_edit)
 
+    def _pokaz_konflikty(self):
+        if self.zarzadca.konflikty:
+            QMessageBox.warning(self, "Konflikt zapisu",
+                                "Te same ustawienia zmieniono jednocześnie w innym oknie programu. "
+                                "Zachowano Twoje wartości dla:\n" + "\n".join(self.zarzadca.konflikty))
+
     # --- Akcje na grupach ---
     def _dodaj_grupe(self):
         dialog = AddGroupDialog(self.zarzadca, self)
@@ -1,32 +1,405 @@
-from PySide6.QtWidgets import (QWidget, QVBoxLayout, QPushButton, QTableWidget,
-                               QTableWidgetItem, QHeaderView, QFileDialog, QMessageBox,
-                               QHBoxLayout)
-from PySide6.QtCore import Signal
+import sqlite3
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+
+from PySide6.QtWidgets import (QWidget, QVBoxLayout, QPushButton, QTableView,
+                               QHeaderView, QFileDialog, QMessageBox,
+                               QHBoxLayout, QLineEdit, QComboBox, QDateEdit, QLabel)
+from PySide6.QtCore import (Qt, Signal, QAbstractTableModel, QModelIndex, QDate, QTimer,
+                            QRegularExpression)
+from PySide6.QtGui import QRegularExpressionValidator
+
+
+def _bloki(numery):
+    """Rosnące numery jako ciągłe przedziały [od, do)."""
+    bloki = []
+    for numer in numery:
+        if bloki and bloki[-1][1] == numer:
+            bloki[-1][1] = numer + 1
+        else:
+            bloki.append([numer, numer + 1])
+    return bloki
+
+
+class ModelHistorii(QAbstractTableModel):
+    """Historia obliczeń stronami z bazy, od najnowszych.
+
+    Model zaczyna od pierwszej strony; kolejne widok doczytuje przy
+    przewijaniu (canFetchMore/fetchMore) przez pobierz_strone z kursorem, więc
+    otwarcie nie zależy od rozmiaru historii. W pamięci jest najwyżej
+    MAKS_STRON ostatnio używanych stron – starsze model pamięta tylko jako
+    listę ID i przy ponownym wyświetleniu czyta z bazy te same wpisy, więc
+    zmiany w bazie nie przesuwają strony przed uzgodnieniem. Teksty komórek
+    powstają dopiero w data().
+
+    odswiez_zmiany() uzgadnia listę z bazą bez wczytywania jej od nowa:
+    wpisy nowe, zmienione i usunięte od poprzedniego odświeżenia
+    (BazaDanych.zmiany_historii) są wstawiane, poprawiane w miejscu
+    i usuwane pojedynczymi wierszami, więc przewinięcie i zaznaczenie
+    zostają. Strona to przedział kursorów – od ostatniego wpisu poprzedniej
+    strony do jej własnego ostatniego wpisu – więc zmiany dotyczą tylko stron,
+    w które trafiają; z nich z bazy czytane są ponownie tylko te spoza pamięci.
+
+    Sortowanie (sort – kliknięcie nagłówka) i filtry (ustaw_filtry) liczy
+    baza: każda zmiana zaczyna listę od nowa od pierwszej strony.
+    """
+    KOLUMNY = ["ID", "Kod", "Data", "Grupa", "Przedział", "Czas total [min]", "Czas produkcji [min]",
+               "Odchylenie [%]", "Powtórzenia"]
+    # Pole sortowania pobierz_strone dla kolumny
+    POLA = ["id", "kod", "data", "grupa", "przedzial", "czas_total", "czas_produkcji", "odchylenie",
+            "wystapienia"]
+    ROZMIAR_STRONY = 200
+    MAKS_STRON = 50
+    MAKS_ZMIAN = 1000    # więcej zmian naraz (np. import) – lista wczytywana od nowa
+    blad = Signal(str)
+
+    def __init__(self, baza, parent=None):
+        super().__init__(parent)
+        self.baza = baza
+        self._strony = OrderedDict()   # numer strony -> wpisy (LRU)
+        self._kursory = []             # numer strony -> kursor `po` jej początku
+        self._liczby = []              # numer strony -> liczba wpisów
+        self._idy = []                 # numer strony -> ID wpisów (także stron spoza pamięci)
+        self._poczatki = []            # numer strony -> wiersz jej pierwszego wpisu
+        self._uzgadniane = {}          # numer strony -> wpisy, w trakcie odswiez_zmiany
+        self._nastepna = None          # kursor kolejnej strony
+        self._koniec = False
+        self._wiersze = 0
+        self._sortuj, self._rosnaco = "data", False
+        self._filtry = {}
+        self._stan = None              # BazaDanych.stan_zmian z ostatniego odświeżenia
+        self._wersja = None            # i wersja danych (BazaDanych.wersja_danych)
+
+    def sort(self, column, order=Qt.AscendingOrder):
+        self._sortuj, self._rosnaco = self.POLA[column], order == Qt.AscendingOrder
+        self.odswiez()
+
+    def ustaw_filtry(self, **filtry):
+        """Filtry pobierz_strone (kod_prefix, grupa, przedzial, od, do, status); None – bez filtra."""
+        self._filtry = {nazwa: wartosc for nazwa, wartosc in filtry.items() if wartosc is not None}
+        self.odswiez()
+
+    def _strona(self, po, limit):
+        return self.baza.pobierz_strone(po=po, limit=limit, sortuj=self._sortuj, rosnaco=self._rosnaco,
+                                        **self._filtry)
+
+    def odswiez(self):
+        """Zaczyna listę od nowa od pierwszej strony."""
+        self.beginResetModel()
+        self._strony.clear()
+        self._kursory, self._liczby, self._idy, self._poczatki = [], [], [], []
+        self._nastepna, self._koniec, self._wiersze = None, False, 0
+        self._stan = None
+        self.endResetModel()
+        try:
+            # Stan sprzed odczytu – zmiany w trakcie uzgodni następne odswiez_zmiany
+            self._wersja = self.baza.wersja_danych()
+            self._stan = self.baza.stan_zmian()
+        except sqlite3.Error as e:
+            self._koniec = True
+            self.blad.emit(f"Nie można pobrać danych: {e}")
+            return
+        self.fetchMore()
+
+    def odswiez_zmiany(self):
+        """
+        Wprowadza do listy zmiany w bazie od poprzedniego odświeżenia (patrz
+        opis klasy). Gdy danych nikt nie zmienił, kosztuje jedno zapytanie
+        PRAGMA; gdy zmian jest zbyt wiele, lista wczytywana jest od nowa.
+        """
+        if self._stan is None:
+            self.odswiez()
+            return
+        try:
+            wersja = self.baza.wersja_danych()
+            if wersja == self._wersja:
+                return
+            stan, ids = self.baza.zmiany_historii(self._stan, self.MAKS_ZMIAN)
+            if ids is None or ids and not self._kursory:
+                self.odswiez()
+                return
+            if ids:
+                self._uzgodnij(ids)
+        except sqlite3.Error as e:
+            # Stan bez zmian – następne odświeżenie uzgodni te same zmiany jeszcze raz
+            self.blad.emit(f"Nie można pobrać danych: {e}")
+            return
+        self._stan, self._wersja = stan, wersja
+
+    def _uzgodnij(self, ids):
+        """Uzgadnia strony, w których są lub powinny być wpisy o ID `ids`."""
+        wpisy = self.baza.pobierz_wpisy(ids, **self._filtry)
+        klucz = self.baza.porzadek_historii(self._sortuj, self._rosnaco, **{
+            nazwa: self._filtry.get(nazwa) for nazwa in ("status", "grupa", "przedzial")})
+        # Koniec strony to kursor jej ostatniego wpisu (początek następnej);
+        # ostatnia strona wczytanej do końca historii nie ma końca
+        konce = [klucz(po) for po in self._kursory[1:]]
+        if not self._koniec:
+            konce.append(klucz(self._nastepna))
+        zmienione = set(ids)
+        strony = {numer: [] for numer, idy in enumerate(self._idy) if not zmienione.isdisjoint(idy)}
+        for wpis in wpisy.values():
+            numer = bisect_left(konce, klucz(self.baza.kursor(wpis, self._sortuj)))
+            # Wpis za wczytaną częścią listy doczyta fetchMore
+            if numer < len(self._kursory):
+                strony.setdefault(numer, []).append(wpis)
+        nowe = {}
+        for numer in sorted(strony):
+            dawne = self._strony.get(numer)
+            if dawne is None:
+                nowe[numer] = self._czytaj_strone(numer, klucz, konce[numer] if numer < len(konce) else None)
+            else:
+                # Strona w pamięci: pozostałe wpisy są aktualne, zmienione ma pobierz_wpisy
+                # (None – wpis usunięty przed ponownym odczytem strony, więc też w `ids`)
+                nowe[numer] = sorted([wpis for wpis in dawne if wpis is not None and wpis['id'] not in zmienione]
+                                     + strony[numer],
+                                     key=lambda wpis: klucz(self.baza.kursor(wpis, self._sortuj)))
+        # Uzgadniane strony poza LRU: data() wywoływane między sygnałami czyta
+        # inne strony z bazy, ale nie wyprze tych w trakcie zmiany
+        self._uzgadniane = {numer: self._strony.pop(numer, None) or [None] * self._liczby[numer]
+                            for numer in nowe}
+        try:
+            for numer, wpisy in nowe.items():
+                self._uzgodnij_strone(numer, wpisy, zmienione)
+        finally:
+            uzgodnione, self._uzgadniane = self._uzgadniane, {}
+            for numer, wpisy in uzgodnione.items():
+                self._zapamietaj(numer, wpisy)
+
+    def _czytaj_strone(self, numer, klucz, koniec):
+        """Wpisy strony `numer` z bazy – wszystkie w jej przedziale kursorów (koniec – klucz, None – bez końca)."""
+        def polozenie(wpis):
+            return klucz(self.baza.kursor(wpis, self._sortuj))
+
+        # Pierwsza strona obejmuje też wpisy przed jej dawnym początkiem (nowe)
+        po = self._kursory[numer] if numer else None
+        wpisy = []
+        while True:
+            porcja = self._strona(po, self.ROZMIAR_STRONY)
+            wpisy += porcja
+            if len(porcja) < self.ROZMIAR_STRONY or koniec is not None and polozenie(porcja[-1]) >= koniec:
+                break
+            po = self.baza.kursor(porcja[-1], self._sortuj)
+        if koniec is not None:
+            wpisy = [wpis for wpis in wpisy if polozenie(wpis) <= koniec]
+        return wpisy
+
+    def _uzgodnij_strone(self, numer, wpisy, zmienione):
+        """Zastępuje wiersze strony `numer` wpisami `wpisy` – sygnałami usunięcia, wstawienia i zmiany."""
+        stare, nowe = list(self._idy[numer]), [wpis['id'] for wpis in wpisy]
+        zachowane = set(stare).intersection(nowe)
+        # Zmieniony wpis zostaje w swoim wierszu, o ile nie zmienił miejsca względem pozostałych
+        if [i for i in stare if i in zachowane] != [i for i in nowe if i in zachowane]:
+            zachowane -= zmienione
+        po_id = {wpis['id']: wpis for wpis in wpisy}
+        obecne = self._uzgadniane[numer]
+        obecne[:] = [po_id.get(i, wpis) for i, wpis in zip(stare, obecne)]
+        pierwszy = self._poczatki[numer]
+        for od, do in reversed(_bloki(j for j, i in enumerate(stare) if i not in zachowane)):
+            self.beginRemoveRows(QModelIndex(), pierwszy + od, pierwszy + do - 1)
+            del obecne[od:do], stare[od:do]
+            self._zmien_rozmiar(numer, stare)
+            self.endRemoveRows()
+        for od, do in _bloki(j for j, i in enumerate(nowe) if i not in zachowane):
+            self.beginInsertRows(QModelIndex(), pierwszy + od, pierwszy + do - 1)
+            obecne[od:od], stare[od:od] = wpisy[od:do], nowe[od:do]
+            self._zmien_rozmiar(numer, stare)
+            self.endInsertRows()
+        for j, i in enumerate(nowe):
+            if i in zmienione and i in zachowane:
+                self.dataChanged.emit(self.index(pierwszy + j, 0), self.index(pierwszy + j, len(self.KOLUMNY) - 1))
+        if numer == 0 and wpisy:
+            self._kursory[0] = self._poczatek_listy(wpisy)
+
+    def _zmien_rozmiar(self, numer, idy):
+        """Nowe ID wpisów strony `numer`; przesuwa początki dalszych stron."""
+        roznica = len(idy) - self._liczby[numer]
+        self._liczby[numer] = len(idy)
+        self._idy[numer] = array("q", idy)
+        self._wiersze += roznica
+        for dalsza in range(numer + 1, len(self._poczatki)):
+            self._poczatki[dalsza] += roznica
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else self._wiersze
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.KOLUMNY)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return self.KOLUMNY[section]
+        return None
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and not self._koniec
+
+    def fetchMore(self, parent=QModelIndex()):
+        if parent.isValid() or self._koniec:
+            return
+        try:
+            wpisy = self._strona(self._nastepna, self.ROZMIAR_STRONY)
+        except sqlite3.Error as e:
+            self._koniec = True
+            self.blad.emit(f"Nie można pobrać danych: {e}")
+            return
+        self._koniec = len(wpisy) < self.ROZMIAR_STRONY
+        if not wpisy:
+            return
+        kursor = self._nastepna
+        if kursor is None:
+            kursor = self._poczatek_listy(wpisy)
+        self.beginInsertRows(QModelIndex(), self._wiersze, self._wiersze + len(wpisy) - 1)
+        self._kursory.append(kursor)
+        self._liczby.append(len(wpisy))
+        self._idy.append(array("q", (wpis['id'] for wpis in wpisy)))
+        self._poczatki.append(self._wiersze)
+        self._zapamietaj(len(self._kursory) - 1, wpisy)
+        self._nastepna = self.baza.kursor(wpisy[-1], self._sortuj)
+        self._wiersze += len(wpisy)
+        self.endInsertRows()
+
+    def _poczatek_listy(self, wpisy):
+        """
+        Kursor początku pierwszej strony: przy liście od najnowszych – tuż przed
+        jej pierwszym wpisem, żeby strona czytana ponownie nie objęła wpisów
+        nowszych (te wstawia dopiero odswiez_zmiany); przy innym sortowaniu None.
+        """
+        if self._sortuj == "data" and not self._rosnaco:
+            return (wpisy[0]['znacznik'], wpisy[0]['id'] + 1)
+        return None
+
+    def _zapamietaj(self, numer, wpisy):
+        self._strony[numer] = wpisy
+        while len(self._strony) > self.MAKS_STRON:
+            self._strony.popitem(last=False)
+
+    def wpis(self, wiersz):
+        """Wpis (słownik jak z pobierz_strone) w wierszu `wiersz`; None, gdy go już nie ma."""
+        if not 0 <= wiersz < self._wiersze:
+            return None
+        # Ostatnia strona zaczynająca się nie dalej niż wiersz (puste strony pomija)
+        numer = bisect_right(self._poczatki, wiersz) - 1
+        i = wiersz - self._poczatki[numer]
+        wpisy = self._uzgadniane.get(numer, self._strony.get(numer))
+        if wpisy is None:
+            try:
+                wczytane = self.baza.pobierz_wpisy(self._idy[numer], **self._filtry)
+            except sqlite3.Error:
+                return None
+            # Strona w układzie _idy; wpisu usuniętego od ostatniego uzgodnienia
+            # nie ma (None) – wiersz usunie odswiez_zmiany
+            wpisy = [wczytane.get(wpis_id) for wpis_id in self._idy[numer]]
+            self._zapamietaj(numer, wpisy)
+        elif numer in self._strony:
+            self._strony.move_to_end(numer)
+        return wpisy[i]
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or role not in (Qt.DisplayRole, Qt.ToolTipRole):
+            return None
+        wpis = self.wpis(index.row())
+        if wpis is None:
+            return None
+        kolumna = index.column()
+        if role == Qt.ToolTipRole:
+            # Powtórzone obliczenie: od kiedy (Data – ostatni raz)
+            if kolumna == 8 and wpis['wystapienia'] > 1:
+                return f"Pierwszy raz: {wpis['pierwsza_data']}"
+            return None
+        if kolumna == 0:
+            return str(wpis['id'])
+        if kolumna in (1, 2, 3, 4):
+            return wpis[('kod', 'data', 'grupa', 'przedzial')[kolumna - 1]]
+        if kolumna == 8:
+            return str(wpis['wystapienia']) if wpis['wystapienia'] > 1 else ""
+        wartosc = wpis[('czas_total', 'czas_produkcji', 'odchylenie')[kolumna - 5]]
+        return f"{wartosc:.2f}" if wartosc is not None else ""
 
 
 class HistoriaWidget(QWidget):
-    """Widget wyświetlający historię obliczeń z możliwością eksportu do Excela i usuwania."""
+    """
+    Widget wyświetlający historię obliczeń z możliwością eksportu do Excela i usuwania.
+    Widoczna tabela co AUTO_ODSWIEZANIE_MS uzgadniana jest z bazą
+    (ModelHistorii.odswiez_zmiany) – pokazuje też zapisy z innych stanowisk.
+    """
     rekordWybrany = Signal(dict)
+    STATUSY = [("Wszystkie", None), ("Niezwalidowane", "niezwalidowane"), ("Zwalidowane", "zwalidowane"),
+               ("W normie (≤ 10%)", "w_normie"), ("Dopuszczalne (≤ 20%)", "dopuszczalne"),
+               ("Poza normą (> 20%)", "poza_norma")]
+    DATA_DOWOLNA = QDate(2000, 1, 1)   # najmniejsza data pól Od/Do – bez filtra
+    AUTO_ODSWIEZANIE_MS = 2000
 
     def __init__(self, zarzadca):
         super().__init__()
         self.zarzadca = zarzadca
-        self.dane = []
+        self.model = ModelHistorii(self.zarzadca.baza, self)
+        self.model.blad.connect(lambda komunikat: QMessageBox.critical(self, "Błąd bazy", komunikat))
+        # Filtry stosowane chwilę po ostatniej zmianie, nie po każdym znaku kodu
+        self._opoznienie_filtrow = QTimer(self)
+        self._opoznienie_filtrow.setSingleShot(True)
+        self._opoznienie_filtrow.setInterval(250)
+        self._opoznienie_filtrow.timeout.connect(self._zastosuj_filtry)
+        self._auto_odswiezanie = QTimer(self)
+        self._auto_odswiezanie.setInterval(self.AUTO_ODSWIEZANIE_MS)
+        self._auto_odswiezanie.timeout.connect(self._odswiez_widoczna)
         self._setup_ui()
         self.odswiez()
+        self._auto_odswiezanie.start()
 
     def _setup_ui(self):
         layout = QVBoxLayout(self)
 
-        self.table = QTableWidget()
-        self.table.setColumnCount(8)
-        self.table.setHorizontalHeaderLabels(
-            ["ID", "Kod", "Data", "Grupa", "Przedział", "Czas total [min]", "Czas produkcji [min]", "Odchylenie [%]"]
-        )
+        # --- Pasek filtrów ---
+        filtry_layout = QHBoxLayout()
+        self.kod_filtr = QLineEdit()
+        self.kod_filtr.setPlaceholderText("xxx-xxxx-xxx")
+        self.kod_filtr.setValidator(QRegularExpressionValidator(
+            QRegularExpression(r"\d{0,3}|\d{3}-\d{0,4}|\d{3}-\d{4}-\d{0,3}"), self))
+        self.kod_filtr.textChanged.connect(self._opoznienie_filtrow.start)
+        filtry_layout.addWidget(QLabel("Kod:"))
+        filtry_layout.addWidget(self.kod_filtr)
+
+        self.grupa_filtr = QComboBox()
+        self.przedzial_filtr = QComboBox()
+        self.status_filtr = QComboBox()
+        for etykieta, status in self.STATUSY:
+            self.status_filtr.addItem(etykieta, status)
+        for opis, combo in (("Grupa:", self.grupa_filtr), ("Przedział:", self.przedzial_filtr),
+                            ("Status:", self.status_filtr)):
+            combo.currentIndexChanged.connect(self._opoznienie_filtrow.start)
+            filtry_layout.addWidget(QLabel(opis))
+            filtry_layout.addWidget(combo)
+
+        self.od_filtr = QDateEdit()
+        self.do_filtr = QDateEdit()
+        for opis, pole in (("Od:", self.od_filtr), ("Do:", self.do_filtr)):
+            pole.setCalendarPopup(True)
+            pole.setDisplayFormat("yyyy-MM-dd")
+            pole.setMinimumDate(self.DATA_DOWOLNA)
+            pole.setSpecialValueText("dowolna")
+            pole.setDate(self.DATA_DOWOLNA)
+            pole.dateChanged.connect(self._opoznienie_filtrow.start)
+            filtry_layout.addWidget(QLabel(opis))
+            filtry_layout.addWidget(pole)
+
+        btn_wyczysc = QPushButton("Wyczyść filtry")
+        btn_wyczysc.clicked.connect(self.wyczysc_filtry)
+        filtry_layout.addWidget(btn_wyczysc)
+        filtry_layout.addStretch()
+        layout.addLayout(filtry_layout)
+
+        self.table = QTableView()
+        self.table.setModel(self.model)
         self.table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
-        self.table.setSelectionBehavior(QTableWidget.SelectRows)
-        self.table.setSelectionMode(QTableWidget.SingleSelection)
-        self.table.itemDoubleClicked.connect(self._on_item_double_clicked)
+        self.table.verticalHeader().setVisible(False)
+        self.table.setSelectionBehavior(QTableView.SelectRows)
+        self.table.setSelectionMode(QTableView.SingleSelection)
+        # Sortowanie w bazie (ModelHistorii.sort); na start – od najnowszych
+        self.table.horizontalHeader().setSortIndicator(ModelHistorii.POLA.index("data"), Qt.DescendingOrder)
+        self.table.setSortingEnabled(True)
+        self.table.doubleClicked.connect(self._on_double_clicked)
         layout.addWidget(self.table)
 
         btn_layout = QHBoxLayout()
@@ -45,43 +418,81 @@ class HistoriaWidget(QWidget):
         btn_layout.addStretch()
         layout.addLayout(btn_layout)
 
+    def showEvent(self, event):
+        super().showEvent(event)
+        self.model.odswiez_zmiany()
+
+    def _odswiez_widoczna(self):
+        # Ukryta zakładka nie czyta bazy – zaległe zmiany uzgodni showEvent
+        if self.isVisible():
+            self.model.odswiez_zmiany()
+
     def odswiez(self):
-        """Odświeża tabelę danymi z bazy."""
+        """
+        Odświeża listy grup i przedziałów filtrów i przyrostowo tabelę; od
+        pierwszej strony tylko wtedy, gdy wybrana grupa lub przedział zniknęły.
+        """
+        zmiana_filtrow = False
         try:
-            self.dane = self.zarzadca.baza.pobierz_wszystkie()
-        except Exception as e:
+            for combo, slownik in ((self.grupa_filtr, "grupy"), (self.przedzial_filtr, "przedzialy")):
+                wybrana = combo.currentData()
+                combo.blockSignals(True)
+                combo.clear()
+                combo.addItem("Wszystkie", None)
+                for nazwa in self.zarzadca.baza.nazwy_slownika(slownik):
+                    combo.addItem(nazwa, nazwa)
+                combo.setCurrentIndex(max(combo.findData(wybrana), 0))
+                combo.blockSignals(False)
+                zmiana_filtrow |= combo.currentData() != wybrana
+        except sqlite3.Error as e:
             QMessageBox.critical(self, "Błąd bazy", f"Nie można pobrać danych: {e}")
-            self.dane = []
-
-        self.table.setRowCount(len(self.dane))
-        for i, row in enumerate(self.dane):
-            self.table.setItem(i, 0, QTableWidgetItem(str(row['id'])))
-            self.table.setItem(i, 1, QTableWidgetItem(row['kod']))
-            self.table.setItem(i, 2, QTableWidgetItem(row['data']))
-            self.table.setItem(i, 3, QTableWidgetItem(row['grupa']))
-            self.table.setItem(i, 4, QTableWidgetItem(row['przedzial']))
-            self.table.setItem(i, 5, QTableWidgetItem(f"{row['czas_total']:.2f}"))
-            czas_prod = row['czas_produkcji']
-            self.table.setItem(i, 6, QTableWidgetItem(f"{czas_prod:.2f}" if czas_prod is not None else ""))
-            odch = row['odchylenie']
-            self.table.setItem(i, 7, QTableWidgetItem(f"{odch:.2f}" if odch is not None else ""))
-
-    def _on_item_double_clicked(self, item):
-        row = item.row()
-        if 0 <= row < len(self.dane):
-            self.rekordWybrany.emit(self.dane[row])
+        if zmiana_filtrow or self._opoznienie_filtrow.isActive():
+            self._zastosuj_filtry()
+        else:
+            self.model.odswiez_zmiany()
+
+    def _zastosuj_filtry(self):
+        self._opoznienie_filtrow.stop()
+        od, do = self.od_filtr.date(), self.do_filtr.date()
+        self.model.ustaw_filtry(
+            kod_prefix=self.kod_filtr.text() or None,
+            grupa=self.grupa_filtr.currentData(),
+            przedzial=self.przedzial_filtr.currentData(),
+            od=od.toPython() if od != self.DATA_DOWOLNA else None,
+            # Do – włącznie z tym dniem
+            do=do.addDays(1).toPython() if do != self.DATA_DOWOLNA else None,
+            status=self.status_filtr.currentData())
+
+    def wyczysc_filtry(self):
+        for pole in (self.kod_filtr, self.grupa_filtr, self.przedzial_filtr, self.status_filtr,
+                     self.od_filtr, self.do_filtr):
+            pole.blockSignals(True)
+        self.kod_filtr.clear()
+        for combo in (self.grupa_filtr, self.przedzial_filtr, self.status_filtr):
+            combo.setCurrentIndex(0)
+        self.od_filtr.setDate(self.DATA_DOWOLNA)
+        self.do_filtr.setDate(self.DATA_DOWOLNA)
+        for pole in (self.kod_filtr, self.grupa_filtr, self.przedzial_filtr, self.status_filtr,
+                     self.od_filtr, self.do_filtr):
+            pole.blockSignals(False)
+        self._zastosuj_filtry()
+
+    def _on_double_clicked(self, index):
+        wpis = self.model.wpis(index.row())
+        if wpis is not None:
+            self.rekordWybrany.emit(wpis)
 
     def usun_rekord(self):
         """Usuwa zaznaczony wiersz z bazy danych."""
-        current_row = self.table.currentRow()
+        current_row = self.table.currentIndex().row()
         if current_row < 0:
             QMessageBox.warning(self, "Uwaga", "Zaznacz wiersz do usunięcia.")
             return
 
-        item_id = self.table.item(current_row, 0)
-        if not item_id:
+        wpis = self.model.wpis(current_row)
+        if not wpis:
             return
-        rekord_id = int(item_id.text())
+        rekord_id = wpis['id']
 
         odp = QMessageBox.question(self, "Potwierdzenie",
                                    f"Czy na pewno usunąć rekord o ID {rekord_id}?",
@@ -92,7 +503,7 @@ class HistoriaWidget(QWidget):
         try:
             if self.zarzadca.baza.usun_wpis(rekord_id):
                 QMessageBox.information(self, "Sukces", f"Rekord {rekord_id} został usunięty.")
-                self.odswiez()
+                self.model.odswiez_zmiany()
             else:
                 QMessageBox.warning(self, "Błąd", "Nie udało się usunąć rekordu.")
         except Exception as e:
@@ -108,4 +519,4 @@ class HistoriaWidget(QWidget):
                 else:
                     QMessageBox.warning(self, "Błąd", "Brak danych do eksportu.")
             except Exception as e:
-                QMessageBox.critical(self, "Błąd eksportu", f"Nie można zapisać pliku: {e}")
\ No newline at end of file
+                QMessageBox.critical(self, "Błąd eksportu", f"Nie można zapisać pliku: {e}")
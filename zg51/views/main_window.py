@@ -1,15 +1,27 @@
-from PySide6.QtWidgets import QMainWindow, QTabWidget, QMessageBox
+import sqlite3
+import threading
+
+from PySide6.QtCore import Signal
+from PySide6.QtWidgets import QMainWindow, QTabWidget, QMessageBox, QFileDialog
 from PySide6.QtGui import QAction
+from kopia import katalog_domyslny, utworz_kopie
 from models import ZarzadcaDanych
 from views.group_management import GroupManagementWidget
 from views.calculation import CalculationWidget
 from views.history import HistoriaWidget
+from zapis_w_tle import ZapisWTle
 
 
 class MainWindow(QMainWindow):
-    def __init__(self, zarzadca: ZarzadcaDanych):
+    # Sygnały wątku kopii zapasowej (obsługiwane w wątku okna)
+    kopia_postep = Signal(int, int)
+    kopia_gotowa = Signal(dict)
+    kopia_blad = Signal(str)
+
+    def __init__(self, zarzadca: ZarzadcaDanych, zapis: ZapisWTle):
         super().__init__()
         self.zarzadca = zarzadca
+        self.zapis = zapis
         self.setWindowTitle("Program do obliczania czasów zgrzewania")
         self.resize(900, 700)
 
@@ -19,7 +31,7 @@ class MainWindow(QMainWindow):
         self.setCentralWidget(self.tabs)
 
         self.group_widget = GroupManagementWidget(self.zarzadca)
-        self.calc_widget = CalculationWidget(self.zarzadca)
+        self.calc_widget = CalculationWidget(self.zarzadca, self.zapis)
         self.history_widget = HistoriaWidget(self.zarzadca)
 
         self.tabs.addTab(self.group_widget, "Zarządzanie grupami")
@@ -29,6 +41,12 @@ class MainWindow(QMainWindow):
         self._create_menu()
         self.group_widget.data_changed.connect(self.on_data_changed)
         self.history_widget.rekordWybrany.connect(self.on_rekord_wybrany)
+        self.zapis.kolejka_zmieniona.connect(self.on_kolejka_zapisu)
+        self.zapis.blad.connect(self.on_blad_zapisu)
+        self.zapis.konserwacja.connect(self.on_konserwacja)
+        self.kopia_postep.connect(self.on_kopia_postep)
+        self.kopia_gotowa.connect(self.on_kopia_gotowa)
+        self.kopia_blad.connect(self.on_kopia_blad)
 
     def _apply_styles(self):
         self.setStyleSheet("""
@@ -69,7 +87,7 @@ class MainWindow(QMainWindow):
             QLineEdit:focus, QComboBox:focus, QSpinBox:focus, QDoubleSpinBox:focus {
                 border: 2px solid #2a5c8a;
             }
-            QTableWidget {
+            QTableView {
                 border: 1px solid #c0c0c0;
                 border-radius: 5px;
                 background-color: #ffffff;
@@ -112,6 +130,13 @@ class MainWindow(QMainWindow):
         save_action.triggered.connect(self.zarzadca.zapisz)
         file_menu.addAction(save_action)
 
+        self.backup_action = QAction("Kopia zapasowa historii...", self)
+        self.backup_action.triggered.connect(self.utworz_kopie)
+        file_menu.addAction(self.backup_action)
+        self.compress_action = QAction("Kompresuj kopie zapasowe", self, checkable=True)
+        file_menu.addAction(self.compress_action)
+        file_menu.addSeparator()
+
         exit_action = QAction("Zakończ", self)
         exit_action.triggered.connect(self.close)
         file_menu.addAction(exit_action)
@@ -128,6 +153,51 @@ class MainWindow(QMainWindow):
         self.tabs.setCurrentIndex(1)
         self.calc_widget.wypelnij_z_historii(dane)
 
+    def on_kolejka_zapisu(self, glebokosc):
+        if glebokosc:
+            self.statusBar().showMessage(f"Zapis do bazy historii: {glebokosc} w kolejce")
+        else:
+            self.statusBar().clearMessage()
+
+    def on_blad_zapisu(self, komunikat):
+        self.statusBar().showMessage(komunikat)
+
+    def on_konserwacja(self, raport):
+        if raport['osierocone'] or raport['bajty_zwolnione']:
+            self.statusBar().showMessage(
+                f"Konserwacja bazy historii: usunięto {raport['osierocone']} osieroconych metraży, "
+                f"zwolniono {raport['bajty_zwolnione'] / 2**20:.1f} MB", 10000)
+
+    def utworz_kopie(self):
+        """Kopia bazy historii w osobnym wątku – okno działa w trakcie kopiowania."""
+        db_path = self.zarzadca.baza.db_path
+        katalog = QFileDialog.getExistingDirectory(self, "Katalog kopii zapasowych", katalog_domyslny(db_path))
+        if not katalog:
+            return
+        self.backup_action.setEnabled(False)
+        threading.Thread(target=self._kopiuj, args=(db_path, katalog, self.compress_action.isChecked()),
+                         name="kopia-historii", daemon=True).start()
+
+    def _kopiuj(self, db_path, katalog, kompresja):
+        try:
+            self.kopia_gotowa.emit(utworz_kopie(db_path, katalog, kompresja=kompresja,
+                                                postep=self.kopia_postep.emit))
+        except (OSError, sqlite3.Error) as e:
+            self.kopia_blad.emit(str(e))
+
+    def on_kopia_postep(self, skopiowane, wszystkie):
+        self.statusBar().showMessage(f"Kopia zapasowa historii: {100 * skopiowane // max(wszystkie, 1)}%")
+
+    def on_kopia_gotowa(self, raport):
+        self.backup_action.setEnabled(True)
+        self.statusBar().showMessage(
+            f"Kopia zapasowa historii zapisana: {raport['plik']} ({raport['rozmiar'] / 2**20:.1f} MB)", 10000)
+
+    def on_kopia_blad(self, komunikat):
+        self.backup_action.setEnabled(True)
+        self.statusBar().clearMessage()
+        QMessageBox.critical(self, "Błąd kopii zapasowej", f"Nie udało się utworzyć kopii: {komunikat}")
+
     def show_about(self):
         QMessageBox.about(self, "O programie",
                           "Program do obliczania czasów zgrzewania\n"
@@ -0,0 +1,257 @@
+"""Zapis historii obliczeń w osobnym wątku.
+
+Okno nie czeka na bazę (udział sieciowy, blokada innego procesu): operacje
+trafiają do ograniczonej kolejki, a wątek zapisujący łączy je w transakcje –
+kolejne wpisy jednym dodaj_wpisy – i sygnałem Qt zwraca nadane ID.
+Blokada bazy przez inny proces ponawiana jest z rosnącym odstępem, najwyżej
+MAKS_PONOWIEN razy; inne błędy zgłaszane są od razu sygnałem `blad`.
+zamknij() zapisuje wszystko, co zostało w kolejce. Gdy kolejka jest pusta
+dłużej niż `bezczynnosc_s`, wątek raz na `konserwacja_co_s` konserwuje bazę
+(konserwacja.py) – przerywając, gdy tylko pojawi się nowa operacja.
+"""
+import itertools
+import queue
+import sqlite3
+import threading
+import time
+
+from PySide6.QtCore import QObject, Signal
+
+from database import BazaDanych
+from konserwacja import konserwuj
+
+_KONIEC = None
+
+
+def _baza_zajeta(e):
+    """Czy błąd SQLite to chwilowa blokada (SQLITE_BUSY / SQLITE_LOCKED), którą warto ponowić."""
+    komunikat = str(e).lower()
+    return "locked" in komunikat or "busy" in komunikat
+
+
+class ZapisWTle(QObject):
+    """Wątek zapisujący historię z kolejką operacji i metrykami jej długości."""
+    zapisano = Signal(int, int)        # numer zlecenia, ID wpisu w bazie
+    blad = Signal(str)
+    kolejka_zmieniona = Signal(int)    # liczba operacji czekających na zapis
+    konserwacja = Signal(dict)         # raport konserwuj()
+
+    MAKS_ZLECEN = 10000                # tyle ostatnich zleceń pamięta mapę numer -> ID
+    MAKS_PONOWIEN = 10                 # prób przy zablokowanej bazie (łącznie ok. 30 s)
+
+    def __init__(self, db_path="historia.db", rozmiar_kolejki=1000, rozmiar_partii=500,
+                 bezczynnosc_s=120.0, konserwacja_co_s=24 * 3600, **opcje_bazy):
+        super().__init__()
+        self.rozmiar_partii = rozmiar_partii
+        self.bezczynnosc_s = bezczynnosc_s
+        self.konserwacja_co_s = konserwacja_co_s    # None – bez konserwacji
+        self._ostatnia_konserwacja = None
+        self._kolejka = queue.Queue(maxsize=rozmiar_kolejki)
+        self._numery = itertools.count(1)
+        self._zamkniety = False
+        self._termin = None            # po zamknij(): do kiedy ponawiać nieudany zapis
+        # Numer zlecenia -> ID wpisu (używa tylko wątek zapisujący)
+        self._ids = {}
+        self._blokada = threading.Lock()
+        self._metryki = {'zlecone': 0, 'zapisane': 0, 'partie': 0, 'bledy': 0,
+                         'maks_glebokosc': 0, 'ostatnia_partia_ms': 0.0}
+        self._watek = threading.Thread(target=self._petla, args=(db_path, opcje_bazy),
+                                       name="zapis-historii", daemon=True)
+        self._watek.start()
+
+    def _zlec(self, operacja):
+        if self._zamkniety:
+            raise RuntimeError("Zapis w tle został już zamknięty.")
+        # Pełna kolejka (queue.Full) oznacza, że baza od dawna nie przyjmuje zapisów
+        self._kolejka.put_nowait(operacja)
+        glebokosc = self._kolejka.qsize()
+        with self._blokada:
+            self._metryki['zlecone'] += 1
+            self._metryki['maks_glebokosc'] = max(self._metryki['maks_glebokosc'], glebokosc)
+        self.kolejka_zmieniona.emit(glebokosc)
+
+    def dodaj_wpis(self, kod, grupa, przedzial, metry_dict, czas_total, czas_produkcji=None,
+                   wymuszeni_pracownicy=None, wersja_stawek=None):
+        """Zleca zapis obliczenia (argumenty jak BazaDanych.dodaj_wpis). Zwraca numer zlecenia."""
+        numer = next(self._numery)
+        self._zlec(("dodaj", numer, {
+            'kod': kod, 'grupa': grupa, 'przedzial': przedzial, 'metry_dict': dict(metry_dict),
+            'czas_total': czas_total, 'czas_produkcji': czas_produkcji,
+            'wymuszeni_pracownicy': dict(wymuszeni_pracownicy or {}), 'wersja_stawek': wersja_stawek
+        }))
+        return numer
+
+    def aktualizuj_czas_produkcji(self, zlecenie, czas_produkcji, odchylenie):
+        """
+        Zleca zapis czasu produkcji dla wpisu z zlecenia `zlecenie` – także
+        takiego, którego ID nie jest jeszcze znane (kolejka zachowuje kolejność).
+        """
+        self._zlec(("aktualizuj", zlecenie, czas_produkcji, odchylenie))
+
+    def metryki(self):
+        """Bieżąca i największa długość kolejki oraz liczniki zapisów, partii i błędów."""
+        with self._blokada:
+            wynik = dict(self._metryki)
+        wynik['glebokosc'] = self._kolejka.qsize()
+        wynik['sredni_rozmiar_partii'] = wynik['zapisane'] / wynik['partie'] if wynik['partie'] else 0.0
+        return wynik
+
+    def oproznij(self):
+        """Czeka, aż wszystkie zlecone dotąd operacje zostaną zapisane (lub odrzucone)."""
+        self._kolejka.join()
+
+    def zamknij(self, limit_s=30.0):
+        """
+        Zapisuje resztę kolejki i kończy wątek. Nieudany zapis ponawiany jest
+        najwyżej do `limit_s` sekund. Zwraca True, gdy wszystko trafiło do bazy.
+        """
+        if not self._zamkniety:
+            self._zamkniety = True
+            self._termin = time.monotonic() + limit_s
+            try:
+                self._kolejka.put(_KONIEC, timeout=limit_s)
+            except queue.Full:
+                # Wątek nie odebrał operacji przez cały limit – zapis się nie skończy
+                return False
+        self._watek.join(limit_s)
+        with self._blokada:
+            zapisano_wszystko = self._metryki['zapisane'] == self._metryki['zlecone']
+        return not self._watek.is_alive() and zapisano_wszystko
+
+    def _petla(self, db_path, opcje_bazy):
+        # Połączenie SQLite należy do wątku, który je otworzył – wątek ma własne
+        opoznienie = 0.1
+        for proba in itertools.count(1):
+            try:
+                baza = BazaDanych(db_path, **opcje_bazy)
+                break
+            except sqlite3.Error as e:
+                if (not _baza_zajeta(e) or proba > self.MAKS_PONOWIEN
+                        or self._termin is not None and time.monotonic() > self._termin):
+                    self.blad.emit(f"Nie można otworzyć bazy historii: {e}")
+                    self._odrzuc_kolejke()
+                    return
+                self.blad.emit(f"Nie można otworzyć bazy historii ({e}), ponawiam...")
+                time.sleep(opoznienie)
+                opoznienie = min(opoznienie * 2, 5.0)
+        try:
+            while True:
+                partia = [self._nastepna_operacja(baza)]
+                while len(partia) < self.rozmiar_partii and partia[-1] is not _KONIEC:
+                    try:
+                        partia.append(self._kolejka.get_nowait())
+                    except queue.Empty:
+                        break
+                koniec = partia[-1] is _KONIEC
+                operacje = partia[:-1] if koniec else partia
+                if operacje:
+                    self._zapisz_partie(baza, operacje)
+                for _ in partia:
+                    self._kolejka.task_done()
+                self.kolejka_zmieniona.emit(self._kolejka.qsize())
+                if koniec:
+                    return
+        finally:
+            baza.zamknij()
+
+    def _odrzuc_kolejke(self):
+        """Bez bazy nic się nie zapisze: wstrzymuje zlecenia i zwalnia czekających w oproznij()."""
+        self._zamkniety = True
+        while True:
+            try:
+                self._kolejka.get_nowait()
+            except queue.Empty:
+                return
+            self._kolejka.task_done()
+
+    def _nastepna_operacja(self, baza):
+        """Czeka na operację; w czasie bezczynności konserwuje bazę, jeśli już pora."""
+        while True:
+            try:
+                return self._kolejka.get(timeout=self.bezczynnosc_s)
+            except queue.Empty:
+                if self.konserwacja_co_s is not None and (
+                        self._ostatnia_konserwacja is None
+                        or time.monotonic() - self._ostatnia_konserwacja >= self.konserwacja_co_s):
+                    self._konserwuj(baza)
+
+    def _konserwuj(self, baza):
+        try:
+            raport = konserwuj(baza, przerwij=lambda: self._zamkniety or not self._kolejka.empty())
+        except sqlite3.Error as e:
+            # Ponowna próba dopiero po pełnym odstępie – nie przy każdej przerwie w pracy
+            self._ostatnia_konserwacja = time.monotonic()
+            self.blad.emit(f"Konserwacja bazy historii nie powiodła się: {e}")
+            return
+        if not raport['przerwana']:
+            self._ostatnia_konserwacja = time.monotonic()
+        self.konserwacja.emit(raport)
+
+    def _zapisz_partie(self, baza, operacje):
+        """Zapisuje partię w jednej transakcji, ponawiając ją przy blokadzie bazy."""
+        opoznienie = 0.1
+        for proba in itertools.count(1):
+            start = time.perf_counter()
+            try:
+                nowe, nierozwiazane = self._wykonaj(baza, operacje)
+                break
+            except sqlite3.OperationalError as e:
+                with self._blokada:
+                    self._metryki['bledy'] += 1
+                if (not _baza_zajeta(e) or proba > self.MAKS_PONOWIEN
+                        or self._termin is not None and time.monotonic() > self._termin):
+                    self.blad.emit(f"Nie zapisano {len(operacje)} operacji w historii: {e}")
+                    return
+                self.blad.emit(f"Zapis do bazy nie powiódł się ({e}), ponawiam...")
+                time.sleep(opoznienie)
+                opoznienie = min(opoznienie * 2, 5.0)
+            except sqlite3.Error as e:
+                # Błąd danych, nie dostępu – partia bez winnej operacji zapisze się po kolei
+                with self._blokada:
+                    self._metryki['bledy'] += 1
+                if len(operacje) > 1:
+                    for operacja in operacje:
+                        self._zapisz_partie(baza, [operacja])
+                else:
+                    self.blad.emit(f"Odrzucono operację zapisu historii: {e}")
+                return
+
+        for numer, wpis_id in nowe.items():
+            self._ids[numer] = wpis_id
+            self.zapisano.emit(numer, wpis_id)
+        while len(self._ids) > self.MAKS_ZLECEN:
+            del self._ids[next(iter(self._ids))]
+        for zlecenie in nierozwiazane:
+            self.blad.emit(f"Nie zapisano czasu produkcji zlecenia {zlecenie} – "
+                           "brak jego wpisu w historii.")
+        with self._blokada:
+            self._metryki['zapisane'] += len(operacje) - len(nierozwiazane)
+            self._metryki['bledy'] += len(nierozwiazane)
+            self._metryki['partie'] += 1
+            self._metryki['ostatnia_partia_ms'] = (time.perf_counter() - start) * 1000
+
+    def _wykonaj(self, baza, operacje):
+        """
+        Wykonuje partię w jednej transakcji. Zwraca nadane ID (numer zlecenia -> ID)
+        i numery zleceń, których czasu produkcji nie było do czego zapisać: wpis
+        odrzucono albo jego numer wypadł już z mapy (MAKS_ZLECEN).
+        """
+        nowe = {}
+        nierozwiazane = []
+        with baza.transakcja():
+            for rodzaj, grupa in itertools.groupby(operacje, key=lambda op: op[0]):
+                grupa = list(grupa)
+                if rodzaj == "dodaj":
+                    ids = baza.dodaj_wpisy([op[2] for op in grupa])
+                    nowe.update(zip((op[1] for op in grupa), ids))
+                    continue
+                for _, zlecenie, czas_produkcji, odchylenie in grupa:
+                    wpis_id = nowe.get(zlecenie, self._ids.get(zlecenie))
+                    if wpis_id is None:
+                        nierozwiazane.append(zlecenie)
+                        continue
+                    # Walidacja powtórzonego obliczenia wydziela je jako nowy wpis
+                    zwalidowany = baza.aktualizuj_czas_produkcji(wpis_id, czas_produkcji, odchylenie)
+                    if zwalidowany != wpis_id:
+                        nowe[zlecenie] = zwalidowany
+        return nowe, nierozwiazane